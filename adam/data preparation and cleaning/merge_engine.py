@@ -0,0 +1,287 @@
+# Merges the FBref stat tables of the top 5 leagues (passing, gca, shooting, defense, possession, misc)
+# into one row per player, like merge_CSVs.ipynb, but in a single pass:
+# every table is deduplicated and indexed by the player key first, then all of them are aligned on the
+# players of the standard table and concatenated side by side. Nothing is merged one table after another,
+# so time and memory grow linearly with the number of players and tables.
+#
+# usage (from the repository root):
+#   python "adam/data preparation and cleaning/merge_engine.py" --output adam/data/entire_players_list.csv
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# club names and players are resolved to the same ids the dashboard uses
+sys.path.insert(0, os.path.join(BASE_DIR, 'adam', 'visualizations'))
+import modules.entities as entities  # noqa: E402
+
+# players with fewer minutes are left out
+MIN_MINUTES = 250
+
+# a player is identified by these columns, "League" and "Season" are added when the tables have them
+KEY = ['Player', 'Nation', 'Age', 'Club']
+PARTITION_COLUMNS = ['League', 'Season']
+
+# the standard table decides which players are in the result, these of its columns are kept
+BASE_FILE = os.path.join('adrian', 'update_t5_players.csv')
+BASE_COLUMNS = ['90s', 'Min', 'Pos']
+
+# stat tables in the order their columns are added, with the prefix that marks a column name that is already taken
+TABLES = [
+    ('passing', os.path.join('adam', 'data', 't5_leagues_players_passing.csv'), 'Pass'),
+    ('gca', os.path.join('adam', 'data', 't5_leagues_players_gca.csv'), 'GCA'),
+    ('shooting', os.path.join('adam', 'data', 't5_leagues_players_shooting.csv'), 'Shoot'),
+    ('defense', os.path.join('adam', 'data', 't5_leagues_players_defense.csv'), 'Def'),
+    ('possession', os.path.join('adam', 'data', 't5_leagues_players_possession.csv'), 'Poss'),
+    ('misc', os.path.join('adam', 'data', 't5_leagues_players_misc.csv'), 'Misc'),
+]
+
+# columns of the result and their final names, every other column is dropped
+# (the same mapping as the renaming step of merge_CSVs.ipynb, prefixed names are collisions between tables)
+rename_columns = {
+    'Player': 'Player',
+    'Nation': 'Nation',
+    'Age': 'Age',
+    'Club': 'Club',
+    '90s': '90 minutes played',
+    'Min': 'Minutes played',
+    'Pos': 'Position',
+    'Cmp': 'Passes completed',
+    'Att': 'Passes attempted',
+    'Cmp%': 'Completed passes %',
+    'TotDist': 'Total pass distance',
+    'PrgDist': 'Progressive pass distance',
+    'Cmp.1': 'Short passes completed',
+    'Att.1': 'Short passes attempted',
+    'Cmp%.1': 'Short passes completed %',
+    'Cmp.2': 'Medium passes completed',
+    'Att.2': 'Medium passes attempted',
+    'Cmp%.2': 'Medium passes completed %',
+    'Cmp.3': 'Long passes completed',
+    'Att.3': 'Long passes attempted',
+    'Cmp%.3': 'Long passes completed %',
+    'Ast': 'Assists',
+    'xAG': 'Expected Assisted Goals',
+    'xA': 'Expected Assists',
+    'A-xAG': 'A minus xAG',
+    'KP': 'Key Passes',
+    '1/3': 'Passes into final third',
+    'PPA': 'Passes into penalty area',
+    'CrsPA': 'Crosses into penalty area',
+    'PrgP': 'Progressive passes',
+    'SCA': 'Shot creating actions',
+    'SCA90': 'Shot creating actions per 90',
+    'PassLive': 'Shot creating actions by live-ball passes',
+    'PassDead': 'Shot creating actions by dead-ball passes',
+    'TO': 'Successful Take-Ons that led to a shot',
+    'Sh': 'Shots that led to another shot attempt',
+    'Fld': 'Fouls drawn that led to a shot attempt',
+    'Def': 'Defensive actions that led to a shot attempt',
+    'GCA': 'Goal creating actions',
+    'GCA90': 'Goal creating actions per 90',
+    'PassLive.1': 'Goal creating actions by live-ball passes',
+    'PassDead.1': 'Goal creating actions by dead-ball passes',
+    'TO.1': 'Successful Take-Ons that led to a goal',
+    'Sh.1': 'Shots that led to another goal-scoring shot',
+    'Fld.1': 'Fouls drawn that led to a goal',
+    'Def.1': 'Defensive actions that led to a goal',
+    'Gls': 'Goals',
+    'SoT': 'Shots on target',
+    'SoT%': 'Shots on target %',
+    'Sh/90': 'Shots per 90',
+    'SoT/90': 'Shots on target per 90',
+    'G/Sh': 'Goals per shot',
+    'G/SoT': 'Goals per shot on target',
+    'Dist': 'Average shooting distance',
+    'FK': 'Shots from free kicks',
+    'PK': 'Penalty kicks made',
+    'PKatt': 'Penalty kicks attempted',
+    'xG': 'Expected Goals',
+    'npxG': 'Non-penalty expected goals',
+    'npxG/Sh': 'Non-penalty expected goals/Shot',
+    'G-xG': 'Goals minus expected Goals',
+    'np:G-xG': 'Non-penalty goals minus non-penalty expected Goals',
+    'Tkl': 'Tackles',
+    'TklW': 'Tackles won',
+    'Def 3rd': 'Tackles in defensive 1/3',
+    'Mid 3rd': 'Tackles in middle 1/3',
+    'Att 3rd': 'Tackles in attacking 1/3',
+    'Tkl.1': 'Dribblers tackled',
+    'Tkl%': '% of dribblers tackled',
+    'Lost': 'Challenges lost',
+    'Blocks': 'Balls blocked',
+    'Pass': 'Passes blocked',
+    'Int': 'Interceptions',
+    'Tkl+Int': 'Number of tackles and interceptions',
+    'Clr': 'Clearances',
+    'Err': 'Errors',
+    'TlkW/Tkl': 'Tackles won %',
+    'Touches': 'Touches',
+    'Def Pen': 'Touches in defensive penalty area',
+    'Poss_Def 3rd': 'Touches in defensive 1/3',
+    'Poss_Mid 3rd': 'Touches in middle 1/3',
+    'Poss_Att 3rd': 'Touches in attacking 1/3',
+    'Att Pen': 'Touches in attacking penalty area',
+    'Live': 'Live-ball touches',
+    'Poss_Att': 'Take ons attempted',
+    'Succ': 'Successful take ons',
+    'Succ%': 'Successful take ons %',
+    'Tkld': 'Times tackled during take on',
+    'Tkld%': 'Times tackled during take on %',
+    'Carries': 'Times ball carried with feet',
+    'Poss_TotDist': 'Total moved ball distance',
+    'Poss_PrgDist': 'Progressive moved ball distance',
+    'PrgC': 'Progressive Carries',
+    'Poss_1/3': 'Carries into final 1/3',
+    'CPA': 'Carries into penalty area',
+    'Mis': 'Miscontrols',
+    'Dis': 'Dispossessed',
+    'Rec': 'Passes received',
+    'PrgR': 'Progressive Passes Received',
+    'CrdY': 'Yellow cards',
+    'CrdR': 'Red cards',
+    '2CrdY': 'Second yellow card',
+    'Fls': 'Fouls committed',
+    'Off': 'Offsides',
+    'Crs': 'Crosses',
+    'PKwon': 'Penalty kicks won',
+    'PKcon': 'Penalty kicks conceded',
+    'OG': 'Own goals',
+    'Recov': 'Recoveries',
+    'Won': 'Aerial duels won',
+    'Won%': 'Aerial duels won %'
+}
+
+# how players who changed clubs during the season are handled:
+# 'split' keeps one row per club with the number of clubs in 'Clubs in season',
+# 'first' keeps only the first club like the drop_duplicates step of the notebook
+TRANSFER_POLICIES = ['split', 'first']
+
+
+def player_key(df):
+    # same players and clubs get the same ids no matter how a table spells them, ages are whole years
+    key = KEY + [column for column in PARTITION_COLUMNS if column in df.columns]
+    _, player_ids = entities.players.rekey(df['Player'])
+    _, club_ids = entities.clubs.rekey(df['Club'])
+    columns = {
+        'Player ID': player_ids,
+        'Nation': df['Nation'].fillna(''),
+        'Age': pd.to_numeric(df['Age'], errors='coerce').astype('Int16'),
+        'Club ID': club_ids,
+    }
+    columns.update({column: df[column] for column in key if column not in KEY})
+    return pd.MultiIndex.from_frame(pd.DataFrame(columns))
+
+
+def deduplicate(name, df, index, report):
+    # rows that share a key would multiply the players of every later table in a join, so they are found up front
+    duplicated = index.duplicated(keep=False)
+    if duplicated.any():
+        # exact copies are harmless, rows that share a key but have different numbers are counted as conflicts
+        rows = df[duplicated]
+        copies = rows.duplicated(keep='first').to_numpy()
+        conflicting = index[duplicated][~copies].duplicated(keep=False).sum()
+        report.append({'table': name, 'duplicates': int(duplicated.sum()), 'conflicting': int(conflicting)})
+    # the first row of every key is kept
+    keep = ~index.duplicated(keep='first')
+    return df[keep], index[keep]
+
+
+def prefixed_columns(columns, prefix, taken):
+    # the renaming of add_prefix_and_number in merge_CSVs.ipynb: names an earlier table already has get the prefix
+    return [f'{prefix}_{column}' if column in taken else column for column in columns]
+
+
+def merge_tables(base, tables, min_minutes=MIN_MINUTES, transfers='split'):
+    # base is the standard table, tables a list of (name, frame, prefix); returns the merged frame and a duplicates report
+    if transfers not in TRANSFER_POLICIES:
+        raise ValueError(f"transfers must be one of {TRANSFER_POLICIES}, not {transfers!r}")
+
+    report = []
+    partition = [column for column in PARTITION_COLUMNS if column in base.columns]
+    base = base[base['Min'] >= min_minutes].copy()
+    # only the first of several listed positions is kept
+    base['Pos'] = base['Pos'].str.split(',').str[0]
+
+    base_index = player_key(base)
+    base, base_index = deduplicate('standard', base, base_index, report)
+
+    # mid-season transfers show up as the same player (without the club) at more than one club
+    season_codes, _ = pd.factorize(base_index.droplevel('Club ID'))
+    clubs_in_season = np.bincount(season_codes)[season_codes]
+    if transfers == 'first':
+        first_club = ~pd.Series(season_codes).duplicated(keep='first').to_numpy()
+        base, base_index = base[first_club], base_index[first_club]
+
+    columns = KEY + partition + BASE_COLUMNS
+    frames = [base[columns].set_axis(base_index)]
+    taken = set(columns)
+    for name, df, prefix in tables:
+        index = player_key(df)
+        df, index = deduplicate(name, df, index, report)
+        stats = [column for column in df.columns if column not in KEY + partition]
+        names = prefixed_columns(stats, prefix, taken)
+        taken.update(names)
+
+        # only the columns the rename config asks for are aligned, the rest is never copied
+        wanted = [(column, name) for column, name in zip(stats, names) if name in rename_columns]
+        frame = df[[column for column, _ in wanted]].set_axis([name for _, name in wanted], axis=1).set_axis(index)
+        # hash based alignment on the players of the standard table, players missing in a table get NaN
+        frames.append(frame.reindex(base_index))
+
+    merged = pd.concat(frames, axis=1)
+    merged = merged[[column for column in merged.columns if column in rename_columns or column in partition]]
+    merged = merged.rename(columns=rename_columns).reset_index(drop=True)
+    if transfers == 'split':
+        merged['Clubs in season'] = clubs_in_season
+    return merged, pd.DataFrame(report, columns=['table', 'duplicates', 'conflicting'])
+
+
+def load_tables(base_dir=BASE_DIR):
+    base = pd.read_csv(os.path.join(base_dir, BASE_FILE))
+    tables = []
+    for name, path, prefix in TABLES:
+        df = pd.read_csv(os.path.join(base_dir, path))
+        if name == 'defense' and 'TlkW/Tkl' not in df.columns:
+            # share of tackles that were won, added by hand to the defense table in the notebook
+            df['TlkW/Tkl'] = df['TklW'] / df['Tkl'].replace(0, np.nan)
+        tables.append((name, df, prefix))
+    return base, tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge the FBref stat tables of the top 5 leagues into one table')
+    parser.add_argument('--output', default=os.path.join(BASE_DIR, 'adam', 'data', 'entire_players_list.csv'))
+    parser.add_argument('--min-minutes', type=int, default=MIN_MINUTES)
+    parser.add_argument('--transfers', choices=TRANSFER_POLICIES, default='split')
+    args = parser.parse_args()
+
+    base, tables = load_tables()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    merged, report = merge_tables(base, tables, args.min_minutes, args.transfers)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if len(report):
+        print("Duplicate player keys (the first row of each is kept):")
+        print(report.to_string(index=False))
+    transferred = (merged['Clubs in season'] > 1).sum() if 'Clubs in season' in merged else 0
+    print(f"Merged {len(merged)} players ({transferred} rows of mid-season transfers) and {merged.shape[1]} columns "
+          f"in {seconds:.2f}s, peak memory {peak / 1e6:.1f} MB")
+
+    merged.to_csv(args.output, index=False)
+    print(f"Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
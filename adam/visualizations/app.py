@@ -1,18 +1,21 @@
+import os
+
 import dash
-from dash import dcc, html
+from dash import html
 import dash_bootstrap_components as dbc
 
-# Import your modules
-import modules.top_scorers as top_scorers
-import modules.player_radar_charts as player_radar_charts
-import modules.transfers_analysis as transfers_analysis
-import modules.club_transfer_details as club_transfer_details
-import modules.home_away_performance as home_away_performance
-import modules.cl_results as cl_results
-import modules.top_6_race as top_6_race
-import modules.shot_analysis as shot_analysis
-import modules.xg_difference as xg_difference
-import modules.goalkeeping_performance as goalkeeping_performance  # Import the new module
+# the dashboard tabs are plugins, see modules/plugins.py; DATAPOOL_PLUGINS limits which ones are loaded
+import modules.plugins as plugins
+import modules.data_refresh as data_refresh
+import modules.api as api
+import modules.request_profiling as request_profiling
+import modules.memory as memory
+
+tabs = plugins.enabled()
+tab_layouts = {plugin.TAB_ID: plugin.layout for plugin in tabs}
+
+# the tab the dashboard opens on, the first one when it is not enabled
+DEFAULT_TAB = "top-scorers-tab" if "top-scorers-tab" in tab_layouts else tabs[0].TAB_ID
 
 # Initialize the Dash app with suppress_callback_exceptions=True
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True)
@@ -22,18 +25,8 @@ app.title = "Liverpool 18/19 Season Analytical Dashboard"
 app.layout = dbc.Container([
     html.H1("Liverpool 18/19 Season Analytical Dashboard", className="text-center my-4"),
 
-    dbc.Tabs([
-        dbc.Tab(label="Top 6 Race (Adrian)", tab_id="top-6-race-tab"),
-        dbc.Tab(label="Top Scorers (Adam)", tab_id="top-scorers-tab"),
-        dbc.Tab(label="Home & Away Performance (Adam)", tab_id="home-away-performance-tab"),
-        dbc.Tab(label="xG Difference (Adrian)", tab_id="xg-difference-tab"),
-        dbc.Tab(label="Shot Analysis (Adrian)", tab_id="shot-analysis-tab"),
-        dbc.Tab(label="Goalkeeping Performance (Adrian)", tab_id="goalkeeping-performance-tab"),
-        dbc.Tab(label="Player Radar Charts (Adam)", tab_id="player-radar-charts-tab"),
-        dbc.Tab(label="CL Summary (Adrian)", tab_id="cl-results-tab"),
-        dbc.Tab(label="Big 6 Transfers Analysis (Adam)", tab_id="transfers-analysis-tab"),
-        dbc.Tab(label="Big 6 Transfer Comparison (Adam)", tab_id="club-transfer-details-tab"),
-    ], id="tabs", active_tab="top-scorers-tab", className="custom-tabs"),
+    dbc.Tabs([dbc.Tab(label=plugin.TAB_LABEL, tab_id=plugin.TAB_ID) for plugin in tabs],
+             id="tabs", active_tab=DEFAULT_TAB, className="custom-tabs"),
 
     html.Div(id="tab-content")
 ], fluid=True)
@@ -44,38 +37,24 @@ app.layout = dbc.Container([
     [dash.dependencies.Input("tabs", "active_tab")]
 )
 def render_tab_content(active_tab):
-    if active_tab == "top-scorers-tab":
-        return top_scorers.layout()
-    elif active_tab == "player-radar-charts-tab":
-        return player_radar_charts.layout()
-    elif active_tab == "transfers-analysis-tab":
-        return transfers_analysis.layout()
-    elif active_tab == "club-transfer-details-tab":
-        return club_transfer_details.layout()
-    elif active_tab == "home-away-performance-tab":
-        return home_away_performance.layout()
-    elif active_tab == "cl-results-tab":
-        return cl_results.layout()
-    elif active_tab == "top-6-race-tab":
-        return top_6_race.layout()
-    elif active_tab == "shot-analysis-tab":
-        return shot_analysis.layout()
-    elif active_tab == "xg-difference-tab":
-        return xg_difference.layout()
-    elif active_tab == "goalkeeping-performance-tab":
-        return goalkeeping_performance.layout()  # Render the new layout
-
-# Register callbacks for each module
-top_scorers.register_callbacks(app)
-player_radar_charts.register_callbacks(app)
-transfers_analysis.register_callbacks(app)
-club_transfer_details.register_callbacks(app)
-home_away_performance.register_callbacks(app)
-cl_results.register_callbacks(app)
-top_6_race.register_callbacks(app)
-shot_analysis.register_callbacks(app)
-xg_difference.register_callbacks(app)
-goalkeeping_performance.register_callbacks(app)  # Register callbacks for the new module
+    return tab_layouts[active_tab]()
+
+# Register callbacks for each plugin
+plugins.register(app, tabs)
+
+# POST /admin/reload to pick up new data without a restart (from localhost, or with DATAPOOL_ADMIN_TOKEN),
+# GET /metrics for the reload numbers
+data_refresh.register_routes(app.server)
+
+# read-only JSON API over the same tables under /api/v1
+api.register_routes(app.server)
+
+# with DATAPOOL_PROFILING=1, slow or requested callbacks are sampled, browse them under /debug/profiles
+request_profiling.register_routes(app.server)
+
+# with DATAPOOL_PROFILING=1, GET /debug/memory for what the store and the caches hold,
+# POST /debug/memory/snapshot for allocation diffs
+memory.register_routes(app.server)
 
 # Add custom CSS to adjust the font size of the tabs
 app.index_string = '''
@@ -105,4 +84,10 @@ app.index_string = '''
 
 # Run the app
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    debug = True
+    # reload the data in the background whenever one of the csv files changes, DATAPOOL_WATCH=0 turns this off
+    # in debug mode the reloader runs this file twice, only the child that serves the app watches
+    serving = not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    if serving and os.environ.get('DATAPOOL_WATCH', '1') != '0':
+        data_refresh.start_watcher()
+    app.run_server(debug=debug)
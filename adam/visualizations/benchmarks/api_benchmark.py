@@ -0,0 +1,76 @@
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+# requests per second of the /api/v1 endpoints under concurrent load, against the app's own Flask server
+# run from adam/visualizations: python benchmarks/api_benchmark.py [--clients 8] [--seconds 5]
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import app  # noqa: E402
+
+endpoints = [
+    '/api/v1/standings?matchday=38',
+    '/api/v1/xg?window=last_5&matchday=20',
+    '/api/v1/xpts',
+    '/api/v1/players/shots?per_page=500',
+    '/api/v1/percentiles?position=FW',
+    '/api/v1/transfers',
+]
+
+
+def hammer(base_url, path, clients, seconds, revalidate):
+    # every client sends the same request in a loop on its own keep-alive connection
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        session = requests.Session()
+        headers = {}
+        count = 0
+        while time.perf_counter() < deadline:
+            response = session.get(base_url + path, headers=headers)
+            if response.status_code not in (200, 304):
+                raise RuntimeError(f"{path} answered {response.status_code}")
+            if revalidate:
+                headers = {'If-None-Match': response.headers['ETag']}
+            count += 1
+        return count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        total = sum(executor.map(lambda _: client(), range(clients)))
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Requests per second of the /api/v1 endpoints')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    # one access log line per request would measure the terminal
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', args.port, app.server, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{args.port}'
+
+    print(f"{args.clients} concurrent clients, {args.seconds:.0f}s per endpoint")
+    print(f"{'endpoint':45} {'bytes':>8} {'200 req/s':>10} {'304 req/s':>10}")
+    for path in endpoints:
+        body = requests.get(base_url + path).content
+        full = hammer(base_url, path, args.clients, args.seconds, revalidate=False)
+        not_modified = hammer(base_url, path, args.clients, args.seconds, revalidate=True)
+        print(f"{path:45} {len(body):>8} {full:>10.0f} {not_modified:>10.0f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# selective reads through the SQLite store against boolean masks over the in-memory frames
+# run from adam/visualizations: python benchmarks/sqlite_benchmark.py [--repeat 50]
+# the SQLite store is built first when it is missing or older than the csv files
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import modules.data_refresh as data_refresh  # noqa: E402
+import modules.data_store as data_store  # noqa: E402
+import modules.sqlite_store as sqlite_store  # noqa: E402
+
+
+def queries(store):
+    # (label, dataset, where, columns) with values taken from the data, so they match rows whatever the season
+    shots = store.load('shots')
+    results = store.load('club_results')
+    percentiles = store.load_dataset('player_percentiles')
+    player_id = shots['Player ID'].value_counts().index[0]
+    club_id = results['Club ID'].iloc[0]
+    return [
+        ('shots of one player', 'shots', {'Player ID': player_id}, None),
+        ('shots on target of one club', 'shots', {'Squad': shots['Squad'].iloc[0], 'Outcome': ['Goal', 'Saved']},
+         ['Player', 'Minute', 'xG', 'PSxG', 'Outcome']),
+        ('home games of one club', 'club_results', {'Club ID': club_id, 'Venue': 'Home'}, None),
+        ('games on one date', 'club_results', {'Date': results['Date'].iloc[0]}, None),
+        ('percentiles of one player', 'player_percentiles', {'Player': percentiles['Player'].iloc[0]}, None),
+        ("Liverpool's shots", 'liverpool_shots', {'Squad': 'Liverpool'}, None),
+    ]
+
+
+def median_ms(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite store against in-memory pandas for selective reads')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    versions = data_refresh.file_versions()
+    if not sqlite_store.is_current(versions):
+        sqlite_store.build(data_store.all_tables(), versions)
+
+    store = data_store.DataStore()
+    print(f"median of {args.repeat} runs, pandas: mask over a loaded frame (warm) or reading the csv first (cold)")
+    print(f"{'query':30} {'rows':>6} {'pandas warm ms':>15} {'pandas cold ms':>15} {'sqlite ms':>10}")
+    for label, dataset, where, columns in queries(store):
+        sqlite_store.ENABLED = False
+        rows = len(store.select(dataset, where, columns))
+        warm = median_ms(lambda: store.select(dataset, where, columns), args.repeat)
+        cold = median_ms(lambda: data_store.DataStore().select(dataset, where, columns), max(args.repeat // 10, 1))
+        sqlite_store.ENABLED = True
+        sqlite = median_ms(lambda: store.select(dataset, where, columns), args.repeat)
+        print(f"{label:30} {rows:>6} {warm:>15.2f} {cold:>15.2f} {sqlite:>10.2f}")
+
+    frames = sum(store.memory_usage().values())
+    print(f"\nframes held in memory by the pandas path {frames / 2**20:.1f} MiB, "
+          f"SQLite file {os.path.getsize(sqlite_store.PATH) / 2**20:.1f} MiB on disk")
+
+
+if __name__ == '__main__':
+    main()
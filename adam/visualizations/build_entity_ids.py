@@ -0,0 +1,62 @@
+import argparse
+import glob
+import json
+import os
+
+import pandas as pd
+
+import modules.data_store as data_store
+import modules.entities as entities
+
+# writes the checked-in id table of clubs, players and competitions (adam/data/entity_ids.json)
+# run from adam/visualizations after adding data: python build_entity_ids.py
+# names already in the table keep their ids, new ones are appended in sorted order, so an id never changes
+
+# the data directories of the repository, the stat tables of the merge engine included
+DATA_DIRS = [os.path.join(data_store.BASE_DIR, 'adam', 'data'), os.path.join(data_store.BASE_DIR, 'adrian', 'data')]
+
+
+def csv_files():
+    files = set(data_store.data_files())
+    for directory in DATA_DIRS:
+        files.update(glob.glob(os.path.join(directory, '**', '*.csv'), recursive=True))
+    return sorted(files)
+
+
+def names_in_data():
+    found = {'clubs': set(), 'players': set(), 'competitions': set()}
+    labels = {id(dimension): label for label, dimension in
+              [('clubs', entities.clubs), ('players', entities.players)]}
+    for path in csv_files():
+        header = pd.read_csv(path, nrows=0).columns
+        columns = [column for column in header if column in entities.entity_columns]
+        if not columns:
+            continue
+        df = pd.read_csv(path, usecols=columns, dtype=str)
+        for column in columns:
+            dimension = entities.entity_columns[column]
+            found[labels[id(dimension)]].update(dimension.canonical(name) for name in df[column].dropna().unique())
+    found['competitions'].update(data_store.available_leagues())
+    found['competitions'].update(data_store.DATASET_COMPETITIONS.values())
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the id table of clubs, players and competitions')
+    parser.add_argument('--output', default=entities.ID_TABLE)
+    args = parser.parse_args()
+
+    table = entities.load_id_table(args.output)
+    for label, names in names_in_data().items():
+        known = table.get(label, [])
+        new = sorted(names - set(known))
+        table[label] = known + new
+        print(f"{label:15} {len(known):6} known, {len(new):6} added")
+    with open(args.output, 'w') as f:
+        json.dump(table, f, ensure_ascii=False, indent=0)
+        f.write('\n')
+    print(f"-> {os.path.abspath(args.output)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import argparse
+import os
+import sqlite3
+import time
+
+import modules.data_refresh as data_refresh
+import modules.data_store as data_store
+import modules.sqlite_store as sqlite_store
+
+# loads every dataset of every partition into the SQLite store that DATAPOOL_BACKEND=sqlite reads from
+# run from adam/visualizations: python build_sqlite_store.py [--path ../data/datapool.sqlite3] [--force]
+# without --force the file is left alone when it was built from the current csv files
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the SQLite store of all datasets')
+    parser.add_argument('--path', default=sqlite_store.PATH)
+    parser.add_argument('--force', action='store_true', help='rebuild even when the file is up to date')
+    args = parser.parse_args()
+
+    versions = data_refresh.file_versions()
+    if not args.force and sqlite_store.is_current(versions, args.path):
+        print(f"{args.path} is up to date")
+        return
+
+    start = time.perf_counter()
+    sqlite_store.build(data_store.all_tables(), versions, args.path)
+    connection = sqlite3.connect(args.path)
+    datasets = [row[0] for row in connection.execute('SELECT DISTINCT dataset FROM _columns ORDER BY dataset')]
+    for dataset in datasets:
+        rows = connection.execute(f'SELECT COUNT(*) FROM {sqlite_store.quote(dataset)}').fetchone()[0]
+        print(f"{dataset:25} {rows:8} rows")
+    connection.close()
+    print(f"-> {args.path}, {os.path.getsize(args.path) / 2**20:.1f} MiB in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+import argparse
+import itertools
+import json
+import os
+import re
+import shutil
+import time
+
+import dash_bootstrap_components as dbc
+from dash import dcc, html
+from dash._utils import to_json
+
+import modules.data_store as data_store
+
+# builds the dashboard as a static site that any web server or CDN can host without Python:
+# every callback whose inputs can only take a known set of values is run for every combination of them,
+# the outputs are written as JSON files and the callback becomes a clientside lookup of those files
+# tabs with open-ended inputs (animation buttons, multi-selects, range sliders) link to a live dashboard instead
+# run from adam/visualizations: python build_static_site.py [--output static_site] [--backend-url https://...]
+# preview with: python -m http.server --directory static_site
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static_site')
+
+LOOKUP_SCRIPT = 'static_site.js'
+
+# the namespace of the clientside lookup functions, one function per static callback
+NAMESPACE = 'static_site'
+
+# the dash renderer fetches these two from the server, the static site answers them from the page itself
+EMBEDDED_ROUTES = ['_dash-layout', '_dash-dependencies']
+
+FINGERPRINT = re.compile(r'\.(v[\w-]+m[0-9a-fA-F]+)\.')
+
+
+def key(args):
+    # the same text as JSON.stringify of the callback arguments in the browser
+    return json.dumps(args, separators=(',', ':'), ensure_ascii=False)
+
+
+def option_values(options):
+    return [option['value'] if isinstance(option, dict) else option for option in options or []]
+
+
+def input_domains(layout):
+    # the values every input of the layout can take, components with open-ended values are left out
+    domains = {}
+    for component in [layout, *layout._traverse()]:
+        component_id = getattr(component, 'id', None)
+        if not isinstance(component_id, str):
+            continue
+        if isinstance(component, dbc.Tabs):
+            domains[f'{component_id}.active_tab'] = [tab.tab_id for tab in component.children]
+        elif isinstance(component, dcc.Dropdown) and not getattr(component, 'multi', False):
+            domains[f'{component_id}.value'] = option_values(component.options)
+        elif isinstance(component, dcc.RadioItems):
+            domains[f'{component_id}.value'] = option_values(component.options)
+        elif isinstance(component, dcc.Slider):
+            step = getattr(component, 'step', None) or 1
+            domains[f'{component_id}.value'] = list(range(component.min, component.max + 1, step))
+    return domains
+
+
+def widen(domains, callback, response):
+    # a callback that sets the options or the range of a component adds the new values to its domain
+    for component_id, props in response.items():
+        values = []
+        if 'options' in props:
+            values = option_values(props['options'])
+        elif 'max' in props:
+            values = list(range(props.get('min', 1), props['max'] + 1))
+        name = f'{component_id}.value'
+        if name in domains:
+            domains[name] += [value for value in values if value not in domains[name]]
+
+
+def dependency_names(callback):
+    return [f"{item['id']}.{item['property']}" for item in callback['inputs'] + callback['state']]
+
+
+def output_list(callback):
+    # the output string of a multi-output callback is '..a.prop...b.prop..'
+    output = callback['output']
+    parts = output[2:-2].split('...') if output.startswith('..') else [output]
+    return [{'id': part.rsplit('.', 1)[0], 'property': part.rsplit('.', 1)[1]} for part in parts]
+
+
+def combinations(callback, domains):
+    names = dependency_names(callback)
+    available = set(data_store.available_partitions())
+    # the league and season inputs of one partition selector, only the available pairs are built,
+    # update_seasons reads the season as state and picks a valid one itself
+    inputs = names[:len(callback['inputs'])]
+    pairs = [(names.index(name), names.index(name.replace('-league.', '-season.'))) for name in inputs
+             if name.endswith('-league.value') and name.replace('-league.', '-season.') in inputs]
+    for args in itertools.product(*(domains[name] for name in names)):
+        if all((args[league], args[season]) in available for league, season in pairs):
+            yield list(args)
+
+
+def run_callback(client, callback, args):
+    outputs = output_list(callback)
+    n_inputs = len(callback['inputs'])
+    values = [dict(item, value=value) for item, value in zip(callback['inputs'] + callback['state'], args)]
+    payload = {
+        'output': callback['output'],
+        'outputs': outputs if callback['output'].startswith('..') else outputs[0],
+        'inputs': values[:n_inputs],
+        'state': values[n_inputs:],
+        'changedPropIds': [f"{item['id']}.{item['property']}" for item in callback['inputs']],
+    }
+    response = client.post('/_dash-update-component', json=payload)
+    if response.status_code == 204:
+        # PreventUpdate, every output keeps its value
+        return {}
+    if response.status_code != 200:
+        return None
+    return response.get_json()['response']
+
+
+def live_notice(label, backend_url):
+    # what a tab with open-ended inputs shows on the static site
+    link = html.A("the live dashboard", href=backend_url) if backend_url else "the live dashboard"
+    return json.loads(to_json(dbc.Alert([
+        f"The {label} tab needs a running Python backend, open it on ", link, ".",
+    ], color='info', className='my-4')))
+
+
+def static_tabs(layouts, domains, callbacks):
+    # a tab is static when every callback that reads one of its components has known input values
+    tabs = {}
+    for tab, layout in layouts.items():
+        ids = {component.id for component in [layout, *layout._traverse()]
+               if isinstance(getattr(component, 'id', None), str)}
+        known = {**domains, **input_domains(layout)}
+        tabs[tab] = all(all(name in known for name in dependency_names(callback)) for callback in callbacks
+                        if any(name.rsplit('.', 1)[0] in ids for name in dependency_names(callback)))
+    return tabs
+
+
+def build_lookups(app, render_tab_content, output, backend_url):
+    client = app.server.test_client()
+    client.get('/')
+    callbacks = client.get('/_dash-dependencies').get_json()
+
+    # the layout of every tab, rendered by the tab callback of the live app
+    tab_callback = next(callback for callback in callbacks if callback['output'] == 'tab-content.children')
+    domains = input_domains(app.layout)
+    tab_ids = domains['tabs.active_tab']
+    layouts = {tab: render_tab_content(tab) for tab in tab_ids}
+    labels = {tab.tab_id: tab.label for tab in app.layout['tabs'].children}
+    is_static = static_tabs(layouts, domains, [callback for callback in callbacks if callback is not tab_callback])
+    for tab in tab_ids:
+        if is_static[tab]:
+            domains.update(input_domains(layouts[tab]))
+
+    # callbacks that set options and ranges first, their outputs widen the domains of the others
+    static = [callback for callback in callbacks if all(name in domains for name in dependency_names(callback))]
+    static.sort(key=lambda callback: not any(item['property'] in ('options', 'max') for item in output_list(callback)))
+
+    lookups, failed = [], 0
+    for index, callback in enumerate(static):
+        directory = os.path.join(output, 'callbacks', str(index))
+        os.makedirs(directory, exist_ok=True)
+        entries = {}
+        for args in combinations(callback, domains):
+            if callback is tab_callback and not is_static[args[0]]:
+                response = {'tab-content': {'children': live_notice(labels[args[0]], backend_url)}}
+            else:
+                response = run_callback(client, callback, args)
+            if response is None:
+                failed += 1
+                continue
+            widen(domains, callback, response)
+            with open(os.path.join(directory, f'{len(entries)}.json'), 'w') as f:
+                f.write(to_json(response))
+            entries[key(args)] = len(entries)
+        with open(os.path.join(directory, 'index.json'), 'w') as f:
+            json.dump(entries, f, ensure_ascii=False)
+        callback['clientside_function'] = {'namespace': NAMESPACE, 'function_name': f'cb_{index}'}
+        lookups.append((index, output_list(callback)))
+
+    return static, lookups, failed, tab_ids, [tab for tab in tab_ids if not is_static[tab]]
+
+
+def open_static_tab(layout, tab_ids, live_tabs):
+    # the page opens on the first prebuilt tab when the default one needs the backend
+    stack = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict) and isinstance(node.get('props'), dict):
+            if node['props'].get('id') == 'tabs':
+                if node['props'].get('active_tab') in live_tabs:
+                    node['props']['active_tab'] = next(tab for tab in tab_ids if tab not in live_tabs)
+                return layout
+            stack.append(node['props'].get('children'))
+    return layout
+
+
+def lookup_script(lookups, layout, dependencies):
+    # clientside lookups of the prebuilt outputs, and the layout and dependencies the renderer would fetch
+    functions = [
+        f"    cb_{index}: function() {{ return lookup({index}, {json.dumps(outputs)}, arguments); }}"
+        for index, outputs in lookups
+    ]
+    routes = {route: payload for route, payload in zip(EMBEDDED_ROUTES, [layout, dependencies])}
+    return f"""(function() {{
+var embedded = {to_json(routes)};
+var realFetch = window.fetch.bind(window);
+window.fetch = function(resource, init) {{
+    var url = typeof resource === 'string' ? resource : resource.url;
+    var route = url.split('?')[0].split('/').pop();
+    if (embedded.hasOwnProperty(route)) {{
+        return Promise.resolve(new Response(JSON.stringify(embedded[route]),
+                                            {{headers: {{'content-type': 'application/json'}}}}));
+    }}
+    return realFetch(resource, init);
+}};
+
+var indexes = {{}};
+function getJSON(path) {{
+    return realFetch(path).then(function(response) {{ return response.json(); }});
+}}
+async function lookup(callback, outputs, args) {{
+    var noUpdate = window.dash_clientside.no_update;
+    if (!indexes[callback]) {{
+        indexes[callback] = getJSON('callbacks/' + callback + '/index.json');
+    }}
+    var entry = (await indexes[callback])[JSON.stringify(Array.prototype.slice.call(args))];
+    // inputs that were never prebuilt keep what is on the page
+    var response = entry === undefined ? {{}} : await getJSON('callbacks/' + callback + '/' + entry + '.json');
+    var values = outputs.map(function(output) {{
+        var props = response[output.id];
+        return props && props.hasOwnProperty(output.property) ? props[output.property] : noUpdate;
+    }});
+    return outputs.length === 1 ? values[0] : values;
+}}
+
+window.dash_clientside = Object.assign({{}}, window.dash_clientside);
+window.dash_clientside.{NAMESPACE} = {{
+{(',' + chr(10)).join(functions)}
+}};
+}})();
+"""
+
+
+def copy_assets(app, output, index_html):
+    # the renderer and component bundles, under the fingerprinted names of the page and the plain ones
+    # that the lazily loaded chunks are requested by
+    client = app.server.test_client()
+    urls = set(re.findall(r'(?:src|href)="/(_dash-component-suites/[^"?]+|_favicon\.ico)', index_html))
+    tokens = {}
+    for url in urls:
+        match = FINGERPRINT.search(url)
+        if match:
+            # every bundle requests its chunks with its own fingerprint
+            tokens.setdefault(os.path.dirname(url), set()).add(match.group(1))
+    for namespace, paths in app.registered_paths.items():
+        for path in paths:
+            if path.endswith('.map'):
+                continue
+            urls.add(f'_dash-component-suites/{namespace}/{path}')
+            directory, filename = os.path.split(path)
+            name, extension = filename.split('.', 1)
+            for token in tokens.get(os.path.dirname(f'_dash-component-suites/{namespace}/{path}'), []):
+                urls.add(f'_dash-component-suites/{namespace}/{os.path.join(directory, name)}.{token}.{extension}')
+
+    for url in sorted(urls):
+        response = client.get('/' + url)
+        if response.status_code != 200:
+            continue
+        target = os.path.join(output, url)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(response.data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the dashboard as a static site')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--backend-url', default='',
+                        help='the live dashboard that the tabs with open-ended inputs link to')
+    args = parser.parse_args()
+
+    # every callback answers in the request, background jobs would only hand back a job to poll
+    os.environ['DATAPOOL_BACKGROUND'] = '0'
+    from app import app, render_tab_content
+
+    start = time.perf_counter()
+    if os.path.isdir(os.path.join(args.output, 'callbacks')):
+        shutil.rmtree(os.path.join(args.output, 'callbacks'))
+    os.makedirs(args.output, exist_ok=True)
+
+    static, lookups, failed, tab_ids, live_tabs = build_lookups(app, render_tab_content, args.output,
+                                                                args.backend_url)
+    client = app.server.test_client()
+    layout = open_static_tab(client.get('/_dash-layout').get_json(), tab_ids, live_tabs)
+    index_html = client.get('/').data.decode()
+    copy_assets(app, args.output, index_html)
+
+    with open(os.path.join(args.output, LOOKUP_SCRIPT), 'w') as f:
+        f.write(lookup_script(lookups, layout, static))
+    # relative paths so the site also works under a sub-path, the lookups run before the renderer starts
+    index_html = index_html.replace('"/_dash-component-suites/', '"_dash-component-suites/')
+    index_html = re.sub(r'"/_favicon\.ico\?[^"]*"', '"_favicon.ico"', index_html)
+    index_html = index_html.replace('<footer>', f'<footer>\n            <script src="{LOOKUP_SCRIPT}"></script>', 1)
+    with open(os.path.join(args.output, 'index.html'), 'w') as f:
+        f.write(index_html)
+
+    n_files = sum(len(files) for _, _, files in os.walk(os.path.join(args.output, 'callbacks')))
+    print(f"{len(static)} static callbacks, {n_files} prebuilt files, {failed} failed combinations, "
+          f"live only: {', '.join(live_tabs) or 'none'}, in {time.perf_counter() - start:.1f}s -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
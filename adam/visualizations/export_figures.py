@@ -0,0 +1,251 @@
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+import modules.data_refresh as data_refresh
+import modules.data_store as data_store
+import modules.cl_results as cl_results
+import modules.goalkeeping_performance as goalkeeping_performance
+import modules.home_away_performance as home_away_performance
+import modules.shot_analysis as shot_analysis
+import modules.top_6_race as top_6_race
+import modules.top_scorers as top_scorers
+import modules.transfers_analysis as transfers_analysis
+import modules.xg_difference as xg_difference
+import modules.game_state as game_state
+
+# renders every variant of the dashboard figures to static files without a browser:
+# figure JSON and HTML always, PNG when kaleido is installed and --png is given
+# run from adam/visualizations: python export_figures.py [--output exports] [--workers 4] [--png]
+# manifest.json in the output directory keeps a key of every figure: a hash of the data file versions, the code of the
+# figures and the job's parameters, a figure whose key did not change is not built again
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports')
+
+MANIFEST = 'manifest.json'
+
+
+def code_version():
+    # the figures change with the code that draws them as much as with the data
+    digest = hashlib.sha256()
+    root = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted([os.path.join(root, 'modules', name) for name in os.listdir(os.path.join(root, 'modules'))
+                        if name.endswith('.py')] + [os.path.abspath(__file__)]):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def job_key(job, data_version, code, png, plotlyjs):
+    path, builder, kwargs = job
+    parameters = {'data': data_version, 'code': code, 'builder': builder, 'kwargs': kwargs, 'png': png,
+                  'plotlyjs': plotlyjs}
+    return hashlib.sha256(json.dumps(parameters, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def slug(value):
+    return str(value).lower().replace('/', '-').replace(' ', '-').replace("'", '')
+
+
+# figure builders by name, every one takes the store and the keyword arguments of its job
+
+
+def top_6_race_figure(store, league, season):
+    return store.derived('top_6_figure', top_6_race.create_figure, league, season)
+
+
+def title_odds_figure(store, league, season):
+    return store.derived('title_odds_figure', top_6_race.create_title_odds_figure, league, season)
+
+
+def top_scorers_figure(store, league, season, matchday):
+    return top_scorers.update_figure(store, matchday, league, season)
+
+
+def home_away_figure(store, league, season, sort_order):
+    return store.derived('home_away_figures', home_away_performance.build_figures, league, season)[sort_order]
+
+
+def xg_difference_figure(store, league, season, window, matchday):
+    xg_cube = store.derived('xg_cube', xg_difference.build_xg_cube, league, season)
+    club_shots = store.derived('club_shots', xg_difference.build_club_shots, league, season)
+    luck = xg_difference.luck_table(club_shots, window, matchday)
+    return xg_difference.create_figure(xg_cube, league, season, window, matchday, luck)
+
+
+def xg_time_series_figure(store, league, season, window):
+    return xg_difference.create_time_series_figure(store.derived('xg_cube', xg_difference.build_xg_cube, league, season),
+                                                   window)
+
+
+def game_state_figure(store, league, season, view):
+    tagged = store.derived('game_states', game_state.build_game_states, league, season)
+    return xg_difference.create_game_state_figure(tagged, league, season, view)
+
+
+def shot_stopping_figure(store, league, season):
+    agg_df = store.derived('goalkeeping', goalkeeping_performance.build_goalkeeping, league, season)
+    return goalkeeping_performance.create_shot_stopping_figure(agg_df, league, season)
+
+
+def shot_analysis_figure(store, player):
+    return shot_analysis.plot_player_shots(store, player)
+
+
+def finishing_figure(store, player):
+    return shot_analysis.plot_finishing(store, player)
+
+
+def transfers_figure(store, club):
+    return transfers_analysis.get_scatter_figure(store, club)
+
+
+def cl_results_figure(store):
+    return store.shared('cl_figure', cl_results.create_figure)
+
+
+builders = {builder.__name__: builder for builder in [
+    top_6_race_figure, title_odds_figure, top_scorers_figure, home_away_figure, xg_difference_figure,
+    xg_time_series_figure, game_state_figure, shot_stopping_figure, shot_analysis_figure, finishing_figure,
+    transfers_figure, cl_results_figure,
+]}
+
+
+def figure_jobs(store):
+    # (output path without extension, builder name, keyword arguments) for every figure variant
+    jobs = []
+    for league, season in data_store.available_partitions():
+        partition = {'league': league, 'season': season}
+        prefix = f'{slug(league)}-{slug(season)}'
+        jobs.append((f'{prefix}/top_6_race/positions', 'top_6_race_figure', partition))
+        jobs.append((f'{prefix}/top_6_race/title_odds', 'title_odds_figure', partition))
+
+        agg_df, _ = store.derived('top_scorers', top_scorers.build_top_scorers, league, season)
+        for matchday in sorted(agg_df['MatchDay'].unique()):
+            jobs.append((f'{prefix}/top_scorers/matchday_{matchday:02d}', 'top_scorers_figure',
+                         {**partition, 'matchday': int(matchday)}))
+
+        for sort_order in home_away_performance.sort_orders:
+            jobs.append((f'{prefix}/home_away/{sort_order or "alphabetical"}', 'home_away_figure',
+                         {**partition, 'sort_order': sort_order}))
+
+        n_matchdays = int(store.derived('xg_cube', xg_difference.build_xg_cube, league, season)['n_matchdays'])
+        for window in xg_difference.windows:
+            jobs.append((f'{prefix}/xg_difference/{window}/time_series', 'xg_time_series_figure',
+                         {**partition, 'window': window}))
+            for matchday in range(1, n_matchdays + 1):
+                jobs.append((f'{prefix}/xg_difference/{window}/matchday_{matchday:02d}', 'xg_difference_figure',
+                             {**partition, 'window': window, 'matchday': matchday}))
+        for view in xg_difference.game_state_views:
+            jobs.append((f'{prefix}/xg_difference/game_state_{view}', 'game_state_figure', {**partition, 'view': view}))
+
+        jobs.append((f'{prefix}/goalkeeping/shot_stopping', 'shot_stopping_figure', partition))
+
+    # the datasets that are not split by league and season
+    _, players = store.shared('liverpool_shots', shot_analysis.build_liverpool_shots)
+    for player in players:
+        jobs.append((f'shared/shot_analysis/{slug(player)}', 'shot_analysis_figure', {'player': player}))
+        jobs.append((f'shared/shot_analysis/{slug(player)}_finishing', 'finishing_figure', {'player': player}))
+
+    clubs = store.shared('transfers', transfers_analysis.load_transfers)['Club'].unique().tolist()
+    for club in clubs + ['All']:
+        jobs.append((f'shared/transfers_analysis/{slug(club)}', 'transfers_figure', {'club': club}))
+
+    jobs.append(('shared/cl_results/summary', 'cl_results_figure', {}))
+    return jobs
+
+
+def render(job, output, png, plotlyjs):
+    # builds one figure in a worker, every worker keeps its own store so the tables of a partition are loaded once
+    path, builder, kwargs = job
+    fig = builders[builder](data_store.get_store(), **kwargs)
+    figure_json = fig.to_json()
+    files = [f'{path}.json', f'{path}.html'] + ([f'{path}.png'] if png else [])
+
+    target = os.path.join(output, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(f'{target}.json', 'w') as f:
+        f.write(figure_json)
+    if plotlyjs == 'directory':
+        # the HTML files load plotly.min.js from the output root, which is written once by the main process
+        depth = path.count('/')
+        include = os.path.join(*(['..'] * depth), 'plotly.min.js') if depth else 'plotly.min.js'
+        html = pio.to_html(fig, include_plotlyjs=False, full_html=True)
+        html = html.replace('<head>', f'<head><script src="{include}"></script>', 1)
+    else:
+        html = pio.to_html(fig, include_plotlyjs='cdn', full_html=True)
+    with open(f'{target}.html', 'w') as f:
+        f.write(html)
+    if png:
+        fig.write_image(f'{target}.png')
+    return path, files
+
+
+def load_manifest(output):
+    path = os.path.join(output, MANIFEST)
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(output, manifest):
+    with open(os.path.join(output, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export every dashboard figure to static files')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--png', action='store_true', help='also write PNG files, needs kaleido')
+    parser.add_argument('--plotlyjs', choices=['cdn', 'directory'], default='cdn',
+                        help='load plotly.js from the CDN or from one copy in the output directory')
+    parser.add_argument('--only', help='export only the figures whose path contains this text')
+    args = parser.parse_args()
+
+    if args.png and importlib.util.find_spec('kaleido') is None:
+        parser.error('--png needs the kaleido package')
+
+    start = time.perf_counter()
+    os.makedirs(args.output, exist_ok=True)
+    jobs = figure_jobs(data_store.get_store())
+    if args.only:
+        jobs = [job for job in jobs if args.only in job[0]]
+    if args.plotlyjs == 'directory':
+        with open(os.path.join(args.output, 'plotly.min.js'), 'w') as f:
+            f.write(get_plotlyjs())
+
+    # the keys are compared before anything is built, an unchanged figure costs a hash and a stat
+    manifest = load_manifest(args.output)
+    data_version, code = data_refresh.data_version(), code_version()
+    keys = {job[0]: job_key(job, data_version, code, args.png, args.plotlyjs) for job in jobs}
+    pending = [job for job in jobs
+               if manifest.get(job[0], {}).get('key') != keys[job[0]]
+               or not all(os.path.isfile(os.path.join(args.output, file)) for file in manifest[job[0]]['files'])]
+    n = len(pending)
+    arguments = (pending, [args.output] * n, [args.png] * n, [args.plotlyjs] * n)
+
+    # jobs of the same partition and tab are next to each other, chunks keep them on the same worker
+    if args.workers > 1 and n > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(render, *arguments, chunksize=max(1, n // (args.workers * 4))))
+    else:
+        results = list(map(render, *arguments))
+
+    for path, files in results:
+        manifest[path] = {'key': keys[path], 'files': files}
+    save_manifest(args.output, manifest)
+    print(f"{len(jobs)} figures, {n} written, {len(jobs) - n} unchanged, in {time.perf_counter() - start:.1f}s "
+          f"-> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
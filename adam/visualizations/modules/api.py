@@ -0,0 +1,278 @@
+import json
+import threading
+import zlib
+from collections import OrderedDict
+
+import pandas as pd
+from flask import Blueprint, Response, abort, request
+from werkzeug.exceptions import HTTPException
+
+import modules.data_store as data_store
+import modules.data_refresh as data_refresh
+import modules.entities as entities
+import modules.expected_points as expected_points
+import modules.goal_distribution as goal_distribution
+import modules.top_6_race as top_6_race
+import modules.xg_difference as xg_difference
+import modules.club_transfer_details as club_transfer_details
+
+try:
+    import orjson
+except ImportError:  # the standard library serializer is used instead, only slower
+    orjson = None
+
+# read-only JSON over the same tables and cubes the dashboard draws from, mounted on the Dash server under /api/v1
+# every response carries an ETag of the data version and the request, the data only changes on a reload,
+# so a client that sends If-None-Match gets a 304 without anything being computed or serialized
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# floats are rounded to this many decimals, float32 columns would otherwise show their binary noise
+FLOAT_DIGITS = 6
+
+# serialized bodies by (data version, path and query), the oldest are dropped first
+MAX_CACHED_RESPONSES = 512
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+_responses = OrderedDict()
+_responses_lock = threading.Lock()
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=str, allow_nan=False).encode()
+
+
+def records(df):
+    # plain Python values for the serializers: dates as ISO strings, missing values as null
+    df = df.copy()
+    for column in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = df[column].dt.strftime('%Y-%m-%d')
+        elif pd.api.types.is_float_dtype(df[column]):
+            df[column] = df[column].astype(float).round(FLOAT_DIGITS)
+    df = df.astype(object)
+    return df.where(df.notna(), None).to_dict('records')
+
+
+def int_arg(name, default=None):
+    # a query argument that must be a whole number, a typo is an error rather than the default
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        abort(400, f"{name} must be a whole number")
+
+
+def page_size():
+    size = int_arg('per_page', DEFAULT_PAGE_SIZE)
+    if size < 1 or size > MAX_PAGE_SIZE:
+        abort(400, f"per_page must be between 1 and {MAX_PAGE_SIZE}")
+    return size
+
+
+def paginate(rows):
+    page = int_arg('page', 1)
+    per_page = page_size()
+    if page < 1:
+        abort(400, "page must be 1 or more")
+    start = (page - 1) * per_page
+    pages = max(1, -(-len(rows) // per_page))
+    return {
+        'data': rows[start:start + per_page],
+        'page': page,
+        'per_page': per_page,
+        'total': len(rows),
+        'pages': pages,
+    }
+
+
+def partition():
+    league = request.args.get('league', data_store.DEFAULT_LEAGUE)
+    season = request.args.get('season', data_store.DEFAULT_SEASON)
+    if (league, season) not in data_store.available_partitions():
+        abort(404, f"No data for {league} {season}")
+    return league, season
+
+
+def etag():
+    # the same request on the same data files always gets the same body, in every worker and after restarts
+    version = data_refresh.data_version()
+    return f'"{version}-{zlib.crc32(f"{version}:{request.full_path}".encode()):08x}"'
+
+
+def cached(view):
+    # answers If-None-Match with 304 and keeps the serialized bodies of the current data version
+    def wrapper(*args, **kwargs):
+        tag = etag()
+        headers = {'ETag': tag, 'Cache-Control': 'no-cache'}
+        if tag in request.if_none_match:
+            return Response(status=304, headers=headers)
+
+        with _responses_lock:
+            body = _responses.get(tag)
+            if body is not None:
+                _responses.move_to_end(tag)
+        if body is None:
+            body = dumps(view(*args, **kwargs))
+            with _responses_lock:
+                _responses[tag] = body
+                while len(_responses) > MAX_CACHED_RESPONSES:
+                    _responses.popitem(last=False)
+        return Response(body, mimetype='application/json', headers=headers)
+
+    wrapper.__name__ = view.__name__
+    return wrapper
+
+
+@api.errorhandler(HTTPException)
+def handle_error(error):
+    return Response(dumps({'error': error.name, 'message': error.description}), status=error.code,
+                    mimetype='application/json')
+
+
+@api.route('/<path:path>')
+def unknown(path):
+    # without this a typo under /api/v1 falls through to the dashboard page
+    abort(404, f"No endpoint /{path}")
+
+
+@api.route('/partitions')
+@cached
+def partitions():
+    return {'data': [{'league': league, 'season': season} for league, season in data_store.available_partitions()]}
+
+
+@api.route('/standings')
+@cached
+def standings():
+    # the table after every matchday, or after one with ?matchday=
+    league, season = partition()
+    store = data_store.get_store()
+    df = store.derived('standings', top_6_race.build_standings, league, season)
+    matchday = int_arg('matchday')
+    if matchday is not None:
+        df = df[df['Chronological Matchday'] == matchday]
+    columns = ['Chronological Matchday', 'League Position', 'Club', 'Club ID', 'Date', 'Opponent', 'Result',
+               'Points', 'Accumulated Points', 'Goal Difference', 'Accumulated xPts']
+    return paginate(records(df[columns]))
+
+
+@api.route('/xg')
+@cached
+def xg_table():
+    # goals, xG, points and xPts per club over a window of games up to a matchday, as in the xG tab
+    league, season = partition()
+    xg_cube = data_store.get_store().derived('xg_cube', xg_difference.build_xg_cube, league, season)
+    window = request.args.get('window', 'season')
+    if window not in xg_difference.windows:
+        abort(400, f"window must be one of {list(xg_difference.windows)}")
+    matchday = int_arg('matchday', xg_cube['n_matchdays'])
+    if not 1 <= matchday <= xg_cube['n_matchdays']:
+        abort(400, f"matchday must be between 1 and {xg_cube['n_matchdays']}")
+    table = xg_difference.matchday_table(xg_cube, window, matchday).sort_values('xG_difference', ascending=False)
+    return paginate(records(table))
+
+
+@api.route('/xpts')
+@cached
+def xpts_table():
+    league, season = partition()
+    xpts = data_store.get_store().derived('xpts', expected_points.build_xpts, league, season)
+    return paginate(records(expected_points.xpts_table(xpts, int_arg('matchday'))))
+
+
+def build_player_shots(store, league, season):
+    # shots, goals and xG of every player with the goal distribution of the shots, for the player endpoints
+    shots = store.load('shots', league, season)
+    table = goal_distribution.goal_table(shots, 'Player ID')
+    table.insert(0, 'Player', [entities.players.name(player_id) for player_id in table.index])
+    return table.reset_index().sort_values('Goals', ascending=False, kind='stable')
+
+
+@api.route('/players/shots')
+@cached
+def player_shots():
+    league, season = partition()
+    table = data_store.get_store().derived('api_player_shots', build_player_shots, league, season)
+    return paginate(records(table))
+
+
+@api.route('/players/<int:player_id>/shots')
+@cached
+def player_shot_summary(player_id):
+    league, season = partition()
+    table = data_store.get_store().derived('api_player_shots', build_player_shots, league, season)
+    row = table[table['Player ID'] == player_id]
+    if row.empty:
+        abort(404, f"No shots of player {player_id} in {league} {season}")
+    return {'data': records(row)[0]}
+
+
+def percentile_columns(df):
+    # player, club, position and every percentile column of the radar charts
+    columns = ['Player', 'Player ID', 'Club', 'Club ID', 'Position', 'Age', 'Minutes played']
+    return df[columns + [column for column in df.columns if column.endswith('_percentile')]]
+
+
+def build_percentiles(store):
+    return percentile_columns(store.load_dataset('player_percentiles'))
+
+
+@api.route('/percentiles')
+@cached
+def percentiles():
+    # ?position=, ?club= and ?player= narrow the list down
+    where = {column: request.args[argument] for argument, column in
+             [('position', 'Position'), ('club', 'Club'), ('player', 'Player')] if argument in request.args}
+    store = data_store.get_store()
+    if where:
+        df = percentile_columns(store.select('player_percentiles', where))
+    else:
+        df = store.shared('api_percentiles', build_percentiles)
+    return paginate(records(df))
+
+
+@api.route('/percentiles/<int:player_id>')
+@cached
+def player_percentiles(player_id):
+    rows = percentile_columns(data_store.get_store().select('player_percentiles', {'Player ID': player_id}))
+    if rows.empty:
+        abort(404, f"No percentiles for player {player_id}")
+    # a player who changed clubs mid-season has one row per club
+    return {'data': records(rows)}
+
+
+@api.route('/transfers')
+@cached
+def transfers():
+    # fees, transfer counts and net spend per club between two seasons (?first=, ?last=, both inclusive)
+    cube = data_store.get_store().shared('transfer_cube', club_transfer_details.load_transfer_cube)
+    seasons = cube['seasons']
+    first = request.args.get('first', seasons[0])
+    last = request.args.get('last', seasons[-1])
+    if first not in seasons or last not in seasons:
+        abort(400, f"first and last must be seasons of {seasons}")
+    if seasons.index(first) > seasons.index(last):
+        abort(400, f"first ({first}) must not come after last ({last})")
+    totals = club_transfer_details.range_totals(cube, seasons.index(first), seasons.index(last))
+    table = pd.DataFrame({
+        'Club': cube['clubs'],
+        'Arrival Fees': totals['fees'][:, 0],
+        'Departure Fees': totals['fees'][:, 1],
+        'Arrivals': totals['counts'][:, 0],
+        'Departures': totals['counts'][:, 1],
+        'Net Spend': totals['net_spend'],
+    }).sort_values('Net Spend', ascending=False)
+    result = paginate(records(table))
+    result.update({'first': first, 'last': last})
+    return result
+
+
+def register_routes(server):
+    server.register_blueprint(api)
@@ -0,0 +1,70 @@
+import functools
+import os
+import tempfile
+
+from dash import DiskcacheManager
+
+import modules.data_refresh as data_refresh
+
+try:
+    import diskcache
+except ImportError:  # without diskcache the heavy callbacks run inside the request like any other callback
+    diskcache = None
+
+# heavy callbacks run in a subprocess started by dash's DiskcacheManager, the Flask worker thread that received
+# the request only polls for the result, no broker is needed: jobs, progress and results live in a local diskcache
+# results are cached by the callback's inputs and the version of the data files, so a reload that changed the data
+# starts over with fresh results, and results outlive a restart of the app on the same data
+# the subprocess has its own copy of the data store, tables it builds are lost with it, so a background callback
+# should return its result instead of keeping it in the store, the result cache is where it is kept
+# opt in with @background.callback(app, Output(...), Input(...), progress=..., running=..., cancel=...)
+
+CACHE_DIR = os.environ.get('DATAPOOL_BACKGROUND_CACHE', os.path.join(tempfile.gettempdir(), 'datapool-background'))
+
+# DATAPOOL_BACKGROUND=0 runs them inline, for scripts that call the callbacks through the test client
+ENABLED = os.environ.get('DATAPOOL_BACKGROUND', '1') != '0'
+
+# cached results are dropped after a day
+RESULT_EXPIRE = 24 * 60 * 60
+
+_manager = None
+_warned = False
+
+
+def available():
+    return ENABLED and diskcache is not None
+
+
+def get_manager():
+    # one manager for the app, created on the first background callback
+    global _manager
+    if _manager is None and available():
+        cache = diskcache.Cache(CACHE_DIR)
+        _manager = DiskcacheManager(cache, cache_by=[data_refresh.data_version], expire=RESULT_EXPIRE)
+    return _manager
+
+
+def callback(app, *dependencies, progress=None, progress_default=None, cancel=None, **kwargs):
+    # app.callback for heavy work: with progress the function gets set_progress as its first argument,
+    # cancel inputs stop a running job, running works as in app.callback
+    def decorator(function):
+        manager = get_manager()
+        if manager is not None:
+            return app.callback(*dependencies, background=True, manager=manager, progress=progress,
+                                progress_default=progress_default, cancel=cancel, **kwargs)(function)
+
+        # the same callback inline: progress goes nowhere and there is no job to cancel, running still works
+        global _warned
+        if (progress is not None or cancel is not None) and not _warned:
+            _warned = True
+            reason = 'DATAPOOL_BACKGROUND=0' if diskcache is not None else 'diskcache is not installed'
+            print(f"Warning: {reason}, heavy callbacks run inside the request without progress or cancel buttons")
+        if progress is None:
+            return app.callback(*dependencies, **kwargs)(function)
+
+        @functools.wraps(function)
+        def inline(*args):
+            return function(lambda value: None, *args)
+        return app.callback(*dependencies, **kwargs)(inline)
+
+    return decorator
@@ -1,26 +1,11 @@
-import pandas as pd
 import plotly.graph_objects as go
 from dash import dcc, html
 
-# Load data
-df_results = pd.read_csv("../../adrian/data/cl_results.csv")
-df_players = pd.read_csv("../../adrian/data/cl_season_standard_stats.csv")
+import modules.data_store as data_store
 
-# calculate total goals scored, conceded, wins, draws, and losses (cols 1 and 2)
-total_goals_scored = df_results['GF'].sum()
-total_goals_conceded = df_results['GA'].sum()
-total_wins = (df_results['Result'] == 'W').sum()
-total_draws = (df_results['Result'] == 'D').sum()
-total_losses = (df_results['Result'] == 'L').sum()
-
-# calculate total goals and assists by players (cols 3 and 4)
-player_goals = df_players.groupby('Player')['Gls'].sum().sort_values(ascending=False)
-player_assists = df_players.groupby('Player')['Ast'].sum().sort_values(ascending=False)
-
-# filter for players with at least one goal or assist
-players_with_goals = set(player_goals[player_goals > 0].index)
-players_with_assists = set(player_assists[player_assists > 0].index)
-players_with_goals_or_assists = players_with_goals.union(players_with_assists)
+TAB_ID = 'cl-results-tab'
+TAB_LABEL = "CL Summary (Adrian)"
+TAB_ORDER = 80
 
 # define function to generate random unqiue colors 
 # every player should have a distinct color
@@ -40,25 +25,75 @@ def generate_color_gradient(index, max_index):
     # format rgb into hex code
     return "#{:02x}{:02x}{:02x}".format(r, g, b)
 
-# create mapping of players to colors based on the color gradient
-player_colors = {player: generate_color_gradient(index, len(players_with_goals_or_assists) - 1) 
-                 for index, player in enumerate(players_with_goals_or_assists)}
+def build_cl_summary(store):
+    df_results = store.load_dataset('cl_results')
+    df_players = store.load_dataset('cl_players')
+
+    # calculate total goals scored, conceded, wins, draws, and losses (cols 1 and 2)
+    total_goals_scored = df_results['GF'].sum()
+    total_goals_conceded = df_results['GA'].sum()
+    total_wins = (df_results['Result'] == 'W').sum()
+    total_draws = (df_results['Result'] == 'D').sum()
+    total_losses = (df_results['Result'] == 'L').sum()
+
+    # calculate total goals and assists by players (cols 3 and 4)
+    player_goals = df_players.groupby('Player', observed=True)['Gls'].sum().sort_values(ascending=False)
+    player_assists = df_players.groupby('Player', observed=True)['Ast'].sum().sort_values(ascending=False)
 
-# calculate total number of "bricks" (one rectangle) for each column
-total_bricks_goals = total_goals_scored + total_goals_conceded
-total_bricks_results = total_wins + total_draws + total_losses
-total_bricks_players_goals = player_goals.sum()
-total_bricks_players_assists = player_assists.sum()
+    # filter for players with at least one goal or assist
+    players_with_goals = set(player_goals[player_goals > 0].index)
+    players_with_assists = set(player_assists[player_assists > 0].index)
+    players_with_goals_or_assists = players_with_goals.union(players_with_assists)
 
-# calculate brick height for each column (all columns should have same size in the end)
-brick_height_goals = 100 / total_bricks_goals
-brick_height_results = 100 / total_bricks_results
-brick_height_players_goals = 100 / total_bricks_players_goals
-brick_height_players_assists = 100 / total_bricks_players_assists
+    # create mapping of players to colors based on the color gradient
+    # sorted, so every process (and every export) gives a player the same color
+    player_colors = {player: generate_color_gradient(index, len(players_with_goals_or_assists) - 1) 
+                     for index, player in enumerate(sorted(players_with_goals_or_assists))}
 
+    # calculate total number of "bricks" (one rectangle) for each column
+    total_bricks_goals = total_goals_scored + total_goals_conceded
+    total_bricks_results = total_wins + total_draws + total_losses
+    total_bricks_players_goals = player_goals.sum()
+    total_bricks_players_assists = player_assists.sum()
 
+    # calculate brick height for each column (all columns should have same size in the end)
+    brick_height_goals = 100 / total_bricks_goals
+    brick_height_results = 100 / total_bricks_results
+    brick_height_players_goals = 100 / total_bricks_players_goals
+    brick_height_players_assists = 100 / total_bricks_players_assists
+
+    return {
+        'df_players': df_players,
+        'total_goals_scored': total_goals_scored,
+        'total_goals_conceded': total_goals_conceded,
+        'total_wins': total_wins,
+        'total_draws': total_draws,
+        'total_losses': total_losses,
+        'player_goals': player_goals,
+        'player_assists': player_assists,
+        'player_colors': player_colors,
+        'brick_height_goals': brick_height_goals,
+        'brick_height_results': brick_height_results,
+        'brick_height_players_goals': brick_height_players_goals,
+        'brick_height_players_assists': brick_height_players_assists,
+    }
+
+def create_figure(store):
+    summary = store.shared('cl_summary', build_cl_summary)
+    df_players = summary['df_players']
+    total_goals_scored = summary['total_goals_scored']
+    total_goals_conceded = summary['total_goals_conceded']
+    total_wins = summary['total_wins']
+    total_draws = summary['total_draws']
+    total_losses = summary['total_losses']
+    player_goals = summary['player_goals']
+    player_assists = summary['player_assists']
+    player_colors = summary['player_colors']
+    brick_height_goals = summary['brick_height_goals']
+    brick_height_results = summary['brick_height_results']
+    brick_height_players_goals = summary['brick_height_players_goals']
+    brick_height_players_assists = summary['brick_height_players_assists']
 
-def create_figure():
     fig = go.Figure()
     column_width = 0.5
     column_positions = [0, 1.0, 2.0, 3.0]
@@ -257,9 +292,13 @@ def create_figure():
 
 def layout():
     return html.Div([
-        dcc.Graph(figure=create_figure()),
+        dcc.Graph(figure=data_store.get_store().shared('cl_figure', create_figure)),
         html.P("Data source: FBref", style={'text-align': 'center', 'font-size': '12px', 'color': 'gray'})
     ])
 
-def register_callbacks(app):
-    pass  # No callbacks needed for this visualization
+def load(store):
+    store.shared('cl_figure', create_figure)
+
+def register(app):
+    # no callbacks needed for this visualization, the figure is only prebuilt on reloads
+    pass
@@ -1,28 +1,89 @@
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import dash
 import dash_bootstrap_components as dbc
 
-# Load the data from a CSV file
-df = pd.read_csv('../data/transfer_data.csv')
+import modules.data_store as data_store
+import modules.patches as patches
 
-# Convert 'Fee' to numeric, handling non-numeric data as NaN and then replacing NaN with 0
-df['Fee'] = pd.to_numeric(df['Fee'], errors='coerce').fillna(0)
+TAB_ID = 'club-transfer-details-tab'
+TAB_LABEL = "Club Transfer Comparison (Adam)"
+TAB_ORDER = 100
 
-# Filter to include only the Big 6 clubs
+# The Big 6 clubs are selected by default
 big6_clubs = ['Liverpool', 'Manchester United', 'Manchester City', 'Chelsea', 'Arsenal', 'Tottenham Hotspur']
-df_big6 = df[df['Club'].isin(big6_clubs)]
 
-# Create a list of unique seasons
-seasons = sorted(df['Season'].unique())
+transfer_types = ['Arrival', 'Departure']
+
+# Dense (club, season, transfer type) cube of fee sums and transfer counts over the whole dataset,
+# plus prefix sums over the seasons so totals for any slider range are two lookups
+def build_transfer_cube(df):
+    clubs = sorted(df['Club'].dropna().unique())
+    seasons = sorted(df['Season'].dropna().unique())
+
+    index = (
+        pd.Categorical(df['Club'], categories=clubs).codes,
+        pd.Categorical(df['Season'], categories=seasons).codes,
+        pd.Categorical(df['Transfer'], categories=transfer_types).codes,
+    )
+    # rows without a club or season, or with another transfer type, have code -1 and would land in the last cell
+    valid = (index[0] >= 0) & (index[1] >= 0) & (index[2] >= 0)
+    index = tuple(codes[valid] for codes in index)
+    shape = (len(clubs), len(seasons), len(transfer_types))
+
+    fees = np.zeros(shape)
+    np.add.at(fees, index, df['Fee'].to_numpy()[valid])
+    counts = np.zeros(shape, dtype=np.int64)
+    np.add.at(counts, index, 1)
+
+    # income from departures counts against the money spent on arrivals
+    net_spend = fees[:, :, 0] - fees[:, :, 1]
+
+    def prefix(values):
+        zeros = np.zeros((values.shape[0], 1) + values.shape[2:], dtype=values.dtype)
+        return np.concatenate([zeros, np.cumsum(values, axis=1)], axis=1)
+
+    return {
+        'clubs': clubs,
+        'club_index': {club: i for i, club in enumerate(clubs)},
+        'seasons': seasons,
+        'fees': fees,
+        'counts': counts,
+        'net_spend': net_spend,
+        'fees_prefix': prefix(fees),
+        'counts_prefix': prefix(counts),
+        'net_spend_prefix': prefix(net_spend),
+    }
+
+# totals over the seasons first..last (inclusive) for every club at once
+def range_totals(cube, first, last):
+    return {
+        'fees': cube['fees_prefix'][:, last + 1] - cube['fees_prefix'][:, first],
+        'counts': cube['counts_prefix'][:, last + 1] - cube['counts_prefix'][:, first],
+        'net_spend': cube['net_spend_prefix'][:, last + 1] - cube['net_spend_prefix'][:, first],
+    }
+
+def load_transfer_cube(store):
+    df = store.load_dataset('transfers').copy()
+
+    # Convert 'Fee' to numeric, handling non-numeric data as NaN and then replacing NaN with 0
+    df['Fee'] = pd.to_numeric(df['Fee'], errors='coerce').fillna(0)
+
+    return build_transfer_cube(df)
 
 def layout():
+    transfer_cube = data_store.get_store().shared('transfer_cube', load_transfer_cube)
+
+    # Create a list of unique seasons
+    seasons = transfer_cube['seasons']
+
     return dbc.Container([
         dbc.Row([
             dbc.Col([
-                html.H1("Big 6 Club Transfer Incomes and Expenses", className="text-center my-4")
+                html.H1("Club Transfer Incomes and Expenses", className="text-center my-4")
             ])
         ]),
         dbc.Row([
@@ -60,7 +121,7 @@ def layout():
                 html.Label('Select Clubs:', style={'fontWeight': 'bold', 'fontSize': '18px'}),
                 dcc.Checklist(
                     id='club-checklist',
-                    options=[{'label': club, 'value': club} for club in big6_clubs],
+                    options=[{'label': club, 'value': club} for club in transfer_cube['clubs']],
                     value=big6_clubs,
                     inline=True,  # Keep horizontal alignment
                     inputStyle={'margin-right': '10px', 'transform': 'scale(1.5)'},
@@ -70,49 +131,62 @@ def layout():
         ]),
         dbc.Row([
             dbc.Col([
-                dcc.Graph(id='area-plot', config={'displayModeBar': False})
+                dcc.Graph(id='area-plot', config={'displayModeBar': False}),
+                # the clubs the area plot currently shows
+                dcc.Store(id='area-plot-clubs', data=[])
             ], width=12, style={'marginTop': '0px'})
         ])
     ], fluid=True, style={'padding': '0px'})
 
-def register_callbacks(app):
+def load(store):
+    store.shared('transfer_cube', load_transfer_cube)
+
+def register(app):
     @app.callback(
         Output('area-plot', 'figure'),
+        Output('area-plot-clubs', 'data'),
         [
             Input('season-slider', 'value'),
             Input('transfer-type-radio', 'value'),
             Input('club-checklist', 'value')
-        ]
+        ],
+        State('area-plot-clubs', 'data')
     )
-    def update_area_plot(selected_seasons, selected_transfer_type, selected_clubs):
-        #### Filtering Data Based on User Selection
-        filtered_seasons = seasons[selected_seasons[0]:selected_seasons[1] + 1]
-
-        filtered_df = df_big6[
-            (df_big6['Season'].isin(filtered_seasons)) &
-            (df_big6['Transfer'] == selected_transfer_type) &
-            (df_big6['Club'].isin(selected_clubs))
-        ]
-
-        #### Creating the Plot
-        fig = go.Figure()
-
-        for club in selected_clubs:
-            club_data = filtered_df[filtered_df['Club'] == club]
-            club_data = club_data.groupby('Season').agg({'Fee': 'sum'}).reset_index()
+    def update_area_plot(selected_seasons, selected_transfer_type, selected_clubs, previous_clubs):
+        #### Slicing the precomputed cube for the selected seasons
+        transfer_cube = data_store.get_store().shared('transfer_cube', load_transfer_cube)
+        seasons = transfer_cube['seasons']
+        first, last = selected_seasons
+        filtered_seasons = seasons[first:last + 1]
+        type_index = transfer_types.index(selected_transfer_type)
+        totals = range_totals(transfer_cube, first, last)
 
-            fig.add_trace(go.Scatter(
-                x=club_data['Season'],
-                y=club_data['Fee'],
+        def club_trace(club):
+            i = transfer_cube['club_index'][club]
+            return go.Scatter(
+                x=filtered_seasons,
+                y=transfer_cube['fees'][i, first:last + 1, type_index],
+                customdata=transfer_cube['counts'][i, first:last + 1, type_index],
                 mode='lines',
-                name=club,
+                name=f"{club} (€{totals['fees'][i, type_index]:.0f}M, net spend €{totals['net_spend'][i]:.0f}M)",
                 fill='tozeroy',
-                hovertemplate=f'{club}<br>Season: %{{x}}<br>Fee: €%{{y:.2f}}M'
-            ))
+                hovertemplate=f'{club}<br>Season: %{{x}}<br>Fee: €%{{y:.2f}}M<br>Transfers: %{{customdata}}<extra></extra>'
+            )
+
+        #### Toggling one club only adds or removes its area, the seasons and transfer type redraw the plot
+        delta = None
+        if dash.ctx.triggered_id == 'club-checklist' and previous_clubs:
+            delta = patches.selection_delta(previous_clubs, selected_clubs)
+        if delta is not None:
+            removed, added = delta
+            return patches.patch_traces(removed, [club_trace(club).to_plotly_json() for club in added]), selected_clubs
+
+        #### Creating the Plot
+        fig = go.Figure([club_trace(club) for club in selected_clubs])
 
         #### Updating the Layout
         fig.update_layout(
-            title=f'Big 6 Club Transfer {selected_transfer_type}s per Season',
+            title=f'Club Transfer {selected_transfer_type}s per Season',
             xaxis=dict(
                 title="Season",
                 type='category',
@@ -149,12 +223,4 @@ def register_callbacks(app):
             height=550  # Increased height for the chart
         )
 
-        return fig
-
-# Initialize the Dash app and register callbacks
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-app.layout = layout()
-register_callbacks(app)
-
-if __name__ == '__main__':
-    app.run_server(debug=True, port=8051)
+        return fig, selected_clubs
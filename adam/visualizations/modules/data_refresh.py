@@ -0,0 +1,202 @@
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+
+from flask import Response, jsonify, request
+
+import modules.data_store as data_store
+import modules.entities as entities
+import modules.sqlite_store as sqlite_store
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# seconds between two checks of the data files
+WATCH_INTERVAL = float(os.environ.get('DATAPOOL_WATCH_INTERVAL', 5))
+
+# tracing the allocations of a reload gives its peak memory but makes it several times slower, so it is opt-in
+TRACE_RELOADS = os.environ.get('DATAPOOL_TRACE_RELOADS', '0') == '1'
+
+# POST /admin/reload needs "Authorization: Bearer <token>" with this token, without one only localhost may reload
+ADMIN_TOKEN = os.environ.get('DATAPOOL_ADMIN_TOKEN')
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+# functions that prebuild tables and figures on a fresh store before it is swapped in, by name
+warmups = {}
+
+# numbers about the reloads, exported on /metrics
+metrics = {
+    'generation': 0,
+    'reloads_total': 0,
+    'reload_failures_total': 0,
+    'last_reload_seconds': 0.0,
+    'last_reload_peak_bytes': 0,
+    'last_reload_timestamp': 0.0,
+    'max_rss_bytes': 0,
+}
+
+_reload_lock = threading.Lock()
+_data_version = None
+_watcher = None
+
+
+def register_warmup(name, warmup):
+    # warmup is called as warmup(store) on every new store, registering the same name twice replaces it
+    warmups[name] = warmup
+
+
+def warm(store):
+    for warmup in list(warmups.values()):
+        warmup(store)
+    return store
+
+
+def max_rss_bytes():
+    if resource is None:
+        return 0
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def version_of(versions):
+    # a short fingerprint of the data files and the id table, the same in every worker and after a restart
+    files = dict(versions)
+    if os.path.isfile(entities.ID_TABLE):
+        stat = os.stat(entities.ID_TABLE)
+        files[entities.ID_TABLE] = (stat.st_mtime_ns, stat.st_size)
+    return f'{zlib.crc32(json.dumps(sorted(files.items())).encode()):08x}'
+
+
+def data_version():
+    # the version of the files the served store was built from, unlike the generation it does not start over
+    # in every process, so it can key caches that outlive a process or are shared between workers
+    global _data_version
+    if _data_version is None:
+        _data_version = version_of(file_versions())
+    return _data_version
+
+
+def reload():
+    # builds a complete new store next to the current one and swaps it in only when everything is built,
+    # so callbacks see either the old or the new data but never a half built mix
+    global _data_version
+    with _reload_lock:
+        started_tracing = TRACE_RELOADS and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        versions = file_versions()
+        try:
+            # the SQLite store is brought up to date first, warming the new store may already read from it
+            if sqlite_store.ENABLED:
+                if not sqlite_store.is_current(versions):
+                    sqlite_store.build(data_store.all_tables(), versions)
+            store = warm(data_store.DataStore())
+        except Exception:
+            metrics['reload_failures_total'] += 1
+            raise
+        finally:
+            # stays 0 when allocations are not traced
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+        data_store.swap_store(store)
+        _data_version = version_of(versions)
+        metrics['generation'] += 1
+        metrics['reloads_total'] += 1
+        metrics['last_reload_seconds'] = time.perf_counter() - start
+        metrics['last_reload_peak_bytes'] = peak
+        metrics['last_reload_timestamp'] = time.time()
+        metrics['max_rss_bytes'] = max_rss_bytes()
+        return store
+
+
+def reload_in_background():
+    thread = threading.Thread(target=_safe_reload, name='data-reload', daemon=True)
+    thread.start()
+    return thread
+
+
+def _safe_reload():
+    try:
+        reload()
+    except Exception as e:
+        # the old store stays in place, the failure shows up in the metrics
+        print(f"Warning: data reload failed, keeping the previous data: {e}")
+
+
+def file_versions():
+    versions = {}
+    for path in data_store.data_files():
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        versions[path] = (stat.st_mtime_ns, stat.st_size)
+    return versions
+
+
+def watch(interval=WATCH_INTERVAL, stop_event=None):
+    versions = file_versions()
+    stop_event = stop_event or threading.Event()
+    while not stop_event.wait(interval):
+        current = file_versions()
+        if current != versions:
+            versions = current
+            _safe_reload()
+
+
+def start_watcher(interval=WATCH_INTERVAL):
+    global _watcher
+    if _watcher is None or not _watcher.is_alive():
+        _watcher = threading.Thread(target=watch, args=(interval,), name='data-watcher', daemon=True)
+        _watcher.start()
+    return _watcher
+
+
+def render_metrics():
+    # Prometheus text format, so the numbers can be scraped without extra dependencies
+    lines = []
+    for name, kind, help_text in [
+        ('generation', 'gauge', 'Number of the data snapshot that is currently served'),
+        ('reloads_total', 'counter', 'Successful data reloads'),
+        ('reload_failures_total', 'counter', 'Data reloads that failed and kept the previous data'),
+        ('last_reload_seconds', 'gauge', 'Wall time of the last data reload'),
+        ('last_reload_peak_bytes', 'gauge', 'Peak traced Python memory while building the last snapshot'),
+        ('last_reload_timestamp', 'gauge', 'Unix time of the last data reload'),
+        ('max_rss_bytes', 'gauge', 'Resident memory high-water mark of the process after the last reload'),
+    ]:
+        lines.append(f'# HELP datapool_{name} {help_text}')
+        lines.append(f'# TYPE datapool_{name} {kind}')
+        lines.append(f'datapool_{name} {metrics[name]}')
+    return '\n'.join(lines) + '\n'
+
+
+def authorized():
+    if ADMIN_TOKEN:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {ADMIN_TOKEN}')
+    return request.remote_addr in LOCAL_ADDRESSES
+
+
+def register_routes(server):
+    @server.route('/admin/reload', methods=['POST'])
+    def trigger_reload():
+        if not authorized():
+            return jsonify({'error': 'reloading needs DATAPOOL_ADMIN_TOKEN or a request from localhost'}), 403
+        reload_in_background()
+        return jsonify({'status': 'reloading', 'generation': metrics['generation']}), 202
+
+    @server.route('/metrics')
+    def export_metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,271 @@
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from dash import dcc, html
+from dash.dependencies import Input, Output, State
+
+import modules.entities as entities
+import modules.schemas as schemas
+import modules.sqlite_store as sqlite_store
+
+# root of the repository, so the store works no matter where the app is started from
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+DEFAULT_LEAGUE = 'Premier League'
+DEFAULT_SEASON = '2018/2019'
+
+# partitioned storage is laid out as <root>/<league>/<season>/<dataset>.csv
+# seasons use "-" instead of "/" in the directory name, e.g. "Premier League/2019-2020/club_results.csv"
+PARTITION_ROOT = os.environ.get('DATAPOOL_PARTITIONS', os.path.join(BASE_DIR, 'adam', 'data', 'partitions'))
+
+# how many (league, season) partitions are kept in memory at once
+MAX_PARTITIONS = int(os.environ.get('DATAPOOL_MAX_PARTITIONS', 4))
+
+# datasets that exist once per partition, mapped to the flat files that make up the 18/19 Premier League
+LEGACY_FILES = {
+    'club_results': os.path.join('adrian', 'data', 'pl_club_results.csv'),
+    'goalkeeping': os.path.join('adrian', 'data', 'goalkeeping_stats_pl.csv'),
+    'player_standard': os.path.join('adrian', 'data', 't5_leagues_players_standard.csv'),
+    'goals': os.path.join('adam', 'data', 'goals_only_pl.csv'),
+    'shots': os.path.join('adam', 'data', 'all_pl_shots_cleaned.csv'),
+}
+
+# datasets that are not split by league and season
+DATASETS = {
+    'transfers': os.path.join('adam', 'data', 'transfer_data.csv'),
+    'transfer_arrivals': os.path.join('adam', 'data', 'filtered_arrivals_with_additional_data.csv'),
+    'player_percentiles': os.path.join('adam', 'data', 'entire_players_list_with_percentiles.csv'),
+    'cl_results': os.path.join('adrian', 'data', 'cl_results.csv'),
+    'cl_players': os.path.join('adrian', 'data', 'cl_season_standard_stats.csv'),
+    'liverpool_shots': os.path.join('adrian', 'data', 'all_shots_CLandPL.csv'),
+}
+
+# competition of the datasets above that belong to a single one, partitioned datasets belong to their league
+DATASET_COMPETITIONS = {
+    'cl_results': 'Champions League',
+    'cl_players': 'Champions League',
+}
+
+
+def dataset_path(dataset):
+    return os.path.join(BASE_DIR, DATASETS[dataset])
+
+
+def partition_path(dataset, league=DEFAULT_LEAGUE, season=DEFAULT_SEASON):
+    path = os.path.join(PARTITION_ROOT, league, season.replace('/', '-'), f'{dataset}.csv')
+    if os.path.isfile(path):
+        return path
+
+    # the 18/19 Premier League has not been moved into the partitioned layout, so fall back to the old files
+    if (league, season) == (DEFAULT_LEAGUE, DEFAULT_SEASON) and dataset in LEGACY_FILES:
+        return os.path.join(BASE_DIR, LEGACY_FILES[dataset])
+
+    raise FileNotFoundError(f"No '{dataset}' data for {league} {season} (looked for {path})")
+
+
+def available_partitions():
+    # every (league, season) pair that has a directory in the partitioned storage, plus the legacy one
+    partitions = {(DEFAULT_LEAGUE, DEFAULT_SEASON)}
+    if os.path.isdir(PARTITION_ROOT):
+        for league in os.listdir(PARTITION_ROOT):
+            league_dir = os.path.join(PARTITION_ROOT, league)
+            if not os.path.isdir(league_dir):
+                continue
+            for season in os.listdir(league_dir):
+                if os.path.isdir(os.path.join(league_dir, season)):
+                    partitions.add((league, season.replace('-', '/')))
+    return sorted(partitions)
+
+
+def data_files():
+    # every file the store can read, used to notice when the data has been refreshed
+    files = [dataset_path(dataset) for dataset in DATASETS]
+    files += [os.path.join(BASE_DIR, path) for path in LEGACY_FILES.values()]
+    for root, _, names in os.walk(PARTITION_ROOT):
+        files += [os.path.join(root, name) for name in names if name.endswith('.csv')]
+    return sorted(files)
+
+
+def read_partition(dataset, league=DEFAULT_LEAGUE, season=DEFAULT_SEASON):
+    df = schemas.read_csv(dataset, partition_path(dataset, league, season))
+    return entities.rekey(df, competition=league)
+
+
+def read_dataset(dataset):
+    df = schemas.read_csv(dataset, dataset_path(dataset))
+    return entities.rekey(df, competition=DATASET_COMPETITIONS.get(dataset))
+
+
+def all_tables():
+    # (dataset, (league, season), frame) of every partition and (dataset, None, frame) of the other datasets,
+    # read straight from the files one at a time, for exporting them
+    for league, season in available_partitions():
+        for dataset in LEGACY_FILES:
+            try:
+                yield dataset, (league, season), read_partition(dataset, league, season)
+            except FileNotFoundError:
+                continue
+    for dataset in DATASETS:
+        yield dataset, None, read_dataset(dataset)
+
+
+def available_leagues():
+    return sorted({league for league, _ in available_partitions()})
+
+
+def available_seasons(league):
+    return sorted({season for partition_league, season in available_partitions() if partition_league == league})
+
+
+class DataStore:
+    # keeps the raw frames and the derived tables of the most recently used partitions
+    # frames handed out by the store are shared between callbacks, so they must not be modified in place
+    # the store lock only guards the dictionaries, reading a file or running a builder holds a lock of its own entry,
+    # so a long build (the title simulation) only makes the callbacks wait that need the same table
+    def __init__(self, max_partitions=MAX_PARTITIONS):
+        self.max_partitions = max_partitions
+        self._partitions = OrderedDict()
+        # datasets and tables that do not belong to a partition live as long as the store
+        self._shared = {'frames': {}, 'derived': {}}
+        self._lock = threading.RLock()
+        # locks of the entries that are being built, by (partition or None, kind, name)
+        self._building = {}
+
+    def _partition(self, league, season):
+        key = (league, season)
+        with self._lock:
+            if key in self._partitions:
+                self._partitions.move_to_end(key)
+            else:
+                self._partitions[key] = {'frames': {}, 'derived': {}}
+                # evict the least recently used partitions, their derived tables go with them
+                while len(self._partitions) > self.max_partitions:
+                    self._partitions.popitem(last=False)
+            return self._partitions[key]
+
+    def _entry(self, entries, key, build):
+        # the value of entries[key[-1]], built once: callers that ask while it is built wait for that build
+        name = key[-1]
+        with self._lock:
+            if name in entries:
+                return entries[name]
+            lock = self._building.setdefault(key, threading.Lock())
+        with lock:
+            with self._lock:
+                if name in entries:
+                    return entries[name]
+            try:
+                value = build()
+                with self._lock:
+                    entries[name] = value
+            finally:
+                with self._lock:
+                    if self._building.get(key) is lock:
+                        del self._building[key]
+            return value
+
+    def load(self, dataset, league=DEFAULT_LEAGUE, season=DEFAULT_SEASON):
+        frames = self._partition(league, season)['frames']
+        return self._entry(frames, ((league, season), 'frames', dataset),
+                           lambda: read_partition(dataset, league, season))
+
+    def derived(self, name, builder, league=DEFAULT_LEAGUE, season=DEFAULT_SEASON):
+        # builder is called as builder(store, league, season) the first time a table is requested
+        derived = self._partition(league, season)['derived']
+        return self._entry(derived, ((league, season), 'derived', name), lambda: builder(self, league, season))
+
+    def load_dataset(self, dataset):
+        return self._entry(self._shared['frames'], (None, 'frames', dataset), lambda: read_dataset(dataset))
+
+    def select(self, dataset, where=None, columns=None, league=DEFAULT_LEAGUE, season=DEFAULT_SEASON):
+        # rows of a dataset where every column of where equals its value, or is one of them for a list,
+        # with DATAPOOL_BACKEND=sqlite they are read through the indexes of the SQLite store instead of a whole frame
+        partition = None if dataset in DATASETS else (league, season)
+        if sqlite_store.ENABLED:
+            return sqlite_store.select(dataset, where, columns, partition)
+        df = self.load_dataset(dataset) if partition is None else self.load(dataset, league, season)
+        mask = pd.Series(True, index=df.index)
+        for column, value in (where or {}).items():
+            mask &= df[column].isin(value) if isinstance(value, (list, tuple, set)) else df[column] == value
+        return df.loc[mask, columns or list(df.columns)]
+
+    def shared(self, name, builder):
+        # like derived, but for tables that do not depend on a partition; builder is called as builder(store)
+        return self._entry(self._shared['derived'], (None, 'derived', name), lambda: builder(self))
+
+    def memory_usage(self):
+        # bytes of every loaded frame, keyed by (league, season, dataset) or by the dataset for shared ones
+        with self._lock:
+            usage = {(league, season, dataset): schemas.memory_usage(df)
+                     for (league, season), partition in self._partitions.items()
+                     for dataset, df in partition['frames'].items()}
+            usage.update({dataset: schemas.memory_usage(df) for dataset, df in self._shared['frames'].items()})
+            return usage
+
+    def contents(self):
+        # copies of the cache dictionaries, (league, season) -> {'frames': ..., 'derived': ...} and the shared ones under None
+        with self._lock:
+            contents = {key: {kind: dict(entries) for kind, entries in partition.items()}
+                        for key, partition in self._partitions.items()}
+            contents[None] = {kind: dict(entries) for kind, entries in self._shared.items()}
+            return contents
+
+    def cached_partitions(self):
+        with self._lock:
+            return list(self._partitions.keys())
+
+
+_store = DataStore()
+
+
+def get_store():
+    # callbacks should fetch the store once and use that reference for the whole call,
+    # so a reload that swaps the store in the meantime cannot mix old and new tables
+    return _store
+
+
+def swap_store(store):
+    # replacing the module reference is atomic, callbacks that already hold the old store keep using it
+    global _store
+    previous, _store = _store, store
+    return previous
+
+
+# league and season dropdowns that every season based tab puts above its graph
+def partition_selector(prefix):
+    leagues = available_leagues()
+    seasons = available_seasons(DEFAULT_LEAGUE)
+    return html.Div([
+        html.Label("League:", style={'fontWeight': 'bold', 'margin-right': '10px'}),
+        dcc.Dropdown(
+            id=f'{prefix}-league',
+            options=[{'label': league, 'value': league} for league in leagues],
+            value=DEFAULT_LEAGUE,
+            clearable=False,
+            style={'width': '250px', 'margin-right': '20px'}
+        ),
+        html.Label("Season:", style={'fontWeight': 'bold', 'margin-right': '10px'}),
+        dcc.Dropdown(
+            id=f'{prefix}-season',
+            options=[{'label': season, 'value': season} for season in seasons],
+            value=DEFAULT_SEASON,
+            clearable=False,
+            style={'width': '200px'}
+        ),
+    ], style={'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center', 'margin': '10px 0'})
+
+
+def register_partition_callbacks(app, prefix):
+    @app.callback(
+        Output(f'{prefix}-season', 'options'),
+        Output(f'{prefix}-season', 'value'),
+        Input(f'{prefix}-league', 'value'),
+        State(f'{prefix}-season', 'value')
+    )
+    def update_seasons(league, current_season):
+        seasons = available_seasons(league)
+        # keep the selected season when the new league has it, otherwise jump to its latest season
+        value = current_season if current_season in seasons else seasons[-1]
+        return [{'label': season, 'value': season} for season in seasons], value
@@ -0,0 +1,179 @@
+import base64
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# canonical names for clubs, players and competitions with dense integer ids
+# every frame the data store loads is re-keyed here, so joins and group-bys across files can use the ids
+# the canonical club names are the long ones that the logo files are named after
+
+
+# short names used by the FBref match and shot logs, mapped to the canonical club names
+club_aliases = {
+    'Brighton': 'Brighton and Hove Albion',
+    'Huddersfield': 'Huddersfield Town',
+    'Manchester Utd': 'Manchester United',
+    'Newcastle Utd': 'Newcastle United',
+    'Tottenham': 'Tottenham Hotspur',
+    'West Ham': 'West Ham United',
+    'Wolves': 'Wolverhampton Wanderers',
+    'Paris S-G': 'Paris Saint Germain',
+    'Inter': 'Internazionale',
+    "M'Gladbach": 'Monchengladbach',
+}
+
+
+# the ids of every name in the data, checked in so that all processes, workers and restarts use the same ids
+# rebuild it with build_entity_ids.py after adding data, names that are not in it yet get the next free ids
+# in the order this process sees them, those ids are only valid within the process
+ID_TABLE = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'entity_ids.json')
+
+
+def load_id_table(path=ID_TABLE):
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+class Dimension:
+    # known is the list of names of the id table, a name's id is its position in it
+    def __init__(self, label, aliases=None, known=()):
+        self.label = label
+        self.aliases = aliases or {}
+        self.names = list(known)
+        self._ids = {name: i for i, name in enumerate(self.names)}
+        self.known = len(self.names)
+        self._warned = False
+        self._lock = threading.Lock()
+
+    def canonical(self, name):
+        name = name.strip()
+        return self.aliases.get(name, name)
+
+    def id(self, name):
+        name = self.canonical(name)
+        with self._lock:
+            if name not in self._ids:
+                if not self._warned:
+                    print(f"Warning: {self.label} such as '{name}' are not in {os.path.basename(ID_TABLE)}, their ids "
+                          f"are only valid in this process. Run build_entity_ids.py to add them.")
+                    self._warned = True
+                self._ids[name] = len(self.names)
+                self.names.append(name)
+            return self._ids[name]
+
+    def name(self, entity_id):
+        return self.names[entity_id]
+
+    def rekey(self, column):
+        # canonical names as a categorical and the ids as a nullable int column, every distinct value is resolved once
+        values = column if isinstance(column.dtype, pd.CategoricalDtype) else column.astype('category')
+        canonical = [self.canonical(name) for name in values.cat.categories]
+        categories = sorted(set(canonical))
+        positions = {name: i for i, name in enumerate(categories)}
+        codes = values.cat.codes.to_numpy()
+
+        # old category code -> new category code and id, -1 (missing) stays missing
+        new_codes = np.array([positions[name] for name in canonical] + [-1], dtype=np.int32)
+        ids = np.array([self.id(name) for name in canonical] + [-1], dtype=np.int32)
+
+        names = pd.Series(pd.Categorical.from_codes(new_codes[codes], categories=categories), index=column.index)
+        entity_ids = pd.Series(ids[codes], index=column.index, dtype='Int32').mask(codes < 0)
+        return names, entity_ids
+
+
+id_table = load_id_table()
+clubs = Dimension('clubs', club_aliases, id_table.get('clubs', []))
+players = Dimension('players', known=id_table.get('players', []))
+competitions = Dimension('competitions', known=id_table.get('competitions', []))
+
+# columns that name a club or a player, each of them gets an "<column> ID" column next to it
+entity_columns = {
+    'Club': clubs,
+    'Squad': clubs,
+    'Opponent': clubs,
+    'Player': players,
+}
+
+
+def rekey(df, competition=None):
+    columns = []
+    id_columns = {}
+    for column in df.columns:
+        columns.append(column)
+        dimension = entity_columns.get(column)
+        if dimension is not None:
+            names, id_columns[f'{column} ID'] = dimension.rekey(df[column])
+            df[column] = names
+            columns.append(f'{column} ID')
+    if competition is not None:
+        id_columns['Competition ID'] = pd.Series(np.int16(competitions.id(competition)), index=df.index)
+        columns.append('Competition ID')
+    # the id columns are added in one go and moved next to their names, wide frames stay in few blocks
+    return pd.concat([df, pd.DataFrame(id_columns, index=df.index)], axis=1)[columns]
+
+
+# club colors by canonical name
+club_colors = {
+    'Arsenal': '#EF0107',
+    'Bournemouth': '#D71920',
+    'Brighton and Hove Albion': '#0057B8',
+    'Burnley': '#6C1D45',
+    'Cardiff City': '#0070B5',
+    'Chelsea': '#034694',
+    'Crystal Palace': '#1B458F',
+    'Everton': '#003399',
+    'Fulham': '#FFFFFF',
+    'Huddersfield Town': '#0E63AD',
+    'Leicester City': '#003090',
+    'Liverpool': '#C8102E',
+    'Manchester City': '#6CABDD',
+    'Manchester United': '#DA291C',
+    'Newcastle United': '#241F20',
+    'Southampton': '#D71920',
+    'Tottenham Hotspur': '#D3D3D3',
+    'Watford': '#FBEC5D',
+    'West Ham United': '#7C2C3B',
+    'Wolverhampton Wanderers': '#FDB913'
+}
+
+# clubs that are not in the mapping yet
+default_color = '#808080'
+
+
+def club_color(club_id):
+    if pd.isna(club_id):
+        return default_color
+    # ids of a nullable column arrive as floats when the column has missing values
+    return club_colors.get(clubs.name(int(club_id)), default_color)
+
+
+# directory containing club logos, named after the canonical club names
+logo_dir = os.path.join(os.path.dirname(__file__), '..', 'logos')
+
+# default placeholder image
+placeholder_image = os.path.join(logo_dir, "Tottenham Hotspur.png")
+
+# base64 logo strings by club id, filled the first time a club is drawn
+club_logos = {}
+
+
+def image_to_base64(image_path):
+    with open(image_path, 'rb') as f:
+        encoded_image = base64.b64encode(f.read()).decode('ascii')
+    return 'data:image/png;base64,{}'.format(encoded_image)
+
+
+def club_logo(club_id):
+    if club_id not in club_logos:
+        club = clubs.name(club_id)
+        logo_path = os.path.join(logo_dir, f"{club}.png")
+        if not os.path.isfile(logo_path):
+            print(f"Warning: Logo file for {club} not found. Using placeholder.")
+            logo_path = placeholder_image
+        club_logos[club_id] = image_to_base64(logo_path)
+    return club_logos[club_id]
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import poisson
+
+# expected points (xPts) of every match from the xG of both teams:
+# the goals of each team are independent Poisson draws with its xG as the mean,
+# the chances of a win, draw and loss are summed from the grid of all scorelines up to MAX_GOALS each
+
+# scorelines beyond this many goals for one team are left out, the rest of the grid is scaled back to 1
+MAX_GOALS = 10
+
+
+def outcome_probabilities(xg, xga, max_goals=MAX_GOALS):
+    # win, draw and loss probabilities for every match at once, from matches x goals x goals scoreline grids
+    goals = np.arange(max_goals + 1)
+    scored = poisson.pmf(goals[None, :], np.asarray(xg, dtype=float)[:, None])
+    conceded = poisson.pmf(goals[None, :], np.asarray(xga, dtype=float)[:, None])
+    grid = np.einsum('mi,mj->mij', scored, conceded)
+    grid /= grid.sum(axis=(1, 2), keepdims=True)
+
+    # rows are the goals scored, columns the goals conceded: below the diagonal is a win
+    win = np.tril(grid, k=-1).sum(axis=(1, 2))
+    draw = np.trace(grid, axis1=1, axis2=2)
+    return win, draw, 1 - win - draw
+
+
+def expected_points(xg, xga, max_goals=MAX_GOALS):
+    win, draw, _ = outcome_probabilities(xg, xga, max_goals)
+    return 3 * win + draw
+
+
+def build_xpts(store, league, season):
+    # one row per club and match with its xPts, and the running points and xPts by chronological matchday
+    df = store.load('club_results', league, season)[['Date', 'Club', 'Club ID', 'Opponent', 'Venue', 'Result',
+                                                     'GF', 'GA', 'xG', 'xGA', 'Points']].copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+
+    win, draw, loss = outcome_probabilities(df['xG'], df['xGA'])
+    df['Win Probability'] = win
+    df['Draw Probability'] = draw
+    df['Loss Probability'] = loss
+    df['xPts'] = 3 * win + draw
+
+    df = df.sort_values(by=['Club ID', 'Date'], kind='stable')
+    df['Chronological Matchday'] = df.groupby('Club ID').cumcount() + 1
+    grouped = df.groupby('Club ID')
+    df['Accumulated Points'] = grouped['Points'].cumsum()
+    df['Accumulated xPts'] = grouped['xPts'].cumsum()
+    df['xPts Difference'] = df['Accumulated Points'] - df['Accumulated xPts']
+    return df
+
+
+def xpts_table(xpts, matchday=None):
+    # the table after a matchday, sorted by xPts
+    if matchday is None:
+        matchday = xpts['Chronological Matchday'].max()
+    table = xpts[xpts['Chronological Matchday'] == matchday]
+    return (table[['Club', 'Accumulated Points', 'Accumulated xPts', 'xPts Difference']]
+            .rename(columns={'Accumulated Points': 'Points', 'Accumulated xPts': 'xPts'})
+            .sort_values(by='xPts', ascending=False)
+            .reset_index(drop=True))
+
+
+if __name__ == '__main__':
+    # python -m modules.expected_points from adam/visualizations prints the xPts table of the default partition
+    import modules.data_store as data_store
+
+    print(xpts_table(data_store.get_store().derived('xpts', build_xpts)).round(1).to_string())
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+import modules.entities as entities
+
+# the score at the time of every shot, rebuilt from the goals among the shots of the same match
+# own goals are not in the shot logs, matches with one are flagged because their running score misses it
+
+game_states = ['Trailing', 'Level', 'Leading']
+
+# goals from this minute on are late goals
+LATE_MINUTE = 76
+
+
+def fixtures(results, club=None):
+    # date, club and opponent of every game in a match log, club is the team of logs without a Club column
+    df = results[['Date', 'Opponent ID', 'GF']].copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    df['Club ID'] = results['Club ID'] if club is None else entities.clubs.id(club)
+    return df
+
+
+def tag(shots, fixtures):
+    # running score and game state of the shooting side before every shot, in one pass over the whole table
+    df = shots.merge(fixtures, left_on=['Date', 'Squad ID'], right_on=['Date', 'Club ID'], how='left',
+                     validate='many_to_one')
+
+    # both sides of a match get the same key, whichever of them the shot came from
+    first = np.minimum(df['Squad ID'], df['Opponent ID'])
+    second = np.maximum(df['Squad ID'], df['Opponent ID'])
+    df['Match'] = df.groupby([df['Date'], first, second], sort=False).ngroup()
+    df.loc[df['Opponent ID'].isna(), 'Match'] = -1
+
+    # shots in the order they were taken, added time after the minute it was added to
+    df = df.sort_values(by=['Match', 'Minute', 'Added Time'], na_position='first', kind='stable')
+    goal = (df['Outcome'] == 'Goal').to_numpy(dtype=np.int16)
+    first_side = (df['Squad ID'] == first.loc[df.index]).to_numpy()
+
+    # goals of both sides before the shot: cumulative sums per match minus the shot itself
+    first_goals = pd.Series(goal * first_side, index=df.index).groupby(df['Match']).cumsum() - goal * first_side
+    second_goals = pd.Series(goal * ~first_side, index=df.index).groupby(df['Match']).cumsum() - goal * ~first_side
+    df['Goals For'] = np.where(first_side, first_goals, second_goals).astype(np.int16)
+    df['Goals Against'] = np.where(first_side, second_goals, first_goals).astype(np.int16)
+
+    difference = df['Goals For'] - df['Goals Against']
+    df['Game State'] = pd.Categorical.from_codes(np.sign(difference).to_numpy() + 1, categories=game_states)
+    df['Late'] = df['Minute'].to_numpy(dtype=float) >= LATE_MINUTE
+
+    # what a goal did to the score: an equaliser, a go-ahead goal or anything else
+    df['Goal Effect'] = pd.Series(pd.NA, index=df.index, dtype='string')
+    df.loc[(goal == 1) & (difference == -1), 'Goal Effect'] = 'Equaliser'
+    df.loc[(goal == 1) & (difference == 0), 'Goal Effect'] = 'Go-ahead goal'
+    df.loc[(goal == 1) & ~difference.isin([-1, 0]), 'Goal Effect'] = 'Other'
+
+    # a side with more goals in its match log than among its shots got an own goal, which the score misses
+    shot_goals = pd.Series(goal, index=df.index).groupby([df['Match'], df['Squad ID']]).transform('sum')
+    df['Score Complete'] = (df['GF'] == shot_goals).groupby(df['Match']).transform('all') & (df['Match'] >= 0)
+    unmatched = df['Match'] < 0
+    df.loc[unmatched, ['Goals For', 'Goals Against']] = 0
+    df['Game State'] = df['Game State'].mask(unmatched)
+
+    return df.drop(columns=['Club ID', 'GF']).sort_index(kind='stable')
+
+
+def build_game_states(store, league, season):
+    # every shot of a partition, the league's match logs give the opponent of each shot
+    shots = store.load('shots', league, season)
+    return tag(shots, fixtures(store.load('club_results', league, season)))
+
+
+def build_liverpool_game_states(store):
+    # Liverpool's shots and the ones against them in both competitions
+    shots = store.load_dataset('liverpool_shots')
+    league = fixtures(store.load('club_results'))
+    champions_league = fixtures(store.load_dataset('cl_results'), club='Liverpool')
+    # the Champions League games are only logged from Liverpool's side, the reverse rows fill in the opponents
+    reverse = champions_league.rename(columns={'Club ID': 'Opponent ID', 'Opponent ID': 'Club ID'})
+    reverse['GF'] = store.load_dataset('cl_results')['GA'].to_numpy()
+    return tag(shots, pd.concat([league, champions_league, reverse], ignore_index=True))
+
+
+def xg_by_game_state(tagged, by='Squad'):
+    # xG, shots and goals of every club (or player) in each game state
+    return (tagged.dropna(subset=['Game State'])
+            .groupby([by, 'Game State'], observed=True)
+            .agg(Shots=('xG', 'size'), xG=('xG', 'sum'), Goals=('Outcome', lambda outcome: (outcome == 'Goal').sum()))
+            .reset_index())
+
+
+def late_goals(tagged, by='Squad'):
+    # late goals of every club by what they did to the score
+    late = tagged[tagged['Late'] & tagged['Goal Effect'].notna()]
+    return late.groupby([by, 'Goal Effect'], observed=True).size().unstack(fill_value=0)
+
+
+if __name__ == '__main__':
+    # python -m modules.game_state from adam/visualizations prints xG by game state for the default partition
+    import modules.data_store as data_store
+
+    tagged = data_store.get_store().derived('game_states', build_game_states)
+    print(f"{len(tagged)} shots, {(~tagged['Score Complete']).sum()} in matches with an own goal")
+    print(xg_by_game_state(tagged).pivot(index='Squad', columns='Game State', values='xG').round(1).to_string())
+    print(late_goals(tagged).to_string())
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+# exact distribution of the goals a set of shots produces, when every shot is a goal with the probability of its xG
+# (a Poisson-binomial distribution), for many clubs or players at once
+# a club or player far out in the tail of its distribution finished better or worse than luck alone explains
+
+# share of the distribution covered by the intervals
+LEVEL = 0.9
+
+
+def goal_distributions(xg, groups, n_groups):
+    # pmf[group, k] = P(k goals) for the shots of every group, groups are codes 0 .. n_groups - 1
+    # one row of shots per group, padded with shots of xG 0 that never change a distribution,
+    # so every step of the convolution adds one shot to all groups at once
+    xg = np.nan_to_num(np.asarray(xg, dtype=float))
+    groups = np.asarray(groups)
+    order = np.argsort(groups, kind='stable')
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    positions = np.arange(len(groups)) - np.repeat(starts, counts)
+
+    n_shots = counts.max() if len(counts) else 0
+    probabilities = np.zeros((n_groups, n_shots))
+    probabilities[groups[order], positions] = xg[order]
+
+    # dynamic programming instead of an FFT, the tails stay exact down to the smallest p-values
+    pmf = np.zeros((n_groups, n_shots + 1))
+    pmf[:, 0] = 1
+    for shot in range(n_shots):
+        p = probabilities[:, shot:shot + 1]
+        pmf[:, 1:shot + 2] = pmf[:, 1:shot + 2] * (1 - p) + pmf[:, :shot + 1] * p
+        pmf[:, :1] *= 1 - p
+    return pmf
+
+
+def summarize(pmf, goals, level=LEVEL):
+    # p-values of the actual goals and the central interval of the distribution, one row per group
+    goals = np.asarray(goals, dtype=int)
+    rows = np.arange(len(pmf))
+    cdf = np.cumsum(pmf, axis=1)
+    # P(X >= goals) and P(X <= goals)
+    at_least = 1 - np.where(goals > 0, cdf[rows, np.maximum(goals - 1, 0)], 0)
+    at_most = cdf[rows, goals]
+    tail = (1 - level) / 2
+    return pd.DataFrame({
+        'Low': np.argmax(cdf >= tail, axis=1),
+        'High': np.argmax(cdf >= 1 - tail - 1e-12, axis=1),
+        'P Over': at_least,
+        'P Under': at_most,
+        'P Value': np.minimum(1, 2 * np.minimum(at_least, at_most)),
+    })
+
+
+def goal_table(shots, by, level=LEVEL):
+    # shots, goals, xG, interval and p-values for every value of the column by
+    codes, keys = pd.factorize(shots[by], sort=True)
+    valid = codes >= 0
+    codes = codes[valid]
+    xg = shots['xG'].to_numpy(dtype=float)[valid]
+    scored = (shots['Outcome'] == 'Goal').to_numpy()[valid]
+
+    pmf = goal_distributions(xg, codes, len(keys))
+    goals = np.bincount(codes, weights=scored, minlength=len(keys)).astype(int)
+    table = summarize(pmf, goals, level)
+    table.insert(0, 'Shots', np.bincount(codes, minlength=len(keys)))
+    table.insert(1, 'Goals', goals)
+    table.insert(2, 'xG', np.bincount(codes, weights=np.nan_to_num(xg), minlength=len(keys)))
+    table.index = pd.Index(keys, name=by)
+    return table
+
+
+if __name__ == '__main__':
+    # python -m modules.goal_distribution from adam/visualizations times the tables of the default partition
+    import time
+
+    import modules.data_store as data_store
+
+    shots = data_store.get_store().load('shots')
+    for by in ['Squad', 'Player']:
+        start = time.perf_counter()
+        table = goal_table(shots, by)
+        print(f"{len(table)} distributions by {by} in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(goal_table(shots, 'Squad').sort_values('P Value').round(3).to_string())
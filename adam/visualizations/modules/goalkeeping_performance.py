@@ -4,85 +4,130 @@ import pandas as pd
 import plotly.graph_objects as go
 from dash import dcc, html
 from dash.dependencies import Input, Output
-import dash
-import dash_bootstrap_components as dbc
-import os
-import base64
-
-df = pd.read_csv("../../adrian/data/goalkeeping_stats_pl.csv")
-df_2 = pd.read_csv("../../adrian/data/t5_leagues_players_standard.csv")
-
-# group by "Club" and aggregate the values we need for the scatter plot
-agg_df = df.groupby('Club').agg({'GA': 'sum', 'Save%': 'mean', 'CS': 'sum'}).reset_index()
-
-# color mapping for each club
-squad_colors = {
-    'Arsenal': '#EF0107',
-    'Bournemouth': '#D71920',
-    'Brighton and Hove Albion': '#0057B8',
-    'Burnley': '#6C1D45',
-    'Cardiff City': '#0070B5',
-    'Chelsea': '#034694',
-    'Crystal Palace': '#1B458F',
-    'Everton': '#003399',
-    'Fulham': '#FFFFFF',
-    'Huddersfield Town': '#0E63AD',
-    'Leicester City': '#003090',
-    'Liverpool': '#C8102E',
-    'Manchester City': '#6CABDD',
-    'Manchester United': '#DA291C',
-    'Newcastle United': '#241F20',
-    'Southampton': '#D71920',
-    'Tottenham Hotspur': '#D3D3D3',
-    'Watford': '#FBEC5D',
-    'West Ham United': '#7C2C3B',
-    'Wolverhampton Wanderers': '#FDB913'
-}
-
-# filter df_2 for PL keepers
-pl_goalkeepers_df = df_2[df_2['Club'].isin(squad_colors.keys())]
-pl_goalkeepers_df = pl_goalkeepers_df[pl_goalkeepers_df['Pos'] == 'GK']
-
-# find first team keeper of each club (most matches played)
-main_goalkeepers = pl_goalkeepers_df.groupby('Club')['MP'].idxmax()
-main_goalkeepers_df = pl_goalkeepers_df.loc[main_goalkeepers]
-
-main_goalkeepers_games_df = main_goalkeepers_df.groupby('Club').agg({'Player': 'first'}).reset_index()
-main_goalkeepers_games_df.rename(columns={'Player': 'Main Goalkeeper'}, inplace=True)
-
-# merge with aggregated goalkeeping stats
-agg_df = pd.merge(agg_df, main_goalkeepers_games_df, on='Club')
-
-# Image implementation
-logo_dir = '../visualizations/logos'
-
-club_logos = {}
-for club in agg_df['Club'].unique():
-    logo_path = os.path.join(logo_dir, f"{club}.png")
-    if os.path.isfile(logo_path):
-        with open(logo_path, 'rb') as f:
-            encoded_image = base64.b64encode(f.read()).decode('ascii')
-        club_logos[club] = 'data:image/png;base64,{}'.format(encoded_image)
-    else:
-        print(f"Warning: Logo file for {club} not found. Using placeholder.")
-        club_logos[club] = 'data:image/png;base64,{}'.format(base64.b64encode(open(os.path.join(logo_dir, "placeholder.png"), 'rb').read()).decode('ascii'))
+
+import modules.data_store as data_store
+import modules.entities as entities
+import modules.shots_against as shots_against
+
+TAB_ID = 'goalkeeping-performance-tab'
+TAB_LABEL = "Goalkeeping Performance (Adrian)"
+TAB_ORDER = 60
+
+
+def build_goalkeeping(store, league, season):
+    df = store.load('goalkeeping', league, season)
+    df_2 = store.load('player_standard', league, season)
+
+    # group by "Club" and aggregate the values we need for the scatter plot
+    agg_df = df.groupby(['Club ID', 'Club'], observed=True).agg({'GA': 'sum', 'Save%': 'mean', 'CS': 'sum'}).reset_index()
+
+    # filter df_2 for keepers of the clubs in this league and season
+    league_goalkeepers_df = df_2[df_2['Club ID'].isin(agg_df['Club ID'])]
+    league_goalkeepers_df = league_goalkeepers_df[league_goalkeepers_df['Pos'] == 'GK']
+
+    # find first team keeper of each club (most matches played)
+    main_goalkeepers = league_goalkeepers_df.groupby('Club ID')['MP'].idxmax()
+    main_goalkeepers_df = league_goalkeepers_df.loc[main_goalkeepers]
+
+    main_goalkeepers_games_df = main_goalkeepers_df.groupby('Club ID').agg({'Player': 'first'}).reset_index()
+    main_goalkeepers_games_df.rename(columns={'Player': 'Main Goalkeeper'}, inplace=True)
+
+    # merge with aggregated goalkeeping stats and the quality of the shots each club conceded
+    conceded = shots_against.conceded_table(store.derived('shots_against', shots_against.build_shots_against, league, season))
+    agg_df = pd.merge(agg_df, main_goalkeepers_games_df, on='Club ID')
+    return pd.merge(agg_df, conceded, on='Club ID', how='left')
+
+def create_shot_stopping_figure(agg_df, league, season):
+    fig = go.Figure()
+
+    # shot-stopping against the quality of the shots faced, one marker per club
+    for i, row in agg_df.iterrows():
+        hover_text = (f"Club: {row['Club']}<br>Main Goalkeeper: {row['Main Goalkeeper']}<br>"
+                      f"Shots faced: {row['Shots Against']:.0f} ({row['Shots on Target Against']:.0f} on target)<br>"
+                      f"xG per shot faced: {row['xG per Shot Against']:.3f}<br>"
+                      f"PSxG faced: {row['PSxG Faced']:.1f}<br>"
+                      f"Goals conceded from shots: {row['Goals Against from Shots']:.0f}<br>"
+                      f"PSxG - GA: {row['PSxG - GA']:+.1f}")
+        fig.add_trace(go.Scatter(
+            x=[row['xG per Shot Against']],
+            y=[row['PSxG - GA']],
+            mode='markers+text',
+            marker=dict(size=row['Shots on Target Against'] / 8, line=dict(width=2, color='DarkSlateGrey'),
+                        color=entities.club_color(row['Club ID'])),
+            text=[row['Main Goalkeeper']],
+            textposition='top center',
+            name=row['Club'],
+            hovertemplate=hover_text + '<extra></extra>',
+            hoverlabel=dict(font=dict(color='black'), bgcolor='white'),
+            showlegend=False
+        ))
+
+    fig.add_hline(y=0, line_width=2, line_dash='dash', line_color='gray')
+
+    # annotation for the axes and bubble size
+    fig.add_annotation(
+        x=0.5,
+        y=1.03,
+        xref='paper',
+        yref='paper',
+        text='Above the line the keepers saved more than the post-shot xG of the shots on target expected. '
+             'Bubble size represents shots on target faced.',
+        showarrow=False,
+        font=dict(size=16, family='Arial, sans-serif', color='grey',),
+        xanchor="center",
+        yanchor="middle"
+    )
+
+    fig.update_layout(
+        title=f'Shot-Stopping vs. Quality of Shots Faced for {league} {season} Teams',
+        title_font=dict(size=24, family='Arial, sans-serif', color='black', weight='bold'),
+        xaxis_title='xG per Shot Faced',
+        yaxis_title='PSxG - Goals Against',
+        xaxis=dict(fixedrange=True,
+            title_font=dict(size=20, family='Arial, sans-serif', color='black', weight='bold'),
+            tickfont=dict(size=16, family='Arial, sans-serif', color='gray', weight='bold'),
+            showline=True,
+            linewidth=3,
+            linecolor='gray'),
+        yaxis=dict(fixedrange=True,
+                   title_font=dict(size=20, family='Arial, sans-serif', color='black', weight='bold'),
+                   tickfont=dict(size=16, family='Arial, sans-serif', color='gray', weight='bold'),
+                   showline=True,
+                   linewidth=3,
+                   linecolor='gray'))
+
+    return fig
 
 def layout():
     return html.Div([
-        html.H1("Premier League Goalkeeping Performance"),
+        html.H1("Goalkeeping Performance"),
+        data_store.partition_selector('goalkeeping'),
         dcc.Graph(
             id='goalkeeping-performance-graph',
             style={'height': '800px'} 
         ),
+        dcc.Graph(
+            id='goalkeeping-shot-stopping-graph',
+            style={'height': '800px'}
+        ),
         html.P("Data source: FBref", style={'text-align': 'center', 'font-size': '12px', 'color': 'gray'})
     ])
 
-def register_callbacks(app):
+def load(store):
+    store.derived('shots_against', shots_against.build_shots_against)
+    store.derived('goalkeeping', build_goalkeeping)
+
+def register(app):
+    data_store.register_partition_callbacks(app, 'goalkeeping')
+
     @app.callback(
         Output('goalkeeping-performance-graph', 'figure'),
-        [Input('goalkeeping-performance-graph', 'id')]
+        [Input('goalkeeping-league', 'value'),
+         Input('goalkeeping-season', 'value')]
     )
-    def update_graph(_):
+    def update_graph(league, season):
+        agg_df = data_store.get_store().derived('goalkeeping', build_goalkeeping, league, season)
+
         fig = go.Figure()
 
         # Trace for scatter points
@@ -93,7 +138,7 @@ def register_callbacks(app):
                 x=[row['GA']],
                 y=[row['Save%']],
                 mode='markers',
-                marker=dict(size=row['CS'] * 5, line=dict(width=2, color='DarkSlateGrey'), color=squad_colors[row['Club']]),
+                marker=dict(size=row['CS'] * 5, line=dict(width=2, color='DarkSlateGrey'), color=entities.club_color(row['Club ID'])),
                 name=row['Club'],
                 text=hover_text,
                 hovertemplate=hover_text,
@@ -106,7 +151,7 @@ def register_callbacks(app):
             # Image for respective data point / club
             fig.add_layout_image(
                 dict(
-                    source=club_logos[row['Club']],
+                    source=entities.club_logo(row['Club ID']),
                     xref="x",
                     yref="y",
                     x=row['GA'],
@@ -132,7 +177,7 @@ def register_callbacks(app):
         )
 
         fig.update_layout(
-            title='Goals Against vs.Save Percentage for Premier League Teams',
+            title=f'Goals Against vs.Save Percentage for {league} {season} Teams',
             title_font=dict(size=24, family='Arial, sans-serif', color='black', weight='bold'),
             xaxis_title='Goals Against',
             yaxis_title='Save%',
@@ -153,3 +198,12 @@ def register_callbacks(app):
         
 
         return fig
+
+    @app.callback(
+        Output('goalkeeping-shot-stopping-graph', 'figure'),
+        [Input('goalkeeping-league', 'value'),
+         Input('goalkeeping-season', 'value')]
+    )
+    def update_shot_stopping_graph(league, season):
+        agg_df = data_store.get_store().derived('goalkeeping', build_goalkeeping, league, season)
+        return create_shot_stopping_figure(agg_df, league, season)
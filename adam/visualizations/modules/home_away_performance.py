@@ -1,60 +1,147 @@
-import pandas as pd
 import plotly.graph_objects as go
 from dash import dcc, html
 from dash.dependencies import Input, Output
-import dash
-import dash_bootstrap_components as dbc
-import os
-import base64
-
-# Load and preprocess the CSV data
-file_path = '../data/pl_club_results.csv'
-data = pd.read_csv(file_path)
-
-# Ensure the data is in the correct format
-data['Date'] = pd.to_datetime(data['Date'])
-data['Points'] = data['Points'].astype(int)
-
-# Calculate average points for home and away games for each club
-home_points = data[data['Venue'] == 'Home'].groupby('Club')['Points'].mean().reset_index()
-away_points = data[data['Venue'] == 'Away'].groupby('Club')['Points'].mean().reset_index()
-
-# Merge the home and away points
-points = pd.merge(home_points, away_points, on='Club', suffixes=('_Home', '_Away'))
-
-# Calculate the difference in average points between home and away
-points['Difference'] = points['Points_Home'] - points['Points_Away']
-
-# Sort clubs alphabetically initially
-points = points.sort_values('Club')
-
-# Directory containing club logos
-logo_dir = './logos/'
-
-# Function to convert images to base64 strings
-def image_to_base64(image_path):
-    with open(image_path, 'rb') as f:
-        encoded_image = base64.b64encode(f.read()).decode('ascii')
-    return 'data:image/png;base64,{}'.format(encoded_image)
-
-# Default placeholder image
-placeholder_image = os.path.join(logo_dir, "Tottenham Hotspur.png")
-placeholder_base64 = image_to_base64(placeholder_image)
-
-# Mapping of club names to their base64 logo strings
-club_logos = {}
-for club in points['Club']:
-    logo_path = os.path.join(logo_dir, f"{club}.png")
-    if os.path.isfile(logo_path):
-        club_logos[club] = image_to_base64(logo_path)
+
+import modules.data_store as data_store
+import modules.entities as entities
+
+TAB_ID = 'home-away-performance-tab'
+TAB_LABEL = "Home & Away Performance (Adam)"
+TAB_ORDER = 30
+
+
+# per game averages that are split by venue
+venue_metrics = ['Points', 'GF', 'GA', 'xG']
+
+# every value the sort dropdown can take
+sort_orders = [None, 'asc', 'desc']
+
+def build_venue_averages(store, league, season):
+    data = store.load('club_results', league, season)
+
+    # Calculate average points, goals and xG for home and away games for each club in one pivot
+    averages = data.pivot_table(index=['Club ID', 'Club'], columns='Venue', values=venue_metrics, aggfunc='mean', observed=True)
+    averages.columns = [f'{metric}_{venue}' for metric, venue in averages.columns]
+    averages = averages.reset_index()
+
+    # Calculate the difference in average points between home and away
+    averages['Difference'] = averages['Points_Home'] - averages['Points_Away']
+
+    # Sort clubs alphabetically initially
+    return averages.sort_values('Club')
+
+def create_figure(averages, sort_order):
+    if sort_order:
+        sorted_points = averages.sort_values('Difference', ascending=(sort_order == 'asc'))
     else:
-        print(f"Warning: Logo file for {club} not found. Using placeholder.")
-        club_logos[club] = placeholder_base64
+        sorted_points = averages
+
+    clubs = sorted_points['Club'].tolist()
+    club_ids = sorted_points['Club ID'].tolist()
+    home_points = sorted_points['Points_Home'].tolist()
+    away_points = sorted_points['Points_Away'].tolist()
+
+    fig = go.Figure()
+
+    # Plotting the Difference in Home and Away Points, one trace with None breaks between the clubs
+    line_x = []
+    line_y = []
+    for club, home_y, away_y in zip(clubs, home_points, away_points):
+        line_x += [club, club, None]
+        line_y += [home_y, away_y, None]
+    fig.add_trace(go.Scatter(
+        x=line_x,
+        y=line_y,
+        mode='lines',
+        line=dict(color='gray', width=2),
+        hoverinfo='skip',
+        showlegend=False
+    ))
+
+    # Adding Club Logos to the Plot
+    for club, club_id, home_y, away_y in zip(clubs, club_ids, home_points, away_points):
+        logo = entities.club_logo(club_id)
+        fig.add_layout_image(
+            dict(
+                source=logo,
+                xref="x",
+                yref="y",
+                x=club,
+                y=home_y,
+                sizex=0.65,
+                sizey=0.65,
+                xanchor="center",
+                yanchor="middle"
+            )
+        )
+        fig.add_layout_image(
+            dict(
+                source=logo,
+                xref="x",
+                yref="y",
+                x=club,
+                y=away_y,
+                sizex=0.35,
+                sizey=0.35,
+                xanchor="center",
+                yanchor="middle"
+            )
+        )
+
+    for venue, label in [('Home', 'home'), ('Away', 'away')]:
+        fig.add_trace(go.Scatter(
+            x=sorted_points['Club'],
+            y=sorted_points[f'Points_{venue}'],
+            mode='markers',
+            marker=dict(size=0),
+            hoverinfo='text',
+            text=[f"Average points per {label} game for {club}: {round(points, 2)}<br>"
+                  f"Goals scored: {round(gf, 2)} | Goals conceded: {round(ga, 2)} | xG: {round(xg, 2)}"
+                  for club, points, gf, ga, xg in zip(sorted_points['Club'], sorted_points[f'Points_{venue}'],
+                                                      sorted_points[f'GF_{venue}'], sorted_points[f'GA_{venue}'],
+                                                      sorted_points[f'xG_{venue}'])]
+        ))
+
+    # Updating the Layout
+    fig.update_layout(
+        xaxis_title="Club",
+        yaxis_title="Average Points",
+        xaxis=dict(
+            tickmode='array', 
+            tickvals=sorted_points['Club'], 
+            ticktext=sorted_points['Club'],
+            range=[-1, len(sorted_points['Club'])],
+            title_font=dict(size=20, family='Arial, sans-serif', weight='bold'),
+            tickfont=dict(size=16, family='Arial, sans-serif', weight='bold'),
+            title_standoff=20  # Adjust the position of the x-axis title
+        ),
+        yaxis=dict(
+            range=[0, 3.3],
+            title_font=dict(size=45, family='Arial, sans-serif', weight='bold'),
+            tickfont=dict(size=26, family='Arial, sans-serif', weight='bold'),
+            showline=True,
+            linewidth=2,
+            linecolor='black'
+        ),
+        height=600,  # Decreased height for the chart
+        margin=dict(l=100, r=100, t=20, b=100), 
+        showlegend=False,
+        font=dict(size=16, family='Arial, sans-serif')
+    )
+
+    return fig
+
+def build_figures(store, league, season):
+    averages = store.derived('venue_averages', build_venue_averages, league, season)
+    return {sort_order: create_figure(averages, sort_order) for sort_order in sort_orders}
 
 def layout():
+    legend_logo = entities.club_logo(entities.clubs.id('Liverpool'))
+
     return html.Div([
-        html.H1("Premier League Home & Away Performances", style={'textAlign': 'center', 'fontWeight': 'bold'}),
+        html.H1("Home & Away Performances", style={'textAlign': 'center', 'fontWeight': 'bold'}),
         html.P("Data source: FBref", style={'text-align': 'center', 'font-size': '12px', 'color': 'gray', 'margin-top': '0'}),
+        data_store.partition_selector('home-away'),
         html.Label("Difference indicates how much better or worse a team performs at home compared to away."),
         html.Label("Sort by difference (Ascending -> weakest home advantage to strongest and vice versa):"),
         dcc.Dropdown(
@@ -69,119 +156,25 @@ def layout():
         dcc.Graph(id='performance-graph'),
         html.Div([
             html.Span("Legend: ", style={'fontSize': '16px', 'fontWeight': 'bold'}),
-            html.Img(src=club_logos['Liverpool'], style={'width': '60px', 'height': '60px'}),
+            html.Img(src=legend_logo, style={'width': '60px', 'height': '60px'}),
             html.Span(" Home Performance ", style={'fontSize': '16px'}),
-            html.Img(src=club_logos['Liverpool'], style={'width': '40px', 'height': '40px'}),
+            html.Img(src=legend_logo, style={'width': '40px', 'height': '40px'}),
             html.Span(" Away Performance", style={'fontSize': '16px'}),
         ], style={'textAlign': 'center', 'marginTop': '10px'})
     ])
 
-def register_callbacks(app):
+def load(store):
+    store.derived('home_away_figures', build_figures)
+
+def register(app):
+    data_store.register_partition_callbacks(app, 'home-away')
+
     @app.callback(
         Output('performance-graph', 'figure'),
-        [Input('sort-dropdown', 'value')]
+        [Input('sort-dropdown', 'value'),
+         Input('home-away-league', 'value'),
+         Input('home-away-season', 'value')]
     )
-    def update_graph(sort_order):
-        if sort_order:
-            sorted_points = points.sort_values('Difference', ascending=(sort_order == 'asc'))
-        else:
-            sorted_points = points
-
-        fig = go.Figure()
-
-        # Plotting the Difference in Home and Away Points
-        for i in range(len(sorted_points)):
-            fig.add_trace(go.Scatter(
-                x=[sorted_points['Club'].iloc[i], sorted_points['Club'].iloc[i]], 
-                y=[sorted_points['Points_Home'].iloc[i], sorted_points['Points_Away'].iloc[i]],
-                mode='lines',
-                line=dict(color='gray', width=2),
-                showlegend=False
-            ))
-
-        # Adding Club Logos to the Plot
-        for club in sorted_points['Club']:
-            home_y = sorted_points[sorted_points['Club'] == club]['Points_Home'].values[0]
-            away_y = sorted_points[sorted_points['Club'] == club]['Points_Away'].values[0]
-
-            fig.add_layout_image(
-                dict(
-                    source=club_logos[club],
-                    xref="x",
-                    yref="y",
-                    x=club,
-                    y=home_y,
-                    sizex=0.65,
-                    sizey=0.65,
-                    xanchor="center",
-                    yanchor="middle"
-                )
-            )
-            fig.add_layout_image(
-                dict(
-                    source=club_logos[club],
-                    xref="x",
-                    yref="y",
-                    x=club,
-                    y=away_y,
-                    sizex=0.35,
-                    sizey=0.35,
-                    xanchor="center",
-                    yanchor="middle"
-                )
-            )
-
-        fig.add_trace(go.Scatter(
-            x=sorted_points['Club'], 
-            y=sorted_points['Points_Home'],
-            mode='markers',
-            marker=dict(size=0),
-            hoverinfo='text',
-            text=[f"Average points per home game for {club}: {round(val, 2)}" for club, val in zip(sorted_points['Club'], sorted_points['Points_Home'])]
-        ))
-
-        fig.add_trace(go.Scatter(
-            x=sorted_points['Club'], 
-            y=sorted_points['Points_Away'],
-            mode='markers',
-            marker=dict(size=0),
-            hoverinfo='text',
-            text=[f"Average points per away game for {club}: {round(val, 2)}" for club, val in zip(sorted_points['Club'], sorted_points['Points_Away'])]
-        ))
-
-        # Updating the Layout
-        fig.update_layout(
-            xaxis_title="Club",
-            yaxis_title="Average Points",
-            xaxis=dict(
-                tickmode='array', 
-                tickvals=sorted_points['Club'], 
-                ticktext=sorted_points['Club'],
-                range=[-1, len(sorted_points['Club'])],
-                title_font=dict(size=20, family='Arial, sans-serif', weight='bold'),
-                tickfont=dict(size=16, family='Arial, sans-serif', weight='bold'),
-                title_standoff=20  # Adjust the position of the x-axis title
-            ),
-            yaxis=dict(
-                range=[0, 3.3],
-                title_font=dict(size=45, family='Arial, sans-serif', weight='bold'),
-                tickfont=dict(size=26, family='Arial, sans-serif', weight='bold'),
-                showline=True,
-                linewidth=2,
-                linecolor='black'
-            ),
-            height=600,  # Decreased height for the chart
-            margin=dict(l=100, r=100, t=20, b=100), 
-            showlegend=False,
-            font=dict(size=16, family='Arial, sans-serif')
-        )
-
-        return fig
-
-# Initialize Dash app and register callbacks
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-app.layout = layout()
-register_callbacks(app)
-
-if __name__ == '__main__':
-    app.run_server(debug=True)
+    def update_graph(sort_order, league, season):
+        # all sort variants are built together the first time a partition is shown
+        return data_store.get_store().derived('home_away_figures', build_figures, league, season)[sort_order]
@@ -0,0 +1,160 @@
+import os
+import sys
+import threading
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from flask import jsonify, request
+from plotly.basedatatypes import BaseFigure
+
+import modules.api as api
+import modules.background as background
+import modules.data_refresh as data_refresh
+import modules.data_store as data_store
+import modules.entities as entities
+import modules.sqlite_store as sqlite_store
+
+try:
+    import psutil
+except ImportError:  # the current RSS is left out, the high-water mark still comes from resource
+    psutil = None
+
+# what the process keeps in memory: every frame and derived table of the store, the logo and id caches,
+# and the background callback results on disk, on GET /debug/memory
+# POST /debug/memory/snapshot compares the Python allocations with the previous call, which needs tracemalloc
+# to run from the start: PYTHONTRACEMALLOC=25 python app.py keeps 25 frames of every allocation
+# like the callback profiles, nothing of this is registered unless DATAPOOL_PROFILING=1
+
+ENABLED = os.environ.get('DATAPOOL_PROFILING', '0') == '1'
+
+# allocation sites in a snapshot diff
+TOP_ALLOCATIONS = 30
+
+# frames of these files are left out of the snapshots
+IGNORED_FILES = ['<frozen importlib._bootstrap>', '<frozen importlib._bootstrap_external>', tracemalloc.__file__]
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def deep_size(obj, seen=None):
+    # bytes of obj and everything it holds, objects reached twice are counted once
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        # a view does not hold its data, the array it views does
+        return sys.getsizeof(obj) + (deep_size(obj.base, seen) if obj.base is not None else 0)
+    if isinstance(obj, BaseFigure):
+        # the trace and layout objects are views of these two
+        return deep_size(obj._data, seen) + deep_size(obj._layout, seen)
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+def store_usage(store, seen):
+    partitions = []
+    for key, contents in store.contents().items():
+        entry = {'league': key[0], 'season': key[1]} if key is not None else {'shared': True}
+        for kind, tables in contents.items():
+            entry[kind] = {name: deep_size(table, seen) for name, table in tables.items()}
+        entry['bytes'] = sum(sum(entry[kind].values()) for kind in contents)
+        partitions.append(entry)
+    return {'bytes': sum(entry['bytes'] for entry in partitions), 'partitions': partitions}
+
+
+def cache_usage(seen):
+    caches = {'club_logos': {'entries': len(entities.club_logos), 'bytes': deep_size(entities.club_logos, seen)}}
+    for name, dimension in [('clubs', entities.clubs), ('players', entities.players),
+                            ('competitions', entities.competitions)]:
+        caches[f'{name}_ids'] = {'entries': len(dimension.names),
+                                 'bytes': deep_size(dimension.names, seen) + deep_size(dimension._ids, seen)}
+    # serialized bodies of the JSON API, up to api.MAX_CACHED_RESPONSES of them
+    with api._responses_lock:
+        caches['api_responses'] = {'entries': len(api._responses), 'bytes': deep_size(api._responses, seen)}
+    return caches
+
+
+def directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def report():
+    # the caches are measured first, so logo strings that figures of the store also hold are counted as logos
+    seen = set()
+    caches = cache_usage(seen)
+    process = {'max_rss_bytes': data_refresh.max_rss_bytes()}
+    if psutil is not None:
+        process['rss_bytes'] = psutil.Process().memory_info().rss
+    if tracemalloc.is_tracing():
+        process['traced_bytes'], process['traced_peak_bytes'] = tracemalloc.get_traced_memory()
+
+    usage = {
+        'generation': data_refresh.metrics['generation'],
+        'process': process,
+        'store': store_usage(data_store.get_store(), seen),
+        'caches': caches,
+        'background_results': {'path': background.CACHE_DIR, 'bytes_on_disk': directory_bytes(background.CACHE_DIR)},
+    }
+    if sqlite_store.ENABLED and os.path.isfile(sqlite_store.PATH):
+        usage['sqlite_store'] = {'path': sqlite_store.PATH, 'bytes_on_disk': os.path.getsize(sqlite_store.PATH)}
+    return usage
+
+
+def snapshot_diff(group_by='lineno', limit=TOP_ALLOCATIONS):
+    # allocations that grew or shrank since the previous call, None on the first call
+    global _snapshot
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, filename) for filename in IGNORED_FILES])
+    with _snapshot_lock:
+        previous, _snapshot = _snapshot, snapshot
+    if previous is None:
+        return None
+    stats = snapshot.compare_to(previous, group_by)
+    return [{'where': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+             'size_diff_bytes': stat.size_diff, 'size_bytes': stat.size,
+             'count_diff': stat.count_diff, 'count': stat.count}
+            for stat in stats[:limit]]
+
+
+def register_routes(server):
+    if not ENABLED:
+        return
+
+    @server.route('/debug/memory')
+    def memory_report():
+        return jsonify(report())
+
+    @server.route('/debug/memory/snapshot', methods=['POST'])
+    def memory_snapshot():
+        if not tracemalloc.is_tracing():
+            return jsonify({'error': 'tracemalloc is not running, start the app with PYTHONTRACEMALLOC=25'}), 409
+        group_by = request.args.get('group_by', 'lineno')
+        if group_by not in ('lineno', 'filename', 'traceback'):
+            return jsonify({'error': 'group_by must be lineno, filename or traceback'}), 400
+        diff = snapshot_diff(group_by, request.args.get('limit', TOP_ALLOCATIONS, type=int))
+        if diff is None:
+            return jsonify({'status': 'baseline taken, call again to compare'})
+        traced, peak = tracemalloc.get_traced_memory()
+        return jsonify({'traced_bytes': traced, 'traced_peak_bytes': peak, 'allocations': diff})
@@ -0,0 +1,26 @@
+from dash import Patch
+
+# partial figure and table updates for multi-selects: when the new selection is the old one with some entries
+# taken out and some added at the end, only the traces of those entries are sent instead of the whole figure
+
+
+def selection_delta(previous, selected):
+    # (positions removed from the previous selection, highest first, entries added at the end),
+    # None when the new selection is in another order and has to be drawn again
+    previous = previous or []
+    kept = [entry for entry in previous if entry in selected]
+    added = [entry for entry in selected if entry not in previous]
+    if kept + added != list(selected):
+        return None
+    removed = [index for index, entry in enumerate(previous) if entry not in selected]
+    return removed[::-1], added
+
+
+def patch_traces(removed, added_traces):
+    # removes the traces at the given positions and appends the new ones
+    fig = Patch()
+    for index in removed:
+        del fig['data'][index]
+    for trace in added_traces:
+        fig['data'].append(trace)
+    return fig
@@ -1,12 +1,16 @@
 import pandas as pd
 import plotly.graph_objects as go
 from dash import dcc, html, dash_table
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import dash
 import dash_bootstrap_components as dbc
 
-# Load the data
-df = pd.read_csv('../data/entire_players_list_with_percentiles.csv')
+import modules.data_store as data_store
+import modules.patches as patches
+
+TAB_ID = 'player-radar-charts-tab'
+TAB_LABEL = "Player Radar Charts (Adam)"
+TAB_ORDER = 70
 
 # Define relevant statistics for each position
 attacker_stats = [
@@ -26,6 +30,7 @@ defender_stats = [
 
 # Creating dropdown options for each player based on their position
 def create_dropdown_options(position):
+    df = data_store.get_store().load_dataset('player_percentiles')
     return [
         {'label': f"{player} ({club}, {age}, {nation})", 'value': player}
         for player, club, age, nation in zip(df[df['Position'] == position]['Player'], df[df['Position'] == position]['Club'], df[df['Position'] == position]['Age'], df[df['Position'] == position]['Nation'])
@@ -77,6 +82,8 @@ def layout():
                     style={'margin-bottom': '15px'}
                 ),
                 dcc.Graph(id='attacker-radar-chart', figure=create_empty_radar_chart()),
+                # the players the chart and the table currently show
+                dcc.Store(id='attacker-selection', data=[]),
                 html.H5("", style={'textAlign': 'center', 'margin-top': '10px'}),
                 html.P(
                     "",
@@ -101,6 +108,7 @@ def layout():
                     style={'margin-bottom': '15px'}
                 ),
                 dcc.Graph(id='midfielder-radar-chart', figure=create_empty_radar_chart()),
+                dcc.Store(id='midfielder-selection', data=[]),
                 html.H5("", style={'textAlign': 'center', 'margin-top': '10px'}),
                 html.P(
                     "",
@@ -125,6 +133,7 @@ def layout():
                     style={'margin-bottom': '15px'}
                 ),
                 dcc.Graph(id='defender-radar-chart', figure=create_empty_radar_chart()),
+                dcc.Store(id='defender-selection', data=[]),
                 html.H5("", style={'textAlign': 'center', 'margin-top': '10px'}),
                 html.P(
                     "",
@@ -140,191 +149,115 @@ def layout():
         ])
     ])
 
-def register_callbacks(app):
+# Scatterpolar trace of one player, closed by repeating the first statistic
+def create_radar_trace(df, player, stats):
+    player_data = df[df['Player'] == player].iloc[0]
+    percentiles = [category + '_percentile' for category in stats]
+    return go.Scatterpolar(
+        r=[player_data[stat] for stat in percentiles] + [player_data[percentiles[0]]],
+        theta=stats + [stats[0]],
+        fill='toself',
+        name=player,
+        hovertemplate=f'<b>{player}</b><br>%{{theta}}: Better than %{{r:.0f}}%'
+    )
+
+def player_stats(df, player, stats):
+    return df[df['Player'] == player][stats + ['Player', 'Club', 'Age', 'Minutes played']].to_dict('records')[0]
+
+def create_radar_chart(df, selected_players, stats):
+    fig = go.Figure([create_radar_trace(df, player, stats) for player in selected_players])
+    fig.update_layout(
+        template='plotly',
+        polar=dict(
+            radialaxis=dict(
+                visible=False,
+                range=[0, 100]
+            ),
+            angularaxis=dict(
+                visible=True
+            )
+        ),
+        showlegend=True,
+        annotations=[
+            go.layout.Annotation(
+                text="Radar chart shows the percentile rankings of the selected players in various statistics.",
+                x=0.5,
+                y=1.1,
+                xref="paper",
+                yref="paper",
+                showarrow=False,
+                font=dict(size=16, color="darkslategray", family="Arial, sans-serif", weight='bold'),
+                align="center",
+                borderpad=10,
+                yshift=40  # Add some space below the annotation
+            )
+        ]
+    )
+    return fig
+
+# Redraws the chart and the table for a new selection, or only adds and removes the players that changed
+# since the previous one, so one player more costs one trace and one table column whatever is already selected
+def update_chart(selected_players, previous_players, stats):
+    if not selected_players:
+        return create_empty_radar_chart(), [], [], []
+
+    df = data_store.get_store().load_dataset('player_percentiles')
+    delta = patches.selection_delta(previous_players, selected_players) if previous_players else None
+    if delta is None:
+        table_data = create_horizontal_table([player_stats(df, player, stats) for player in selected_players], stats)
+        columns = [{"name": "Statistic per 90", "id": "Statistic per 90"}] + [{"name": player, "id": player} for player in selected_players]
+        return create_radar_chart(df, selected_players, stats), table_data, columns, selected_players
+
+    removed, added = delta
+    fig = patches.patch_traces(removed, [create_radar_trace(df, player, stats).to_plotly_json() for player in added])
+    table_data, columns = dash.Patch(), dash.Patch()
+    for index in removed:
+        # the first column holds the statistic names
+        del columns[index + 1]
+        for row in range(len(stats) + 4):
+            del table_data[row][previous_players[index]]
+    for player in added:
+        columns.append({"name": player, "id": player})
+        for row, record in enumerate(create_horizontal_table([player_stats(df, player, stats)], stats)):
+            table_data[row][player] = record[player]
+    return fig, table_data, columns, selected_players
+
+def load(store):
+    store.load_dataset('player_percentiles')
+
+def register(app):
     @app.callback(
         Output('attacker-radar-chart', 'figure'),
         Output('attacker-table', 'data'),
         Output('attacker-table', 'columns'),
+        Output('attacker-selection', 'data'),
         Input('attacker-dropdown', 'value'),
+        State('attacker-selection', 'data'),
         prevent_initial_call=True
     )
-    def update_attacker_chart(selected_players):
-        if not selected_players:
-            return create_empty_radar_chart(), [], []
-
-        fig = go.Figure()
-        players_stats = []
-
-        for player in selected_players:
-            player_data = df[df['Player'] == player].iloc[0]
-            stats = [category + '_percentile' for category in attacker_stats]
-            fig.add_trace(go.Scatterpolar(
-                r=[player_data[stat] for stat in stats] + [player_data[stats[0]]],
-                theta=[stat.replace('_percentile', '') for stat in stats] + [stats[0].replace('_percentile', '')],
-                fill='toself',
-                name=player,
-                hovertemplate=f'<b>{player}</b><br>%{{theta}}: Better than %{{r:.0f}}%'
-            ))
-            player_stats = df[df['Player'] == player][attacker_stats + ['Player', 'Club', 'Age', 'Minutes played']].to_dict('records')[0]
-            players_stats.append(player_stats)
-
-        fig.update_layout(
-            template='plotly',
-            polar=dict(
-                radialaxis=dict(
-                    visible=False,
-                    range=[0, 100]
-                ),
-                angularaxis=dict(
-                    visible=True
-                )
-            ),
-            showlegend=True,
-            annotations=[
-                go.layout.Annotation(
-                    text="Radar chart shows the percentile rankings of the selected players in various statistics.",
-                    x=0.5,
-                    y=1.1,
-                    xref="paper",
-                    yref="paper",
-                    showarrow=False,
-                    font=dict(size=16, color="darkslategray", family="Arial, sans-serif", weight='bold'),
-                    align="center",
-                    borderpad=10,
-                    yshift=40  # Add some space below the annotation
-                )
-            ]
-        )
-
-        table_data = create_horizontal_table(players_stats, attacker_stats)
-        columns = [{"name": "Statistic per 90", "id": "Statistic per 90"}] + [{"name": player, "id": player} for player in selected_players]
-        
-        return fig, table_data, columns
+    def update_attacker_chart(selected_players, previous_players):
+        return update_chart(selected_players, previous_players, attacker_stats)
 
     @app.callback(
         Output('midfielder-radar-chart', 'figure'),
         Output('midfielder-table', 'data'),
         Output('midfielder-table', 'columns'),
+        Output('midfielder-selection', 'data'),
         Input('midfielder-dropdown', 'value'),
+        State('midfielder-selection', 'data'),
         prevent_initial_call=True
     )
-    def update_midfielder_chart(selected_players):
-        if not selected_players:
-            return create_empty_radar_chart(), [], []
-
-        fig = go.Figure()
-        players_stats = []
-
-        for player in selected_players:
-            player_data = df[df['Player'] == player].iloc[0]
-            stats = [category + '_percentile' for category in midfielder_stats]
-            fig.add_trace(go.Scatterpolar(
-                r=[player_data[stat] for stat in stats] + [player_data[stats[0]]],
-                theta=[stat.replace('_percentile', '') for stat in stats] + [stats[0].replace('_percentile', '')],
-                fill='toself',
-                name=player,
-                hovertemplate=f'<b>{player}</b><br>%{{theta}}: Better than %{{r:.0f}}%'
-            ))
-            player_stats = df[df['Player'] == player][midfielder_stats + ['Player', 'Club', 'Age', 'Minutes played']].to_dict('records')[0]
-            players_stats.append(player_stats)
-
-        fig.update_layout(
-            template='plotly',
-            polar=dict(
-                radialaxis=dict(
-                    visible=False,
-                    range=[0, 100]
-                ),
-                angularaxis=dict(
-                    visible=True
-                )
-            ),
-            showlegend=True,
-            annotations=[
-                go.layout.Annotation(
-                    text="Radar chart shows the percentile rankings of the selected players in various statistics.",
-                    x=0.5,
-                    y=1.1,
-                    xref="paper",
-                    yref="paper",
-                    showarrow=False,
-                    font=dict(size=16, color="darkslategray", family="Arial, sans-serif", weight='bold'),
-                    align="center",
-                    borderpad=10,
-                    yshift=40  # Add some space below the annotation
-                )
-            ]
-        )
-
-        table_data = create_horizontal_table(players_stats, midfielder_stats)
-        columns = [{"name": "Statistic per 90", "id": "Statistic per 90"}] + [{"name": player, "id": player} for player in selected_players]
-        
-        return fig, table_data, columns
+    def update_midfielder_chart(selected_players, previous_players):
+        return update_chart(selected_players, previous_players, midfielder_stats)
 
     @app.callback(
         Output('defender-radar-chart', 'figure'),
         Output('defender-table', 'data'),
         Output('defender-table', 'columns'),
+        Output('defender-selection', 'data'),
         Input('defender-dropdown', 'value'),
+        State('defender-selection', 'data'),
         prevent_initial_call=True
     )
-    def update_defender_chart(selected_players):
-        if not selected_players:
-            return create_empty_radar_chart(), [], []
-
-        fig = go.Figure()
-        players_stats = []
-
-        for player in selected_players:
-            player_data = df[df['Player'] == player].iloc[0]
-            stats = [category + '_percentile' for category in defender_stats]
-            fig.add_trace(go.Scatterpolar(
-                r=[player_data[stat] for stat in stats] + [player_data[stats[0]]],
-                theta=[stat.replace('_percentile', '') for stat in stats] + [stats[0].replace('_percentile', '')],
-                fill='toself',
-                name=player,
-                hovertemplate=f'<b>{player}</b><br>%{{theta}}: Better than %{{r:.0f}}%'
-            ))
-            player_stats = df[df['Player'] == player][defender_stats + ['Player', 'Club', 'Age', 'Minutes played']].to_dict('records')[0]
-            players_stats.append(player_stats)
-
-        fig.update_layout(
-            template='plotly',
-            polar=dict(
-                radialaxis=dict(
-                    visible=False,
-                    range=[0, 100]
-                ),
-                angularaxis=dict(
-                    visible=True
-                )
-            ),
-            showlegend=True,
-            annotations=[
-                go.layout.Annotation(
-                    text="Radar chart shows the percentile rankings of the selected players in various statistics.",
-                    x=0.5,
-                    y=1.1,
-                    xref="paper",
-                    yref="paper",
-                    showarrow=False,
-                    font=dict(size=16, color="darkslategray", family="Arial, sans-serif", weight='bold'),
-                    align="center",
-                    borderpad=10,
-                    yshift=40  # Add some space below the annotation
-                )
-            ]
-        )
-
-        table_data = create_horizontal_table(players_stats, defender_stats)
-        columns = [{"name": "Statistic per 90", "id": "Statistic per 90"}] + [{"name": player, "id": player} for player in selected_players]
-        
-        return fig, table_data, columns
-
-# Initialize the Dash app and register callbacks
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-app.layout = layout()
-register_callbacks(app)
-
-if __name__ == '__main__':
-    app.run_server(debug=True, port=8051)
+    def update_defender_chart(selected_players, previous_players):
+        return update_chart(selected_players, previous_players, defender_stats)
@@ -0,0 +1,68 @@
+import importlib
+import os
+from importlib.metadata import entry_points
+
+import modules.data_refresh as data_refresh
+
+# every dashboard tab is a plugin: a module with
+#   TAB_ID, TAB_LABEL, TAB_ORDER   the tab, its label and its place among the tabs
+#   layout()                        the content of the tab
+#   register(app)                   its callbacks
+#   load(store)                     optional, builds its tables and figures on a new store before a reload swaps it in
+# importing a plugin must not do anything else, no data is read and no app is built until it is asked for
+# the built-in plugins are listed below, other packages add theirs through the entry point group
+
+ENTRY_POINT_GROUP = 'datapool.visualizations'
+
+builtin = {
+    'top_6_race': 'modules.top_6_race',
+    'top_scorers': 'modules.top_scorers',
+    'home_away_performance': 'modules.home_away_performance',
+    'xg_difference': 'modules.xg_difference',
+    'shot_analysis': 'modules.shot_analysis',
+    'goalkeeping_performance': 'modules.goalkeeping_performance',
+    'player_radar_charts': 'modules.player_radar_charts',
+    'cl_results': 'modules.cl_results',
+    'transfers_analysis': 'modules.transfers_analysis',
+    'club_transfer_details': 'modules.club_transfer_details',
+}
+
+REQUIRED = ['TAB_ID', 'TAB_LABEL', 'TAB_ORDER', 'layout', 'register']
+
+
+def available():
+    # plugin name -> module path, nothing is imported yet
+    plugins = dict(builtin)
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        plugins[entry_point.name] = entry_point.value
+    return plugins
+
+
+def enabled_names():
+    # DATAPOOL_PLUGINS=top_6_race,xg_difference starts the dashboard with only these tabs
+    names = os.environ.get('DATAPOOL_PLUGINS', '')
+    return [name.strip() for name in names.split(',') if name.strip()] or list(available())
+
+
+def load_plugin(name):
+    plugins = available()
+    if name not in plugins:
+        raise KeyError(f"Unknown plugin {name}, available: {', '.join(plugins)}")
+    module = importlib.import_module(plugins[name])
+    missing = [attribute for attribute in REQUIRED if not hasattr(module, attribute)]
+    if missing:
+        raise TypeError(f"Plugin {name} ({plugins[name]}) has no {', '.join(missing)}")
+    return module
+
+
+def enabled():
+    # the enabled plugins in tab order, only these are imported
+    return sorted((load_plugin(name) for name in enabled_names()), key=lambda plugin: plugin.TAB_ORDER)
+
+
+def register(app, plugins):
+    # callbacks of every plugin, and its load as a warmup of new stores
+    for plugin in plugins:
+        plugin.register(app)
+        if hasattr(plugin, 'load'):
+            data_refresh.register_warmup(plugin.__name__, plugin.load)
@@ -0,0 +1,150 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# a sampling profiler: a background thread looks at the stack of the profiled thread every few milliseconds
+# and counts how often every call stack was seen, which costs the profiled code next to nothing
+# the counts are written as collapsed stacks ("outer;inner;innermost count" per line), the input format of
+# flamegraph.pl, speedscope and most other flame graph tools, and as a plotly icicle chart
+
+# seconds between two samples
+SAMPLE_INTERVAL = float(os.environ.get('DATAPOOL_SAMPLE_INTERVAL', 0.005))
+
+# deeper stacks are cut at the root end, the innermost frames are the interesting ones
+MAX_DEPTH = 128
+
+# call paths with less of the samples are left out of the flame graph, the collapsed stacks keep everything
+MIN_FLAMEGRAPH_SHARE = 0.002
+
+# how many samplers are running, and the switch interval of the process from before the first of them
+_samplers = 0
+_switch_interval = None
+_switch_lock = threading.Lock()
+
+
+def lower_switch_interval(interval=SAMPLE_INTERVAL):
+    # a sampler only runs when the profiled thread lets go of the GIL, which it otherwise does every 5 ms
+    # or on I/O, so samples would pile up on I/O calls; every call needs a restore_switch_interval()
+    global _samplers, _switch_interval
+    with _switch_lock:
+        if _samplers == 0:
+            _switch_interval = sys.getswitchinterval()
+        _samplers += 1
+        sys.setswitchinterval(min(sys.getswitchinterval(), interval / 10))
+
+
+def restore_switch_interval():
+    # the interval goes back when the last sampler stopped, samplers that overlap do not undo each other
+    global _samplers
+    with _switch_lock:
+        _samplers -= 1
+        if _samplers == 0:
+            sys.setswitchinterval(_switch_interval)
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    # with Sampler() as sampler: ... samples the thread that entered the block
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = None
+
+    def start(self):
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        lower_switch_interval(self.interval)
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        restore_switch_interval()
+        self.seconds = time.perf_counter() - self._start
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            self.stacks[collapse(frame)] += 1
+            self.samples += 1
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, n=20):
+        # the functions most samples were in, (name, share of the samples)
+        innermost = Counter()
+        for stack, count in self.stacks.items():
+            innermost[stack.rsplit(';', 1)[-1]] += count
+        return [(name, count / max(self.samples, 1)) for name, count in innermost.most_common(n)]
+
+
+def flamegraph(stacks, title):
+    # icicle chart of collapsed stacks: every node is a call path, its width the samples spent under it
+    import plotly.graph_objects as go
+
+    values = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        for depth in range(1, len(frames) + 1):
+            values[';'.join(frames[:depth])] += count
+
+    # the children of a path are never wider than the path, so whole branches fall out together
+    total = sum(stacks.values())
+    paths = [path for path, count in values.items() if count >= total * MIN_FLAMEGRAPH_SHARE]
+    # numbers as ids, the paths themselves would make the file many times larger
+    ids = {path: i for i, path in enumerate(paths)}
+    fig = go.Figure(go.Icicle(
+        ids=list(ids.values()),
+        labels=[path.rsplit(';', 1)[-1] for path in paths],
+        parents=[ids[path.rsplit(';', 1)[0]] if ';' in path else '' for path in paths],
+        values=[values[path] for path in paths],
+        branchvalues='total',
+        tiling=dict(orientation='v', flip='y'),
+        hovertemplate='%{label}<br>%{value} samples, %{percentRoot:.1%} of all<extra></extra>',
+    ))
+    fig.update_layout(title=title, height=900, margin=dict(l=10, r=10, t=60, b=10))
+    return fig
+
+
+def write(sampler, directory, name, title):
+    # <name>.collapsed and <name>.html in directory, returns both paths
+    os.makedirs(directory, exist_ok=True)
+    collapsed_path = os.path.join(directory, f'{name}.collapsed')
+    with open(collapsed_path, 'w') as f:
+        f.write(sampler.collapsed())
+    html_path = os.path.join(directory, f'{name}.html')
+    import plotly.io as pio
+    pio.write_html(flamegraph(sampler.stacks, title), html_path, include_plotlyjs='cdn')
+    return collapsed_path, html_path
@@ -0,0 +1,231 @@
+import html
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import Response, abort, g, request
+
+import modules.profiling as profiling
+
+# samples the stacks of Dash callback requests and keeps the ones that were asked for or slow, as collapsed stacks
+# tagged with the callback and its inputs, browsable with a flame graph of each under /debug/profiles
+# a request is profiled when it has the X-Datapool-Profile: 1 header or a datapool_profile cookie, opening the
+# dashboard with ?profile=1 sets the cookie for the browser and ?profile=0 removes it
+# with DATAPOOL_PROFILE_SLOW_MS every callback is sampled and the ones slower than that are kept as well
+# nothing of this is registered unless DATAPOOL_PROFILING=1
+
+ENABLED = os.environ.get('DATAPOOL_PROFILING', '0') == '1'
+
+# callbacks slower than this are kept without being asked for, 0 keeps only the requested ones
+SLOW_MS = float(os.environ.get('DATAPOOL_PROFILE_SLOW_MS', 1000))
+
+PROFILE_DIR = os.environ.get('DATAPOOL_PROFILE_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'profiles', 'requests'))
+
+# the oldest profiles are deleted beyond this many
+MAX_PROFILES = int(os.environ.get('DATAPOOL_PROFILE_KEEP', 200))
+
+HEADER = 'X-Datapool-Profile'
+COOKIE = 'datapool_profile'
+
+CALLBACK_PATH = '/_dash-update-component'
+
+# input values longer than this are cut in the profile metadata
+MAX_VALUE_LENGTH = 200
+
+# stack counts of the request threads being sampled, by thread id
+_active = {}
+_wake = threading.Event()
+_sampler = None
+_sampler_lock = threading.Lock()
+_files_lock = threading.Lock()
+
+
+def sample_requests(interval=profiling.SAMPLE_INTERVAL):
+    # one thread samples every profiled request, and sleeps while there are none
+    while True:
+        if not _active:
+            _wake.wait()
+            _wake.clear()
+            continue
+        time.sleep(interval)
+        frames = sys._current_frames()
+        for thread_id, stacks in list(_active.items()):
+            frame = frames.get(thread_id)
+            if frame is not None:
+                stacks[profiling.collapse(frame)] += 1
+
+
+def start_sampler():
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None or not _sampler.is_alive():
+            _sampler = threading.Thread(target=sample_requests, name='request-sampler', daemon=True)
+            _sampler.start()
+
+
+def requested():
+    return request.headers.get(HEADER) == '1' or request.cookies.get(COOKIE) == '1'
+
+
+def before_request():
+    if request.path != CALLBACK_PATH or not (requested() or SLOW_MS > 0):
+        return
+    g.profile_start = time.perf_counter()
+    g.profile_requested = requested()
+    # the switch interval is short while any request is sampled, as for profiling.Sampler
+    profiling.lower_switch_interval()
+    _active[threading.get_ident()] = Counter()
+    _wake.set()
+
+
+def stop_sampling():
+    # the stacks of this thread's request, None when it was not sampled or has been stopped already
+    stacks = _active.pop(threading.get_ident(), None)
+    if stacks is not None:
+        profiling.restore_switch_interval()
+    return stacks
+
+
+def after_request(response):
+    if request.path == CALLBACK_PATH:
+        stacks = stop_sampling()
+        if stacks is not None:
+            seconds = time.perf_counter() - g.profile_start
+            if g.profile_requested or seconds * 1000 >= SLOW_MS:
+                save(stacks, seconds, 'requested' if g.profile_requested else 'slow', response.status_code)
+    elif 'profile' in request.args:
+        # ?profile=1 on any page switches profiling on for the callbacks of this browser
+        if request.args['profile'] == '1':
+            response.set_cookie(COOKIE, '1', httponly=True, samesite='Lax')
+        else:
+            response.delete_cookie(COOKIE)
+    return response
+
+
+def teardown_request(exc):
+    # a request that failed before after_request is not sampled any longer
+    stop_sampling()
+
+
+def short(value):
+    text = json.dumps(value, default=str)
+    return text if len(text) <= MAX_VALUE_LENGTH else text[:MAX_VALUE_LENGTH] + '...'
+
+
+def save(stacks, seconds, reason, status):
+    payload = request.get_json(silent=True) or {}
+    output = payload.get('output', '')
+    inputs = {f"{item.get('id')}.{item.get('property')}": short(item.get('value'))
+              for item in payload.get('inputs', []) + payload.get('state', []) if isinstance(item, dict)}
+    now = time.time()
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', output).strip('-')[:60]
+    name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}-{slug}"
+    metadata = {
+        'name': name,
+        'timestamp': now,
+        'output': output,
+        'inputs': inputs,
+        'seconds': seconds,
+        'samples': sum(stacks.values()),
+        'reason': reason,
+        'status': status,
+    }
+
+    with _files_lock:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, f'{name}.collapsed'), 'w') as f:
+            f.write(''.join(f"{stack} {count}\n" for stack, count in stacks.most_common()))
+        with open(os.path.join(PROFILE_DIR, f'{name}.json'), 'w') as f:
+            json.dump(metadata, f)
+        # the names start with the time, so the oldest come first
+        for old in sorted(file[:-5] for file in os.listdir(PROFILE_DIR) if file.endswith('.json'))[:-MAX_PROFILES]:
+            for extension in ('.json', '.collapsed'):
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, old + extension))
+                except FileNotFoundError:
+                    pass
+
+
+def saved_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for file in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if file.endswith('.json'):
+            with open(os.path.join(PROFILE_DIR, file)) as f:
+                profiles.append(json.load(f))
+    return profiles
+
+
+def read_stacks(name):
+    if not re.fullmatch(r'[A-Za-z0-9-]+', name):
+        abort(404)
+    path = os.path.join(PROFILE_DIR, f'{name}.collapsed')
+    if not os.path.isfile(path):
+        abort(404)
+    stacks = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, count = line.rstrip('\n').rsplit(' ', 1)
+            stacks[stack] = int(count)
+    return stacks
+
+
+def render_index(profiles):
+    rows = ''.join(
+        f"<tr><td>{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(profile['timestamp']))}</td>"
+        f"<td>{html.escape(profile['output'])}</td>"
+        f"<td><small>{'<br>'.join(html.escape(f'{key} = {value}') for key, value in profile['inputs'].items())}</small></td>"
+        f"<td class='text-end'>{profile['seconds'] * 1000:.0f}</td><td class='text-end'>{profile['samples']}</td>"
+        f"<td>{profile['reason']}</td><td>{profile['status']}</td>"
+        f"<td><a href='profiles/{profile['name']}'>flame graph</a> "
+        f"<a href='profiles/{profile['name']}.collapsed'>collapsed</a></td></tr>"
+        for profile in profiles
+    )
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<title>Callback profiles</title>
+<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css">
+</head>
+<body class="container-fluid my-4">
+<h1>Callback profiles</h1>
+<p>{len(profiles)} profiles in {html.escape(PROFILE_DIR)}, callbacks slower than {SLOW_MS:.0f} ms are kept
+automatically. Add <code>?profile=1</code> to the dashboard URL to profile every callback of this browser.</p>
+<table class="table table-sm table-striped">
+<tr><th>time</th><th>callback</th><th>inputs</th><th class="text-end">ms</th><th class="text-end">samples</th>
+<th>reason</th><th>status</th><th></th></tr>
+{rows}
+</table>
+</body>
+</html>
+"""
+
+
+def register_routes(server):
+    if not ENABLED:
+        return
+    start_sampler()
+    server.before_request(before_request)
+    server.after_request(after_request)
+    server.teardown_request(teardown_request)
+
+    @server.route('/debug/profiles')
+    def profile_index():
+        return Response(render_index(saved_profiles()), mimetype='text/html')
+
+    @server.route('/debug/profiles/<name>.collapsed')
+    def profile_stacks(name):
+        stacks = read_stacks(name)
+        return Response(''.join(f"{stack} {count}\n" for stack, count in stacks.most_common()),
+                        mimetype='text/plain')
+
+    @server.route('/debug/profiles/<name>')
+    def profile_flamegraph(name):
+        fig = profiling.flamegraph(read_stacks(name), name)
+        return Response(fig.to_html(include_plotlyjs='cdn', full_html=True), mimetype='text/html')
@@ -0,0 +1,172 @@
+import pandas as pd
+
+# compact dtypes for every csv the data store reads, applied while the file is parsed
+# 'columns' maps a column to its dtype, 'floats' is used for every other float column of the file
+# columns that are neither listed nor floats keep the dtype pandas infers
+
+# 'category' infers the categories from the file, a list is a fixed vocabulary that the file is checked against
+venues = ['Home', 'Away', 'Neutral']
+results = ['W', 'D', 'L']
+days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+outcomes = ['Goal', 'Saved', 'Saved off Target', 'Blocked', 'Off Target', 'Woodwork']
+body_parts = ['Right Foot', 'Left Foot', 'Head', 'Other']
+positions = ['DF', 'MF', 'FW']
+transfer_types = ['Arrival', 'Departure']
+
+# marks columns that are parsed by a function instead of a dtype
+DATE = 'date'
+MINUTE = 'minute'
+
+# columns shared by the match logs of clubs and keepers
+match_log = {
+    'Date': DATE,
+    'Time': 'category',
+    'Round': 'category',
+    'Day': days,
+    'Venue': venues,
+    'Result': results,
+    'GF': 'int16',
+    'GA': 'int16',
+    'Opponent': 'category',
+}
+
+# columns of the shot logs, "Minute" is split into the minute and the added time
+shot_log = {
+    'Date': DATE,
+    'Minute': MINUTE,
+    'Player': 'category',
+    'Squad': 'category',
+    'Outcome': outcomes,
+    'Body Part': body_parts,
+    'Notes': 'category',
+}
+
+schemas = {
+    'club_results': {
+        'columns': {**match_log, 'Club': 'category', 'Points': 'int16', 'Poss': 'int16', 'Attendance': 'int32',
+                    'Captain': 'category', 'Formation': 'category', 'Referee': 'category'},
+        'floats': 'float32',
+    },
+    'goalkeeping': {
+        'columns': {**match_log, 'Club': 'category'},
+        'floats': 'float32',
+    },
+    'player_standard': {
+        'columns': {'Player': 'category', 'Club': 'category', 'Nation': 'category', 'Pos': 'category'},
+        'floats': 'float32',
+    },
+    'goals': {
+        'columns': {**shot_log, 'MatchDay': 'int16'},
+        'floats': 'float32',
+    },
+    'shots': {
+        'columns': shot_log,
+        'floats': 'float32',
+    },
+    'liverpool_shots': {
+        'columns': shot_log,
+        'floats': 'float32',
+    },
+    'transfers': {
+        # fees are summed over whole seasons, so they keep the full precision
+        'columns': {'Player': 'category', 'Club': 'category', 'Position': 'category', 'Season': 'category',
+                    'Transfer': transfer_types},
+    },
+    'transfer_arrivals': {
+        'columns': {'Club': 'category', 'Position': positions, 'Age': 'int16'},
+    },
+    'player_percentiles': {
+        'columns': {'Club': 'category', 'Nation': 'category', 'Position': positions, 'Age': 'int16',
+                    'Minutes played': 'int32'},
+        'floats': 'float32',
+    },
+    'cl_results': {
+        'columns': {**match_log, 'Captain': 'category', 'Formation': 'category', 'Referee': 'category'},
+        'floats': 'float32',
+    },
+    'cl_players': {
+        'columns': {'Player': 'category', 'Nation': 'category', 'Pos': 'category'},
+        'floats': 'float32',
+    },
+}
+
+
+def split_minute(minute):
+    # "90+2" is the second minute of added time after the 90th, it becomes Minute 90 and Added Time 2
+    parts = minute.astype('string').str.split('+', n=1, expand=True)
+    base = pd.to_numeric(parts[0]).astype('Int16')
+    if 1 in parts:
+        added = pd.to_numeric(parts[1]).astype('Int16')
+    else:
+        added = pd.Series(pd.NA, index=minute.index, dtype='Int16')
+    return base, added
+
+
+def read_csv(dataset, path):
+    schema = schemas.get(dataset)
+    if schema is None:
+        return pd.read_csv(path)
+
+    columns = schema.get('columns', {})
+    dtypes = {}
+    for column, dtype in columns.items():
+        if dtype == MINUTE:
+            dtypes[column] = 'string'
+        elif isinstance(dtype, list):
+            dtypes[column] = 'category'
+        elif dtype != DATE:
+            dtypes[column] = dtype
+    dates = [column for column, dtype in columns.items() if dtype == DATE]
+
+    # the header tells which columns exist, so dates and dtypes are only asked for when they are there
+    header = pd.read_csv(path, nrows=0).columns
+    df = pd.read_csv(path, dtype={column: dtype for column, dtype in dtypes.items() if column in header},
+                     parse_dates=[column for column in dates if column in header])
+
+    for column, dtype in columns.items():
+        if column not in df.columns:
+            continue
+        if dtype == MINUTE:
+            minute, added_time = split_minute(df[column])
+            df[column] = minute
+            df.insert(df.columns.get_loc(column) + 1, 'Added Time', added_time)
+        elif isinstance(dtype, list):
+            unknown = set(df[column].cat.categories) - set(dtype)
+            if unknown:
+                raise ValueError(f"Unexpected values in '{column}' of {dataset}: {sorted(unknown)}")
+            df[column] = df[column].cat.set_categories(dtype)
+
+    floats = schema.get('floats')
+    if floats:
+        other_floats = [column for column in df.select_dtypes('float64').columns if column not in columns]
+        df = df.astype({column: floats for column in other_floats})
+
+    return df
+
+
+def memory_usage(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def memory_report(paths):
+    # memory of every dataset as pandas infers it and with its schema, paths maps dataset names to files
+    rows = []
+    for dataset, path in paths.items():
+        before = memory_usage(pd.read_csv(path))
+        after = memory_usage(read_csv(dataset, path))
+        rows.append({'Dataset': dataset, 'Before (MB)': before / 1e6, 'After (MB)': after / 1e6,
+                     'Reduction': before / after})
+    report = pd.DataFrame(rows)
+    total_before = report['Before (MB)'].sum()
+    total_after = report['After (MB)'].sum()
+    report.loc[len(report)] = ['Total', total_before, total_after, total_before / total_after]
+    return report
+
+
+if __name__ == '__main__':
+    # python -m modules.schemas from adam/visualizations prints the report for the files of the default partition
+    import modules.data_store as data_store
+
+    paths = {dataset: data_store.partition_path(dataset) for dataset in data_store.LEGACY_FILES}
+    paths.update({dataset: data_store.dataset_path(dataset) for dataset in data_store.DATASETS})
+    print(memory_report(paths).round(2).to_string(index=False))
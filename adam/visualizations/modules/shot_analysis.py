@@ -4,24 +4,94 @@ from plotly.subplots import make_subplots
 from dash import dcc, html
 from dash.dependencies import Input, Output
 
-df = pd.read_csv("../../adrian/data/all_shots_CLandPL.csv")
+import modules.data_store as data_store
+import modules.xg_model as xg_model
+import modules.goal_distribution as goal_distribution
 
-# just to ensure xG and PSxG columns are numeric
-df['xG'] = pd.to_numeric(df['xG'], errors='coerce')
-df['PSxG'] = pd.to_numeric(df['PSxG'], errors='coerce')
-df_liverpool = df[df['Squad'] == 'Liverpool']
+TAB_ID = 'shot-analysis-tab'
+TAB_LABEL = "Shot Analysis (Adrian)"
+TAB_ORDER = 50
 
-# calculate total goals for each player
-# we will only take Liverpool players that have scored 5+ goals across the season
-goal_counts = df_liverpool[df_liverpool['Outcome'] == 'Goal'].groupby('Player').size().reset_index(name='Goals')
-players_with_5_goals = goal_counts[goal_counts['Goals'] >= 5]['Player'].tolist()
-df_filtered = df_liverpool[df_liverpool['Player'].isin(players_with_5_goals)]
+def build_liverpool_shots(store):
+    # only Liverpool's shots are read, the opponents' shots of the same matches are not needed
+    df_liverpool = store.select('liverpool_shots', {'Squad': 'Liverpool'})
 
-# filter for rows where the player is one of the selected players
-players = df_filtered['Player'].unique()
+    # just to ensure xG and PSxG columns are numeric
+    df_liverpool['xG'] = pd.to_numeric(df_liverpool['xG'], errors='coerce')
+    df_liverpool['PSxG'] = pd.to_numeric(df_liverpool['PSxG'], errors='coerce')
+    # our own xG for the same shots, from the stored model coefficients
+    df_liverpool['Model xG'] = xg_model.score(df_liverpool, store.shared('xg_model', lambda store: xg_model.load_model()))
+
+    # calculate total goals for each player
+    # we will only take Liverpool players that have scored 5+ goals across the season
+    goal_counts = df_liverpool[df_liverpool['Outcome'] == 'Goal'].groupby('Player', observed=True).size().reset_index(name='Goals')
+    players_with_5_goals = goal_counts[goal_counts['Goals'] >= 5]['Player'].tolist()
+    df_filtered = df_liverpool[df_liverpool['Player'].isin(players_with_5_goals)]
+
+    # filter for rows where the player is one of the selected players
+    players = df_filtered['Player'].unique()
+    return df_filtered, players
+
+def build_liverpool_finishing(store):
+    # goals against the exact goal distribution of each player's shots, Premier League and Champions League together
+    df_filtered, _ = store.shared('liverpool_shots', build_liverpool_shots)
+    table = goal_distribution.goal_table(df_filtered, 'Player')
+    table.index = table.index.astype(str)
+    return table.sort_values(by='xG')
+
+def plot_finishing(store, player_name):
+    table = store.shared('liverpool_finishing', build_liverpool_finishing)
+    colors = ['red' if player == player_name else 'gray' for player in table.index]
+
+    fig = go.Figure()
+    # the range of goals the shots produce with 90% probability, as error bars around the xG
+    fig.add_trace(go.Scatter(
+        x=table['xG'],
+        y=table.index,
+        mode='markers',
+        marker=dict(size=10, color='blue', opacity=0.6),
+        error_x=dict(type='data', symmetric=False, color='gray', thickness=2, width=6,
+                     array=table['High'] - table['xG'], arrayminus=table['xG'] - table['Low']),
+        name=f'xG and {goal_distribution.LEVEL:.0%} range of goals',
+        hoverinfo='skip',
+    ))
+    fig.add_trace(go.Scatter(
+        x=table['Goals'],
+        y=table.index,
+        mode='markers',
+        marker=dict(size=12, color=colors, symbol='diamond'),
+        name='Goals',
+        hovertext=[f"<b>{player}</b><br>Shots: {shots}<br>Goals: {goals}<br>xG: {xg:.1f}<br>"
+                   f"Likely range: {low} to {high} goals<br>p-value: {p_value:.3f}"
+                   for player, shots, goals, xg, low, high, p_value in zip(table.index, table['Shots'], table['Goals'],
+                                                                          table['xG'], table['Low'], table['High'],
+                                                                          table['P Value'])],
+        hoverinfo='text',
+    ))
+
+    fig.update_layout(
+        title="Goals against the Range their xG Explains",
+        title_font=dict(size=24, family='Arial, sans-serif', color='black', weight='bold'),
+        xaxis_title='Goals',
+        template='plotly_white',
+        height=400,
+        xaxis=dict(
+                title_font=dict(size=20, family='Arial, sans-serif', color='black', weight='bold'),
+                tickfont=dict(size=16, family='Arial, sans-serif', color='gray', weight='bold'),
+                showline=True,
+                linewidth=3,
+                linecolor='gray'),
+        yaxis=dict(
+                tickfont=dict(size=16, family='Arial, sans-serif', color='gray', weight='bold'),
+                showline=True,
+                linewidth=3,
+                linecolor='gray'))
+
+    return fig
 
 # shot plot function
-def plot_player_shots(player_name):
+def plot_player_shots(store, player_name):
+    df_filtered, _ = store.shared('liverpool_shots', build_liverpool_shots)
     df_player = df_filtered[df_filtered['Player'] == player_name]
     
     # filter for shots on target (outcome is either 'Goal' or 'Saved')
@@ -38,6 +108,7 @@ def plot_player_shots(player_name):
     for index, row in df_player_sorted.iterrows():
         xg_value = row['xG']
         psxg_value = row['PSxG']
+        model_xg_value = row['Model xG']
         shot_id = row['Shot_ID']
         outcome = row['Outcome']
         
@@ -55,7 +126,7 @@ def plot_player_shots(player_name):
         difference = psxg_value - xg_value if not pd.isna(psxg_value) else None
         # round difference (before, it was too many decimal places)
         difference = round(difference, 2) if difference is not None else None
-        hover_template = f"<b>xG:</b> {xg_value}<br><b>PSxG:</b> {psxg_value}<br><b>Difference:</b> {difference}"
+        hover_template = f"<b>xG:</b> {xg_value:.2f}<br><b>PSxG:</b> {psxg_value:.2f}<br><b>Difference:</b> {difference}<br><b>Model xG:</b> {model_xg_value:.2f}"
 
         # add initial xG marker
         fig.add_trace(
@@ -190,6 +261,8 @@ def plot_player_shots(player_name):
     return fig
 
 def layout():
+    _, players = data_store.get_store().shared('liverpool_shots', build_liverpool_shots)
+
     return html.Div([
         html.H2("Expected Goals xG and Post-Shot-xG: Liverpool players with at Least 5 Goals"),
         html.Label("Select a player:"),
@@ -199,14 +272,25 @@ def layout():
             value=players[0]  # Default to the first player
         ),
         dcc.Graph(id='shot-graph'),
+        dcc.Graph(id='finishing-graph'),
         html.P("Data source: FBref", style={'text-align': 'center', 'font-size': '12px', 'color': 'gray'})
 
     ])
 
-def register_callbacks(app):
+def load(store):
+    store.shared('liverpool_shots', build_liverpool_shots)
+
+def register(app):
     @app.callback(
         Output('shot-graph', 'figure'),
         [Input('player-dropdown', 'value')]
     )
     def update_shot_graph(selected_player):
-        return plot_player_shots(selected_player)
+        return plot_player_shots(data_store.get_store(), selected_player)
+
+    @app.callback(
+        Output('finishing-graph', 'figure'),
+        [Input('player-dropdown', 'value')]
+    )
+    def update_finishing_graph(selected_player):
+        return plot_finishing(data_store.get_store(), selected_player)
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+import modules.entities as entities
+
+# the shot logs only name the shooting squad, the conceding club is the opponent in the match log of that squad
+# PSxG is only given for shots on target, so PSxG faced minus the goals from those shots is the shot-stopping
+# of the keeper: above 0 the keeper kept out more than an average one would have
+
+# outcomes that were on target and that the keeper had to deal with
+on_target = ['Goal', 'Saved']
+
+
+def match_key(dates, club_ids):
+    # one int64 per (date, club), a club plays at most one game a day
+    days = pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]').astype(np.int64)
+    return (days << 20) | np.asarray(club_ids, dtype=np.int64)
+
+
+def concede(shots, results):
+    # the conceding club of every shot through a hash index of the match log keys, one vectorized probe for all shots
+    fixtures = pd.Index(match_key(results['Date'], results['Club ID']))
+    if not fixtures.is_unique:
+        raise ValueError("The match log has more than one game of a club on the same day")
+    rows = fixtures.get_indexer(match_key(shots['Date'], shots['Squad ID'].fillna(-1)))
+
+    opponents = results['Opponent ID'].to_numpy(dtype=float)
+    conceding = pd.Series(np.where(rows >= 0, opponents[rows], np.nan), index=shots.index).astype('Int32')
+    df = shots.copy()
+    df['Conceding Club ID'] = conceding
+    df['Conceding Club'] = conceding.map(dict(enumerate(entities.clubs.names))).astype('category')
+    return df
+
+
+def build_shots_against(store, league, season):
+    return concede(store.load('shots', league, season), store.load('club_results', league, season))
+
+
+def conceded_table(shots_against):
+    # shots, xG and PSxG a club conceded, with the shot-stopping and the quality of the shots it faced
+    df = shots_against.dropna(subset=['Conceding Club ID'])
+    target = df['Outcome'].isin(on_target)
+    table = pd.DataFrame({
+        'Conceding Club ID': df['Conceding Club ID'],
+        'Shots Against': 1,
+        'Shots on Target Against': target.astype(int),
+        'xG Against': df['xG'].astype(float),
+        'PSxG Faced': df['PSxG'].astype(float).where(target, 0),
+        'Goals Against from Shots': (df['Outcome'] == 'Goal').astype(int),
+    }).groupby('Conceding Club ID').sum()
+
+    table['PSxG - GA'] = table['PSxG Faced'] - table['Goals Against from Shots']
+    table['xG per Shot Against'] = table['xG Against'] / table['Shots Against']
+    table['PSxG per Shot on Target'] = table['PSxG Faced'] / table['Shots on Target Against']
+    table.index = table.index.rename('Club ID')
+    return table.reset_index()
+
+
+if __name__ == '__main__':
+    # python -m modules.shots_against from adam/visualizations prints the conceded table of the default partition
+    import time
+
+    import modules.data_store as data_store
+
+    store = data_store.get_store()
+    shots, results = store.load('shots'), store.load('club_results')
+    start = time.perf_counter()
+    shots_against = concede(shots, results)
+    print(f"{len(shots_against)} shots joined in {(time.perf_counter() - start) * 1000:.1f} ms")
+    table = conceded_table(shots_against)
+    table.insert(1, 'Club', table['Club ID'].map(entities.clubs.name))
+    print(table.drop(columns='Club ID').sort_values('PSxG - GA', ascending=False).round(2).to_string(index=False))
@@ -0,0 +1,234 @@
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+import modules.entities as entities
+
+# every dataset of every partition in one local SQLite file, with indexes on the player, club, date and competition
+# columns, so a callback that needs a few rows reads those rows instead of holding the whole frame
+# the file is built by build_sqlite_store.py and rebuilt by a data reload when the csv files changed,
+# DATAPOOL_BACKEND=sqlite makes DataStore.select read from it
+# entity ids are handed out per process, so the file keeps the names and the id columns are filled in on reading
+
+ENABLED = os.environ.get('DATAPOOL_BACKEND', 'pandas') == 'sqlite'
+
+PATH = os.environ.get('DATAPOOL_SQLITE', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data', 'datapool.sqlite3'))
+
+# a partitioned table has its league and season in these columns, every index starts with them,
+# and the league is the competition of its rows
+PARTITION_COLUMNS = ['_league', '_season']
+
+# filters on an id column become filters on its name column, so the names carry the indexes
+INDEXED_COLUMNS = ['Player', 'Club', 'Squad', 'Opponent', 'Date']
+
+# id columns that are not written but made from their name column when they are read
+ID_COLUMNS = {f'{column} ID': column for column in entities.entity_columns}
+COMPETITION_ID = 'Competition ID'
+
+# rows per insert while a table is written
+CHUNK_SIZE = 5000
+
+_local = threading.local()
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_types(df):
+    # the dtype of every column, with its list of categories
+    return {column: ('category', list(dtype.categories)) if isinstance(dtype, pd.CategoricalDtype) else (str(dtype), None)
+            for column, dtype in df.dtypes.items()}
+
+
+def merge_types(types, df):
+    # the types of a dataset over all its partitions, a categorical column keeps the categories of every partition
+    # so a few selected rows come back as the frame they were cut from would have them, whatever its partition
+    for column, (dtype, categories) in column_types(df).items():
+        if column not in types:
+            types[column] = (dtype, categories)
+        elif types[column][0] != dtype:
+            # the partitions disagree, the column is read back as sqlite returns it
+            types[column] = ('object', None)
+        elif categories is not None:
+            known = types[column][1]
+            seen = set(known)
+            known += [category for category in categories if category not in seen]
+    return types
+
+
+def build(tables, sources, path=PATH):
+    # tables are (dataset, (league, season) or None, frame) as data_store.all_tables() yields them, sources maps
+    # every csv file to its (mtime_ns, size); the file is written next to the old one and replaces it when complete
+    # every process builds into its own file, workers that reload at the same time do not write into each other's
+    building = f'{path}.{os.getpid()}.building'
+    if os.path.exists(building):
+        os.remove(building)
+    connection = sqlite3.connect(building)
+    try:
+        connection.execute('CREATE TABLE _columns (dataset TEXT, position INTEGER, name TEXT, dtype TEXT, '
+                           'categories TEXT)')
+        connection.execute('CREATE TABLE _sources (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER)')
+        # the competition of a dataset that is not partitioned, the league of a partition is its competition
+        connection.execute('CREATE TABLE _datasets (dataset TEXT PRIMARY KEY, competition TEXT)')
+        partitioned = {}
+        types = {}
+        for dataset, partition, df in tables:
+            merge_types(types.setdefault(dataset, {}), df)
+            if dataset not in partitioned:
+                partitioned[dataset] = partition is not None
+                competition = None
+                if partition is None and COMPETITION_ID in df.columns and len(df):
+                    competition = entities.competitions.name(int(df[COMPETITION_ID].iloc[0]))
+                connection.execute('INSERT INTO _datasets VALUES (?, ?)', (dataset, competition))
+            df = df.drop(columns=[column for column in df.columns if column in ID_COLUMNS or column == COMPETITION_ID])
+            if partition is not None:
+                df = df.assign(_league=partition[0], _season=partition[1])
+            df.to_sql(dataset, connection, if_exists='append', index=False, chunksize=CHUNK_SIZE)
+
+        connection.executemany('INSERT INTO _columns VALUES (?, ?, ?, ?, ?)', [
+            (dataset, i, column, dtype, json.dumps(categories, default=str) if categories is not None else None)
+            for dataset, columns in types.items() for i, (column, (dtype, categories)) in enumerate(columns.items())])
+
+        for dataset, is_partitioned in partitioned.items():
+            columns = {row[1] for row in connection.execute(f'PRAGMA table_info({quote(dataset)})')}
+            prefix = PARTITION_COLUMNS if is_partitioned else []
+            if prefix:
+                connection.execute(f'CREATE INDEX {quote(f"ix_{dataset}_partition")} ON {quote(dataset)} '
+                                   f'({", ".join(map(quote, prefix))})')
+            for column in INDEXED_COLUMNS:
+                if column in columns:
+                    connection.execute(f'CREATE INDEX {quote(f"ix_{dataset}_{column}")} ON {quote(dataset)} '
+                                       f'({", ".join(map(quote, prefix + [column]))})')
+
+        connection.executemany('INSERT INTO _sources VALUES (?, ?, ?)',
+                               [(source, *version) for source, version in sources.items()])
+        connection.commit()
+        connection.execute('ANALYZE')
+    finally:
+        connection.close()
+    os.replace(building, path)
+
+
+def is_current(sources, path=PATH):
+    # whether the file was built from exactly these versions of the csv files
+    if not os.path.isfile(path):
+        return False
+    connection = sqlite3.connect(path)
+    try:
+        built = {row[0]: (row[1], row[2]) for row in connection.execute('SELECT * FROM _sources')}
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        connection.close()
+    return built == sources
+
+
+def connect(path=PATH):
+    # one read-only connection per thread, reopened when a build in any process replaced the file
+    try:
+        key = (path, os.stat(path).st_ino)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No SQLite store at {path}, build it with python build_sqlite_store.py") from None
+    if getattr(_local, 'key', None) != key:
+        if getattr(_local, 'connection', None) is not None:
+            _local.connection.close()
+        _local.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        _local.columns = {}
+        _local.ids = {}
+        _local.key = key
+    return _local.connection
+
+
+def table_columns(connection, dataset):
+    if dataset not in _local.columns:
+        rows = connection.execute('SELECT name, dtype, categories FROM _columns WHERE dataset = ? ORDER BY position',
+                                  (dataset,)).fetchall()
+        if not rows:
+            raise KeyError(f"No dataset {dataset} in the SQLite store")
+        competition = connection.execute('SELECT competition FROM _datasets WHERE dataset = ?', (dataset,)).fetchone()
+        _local.columns[dataset] = ({name: pd.CategoricalDtype(json.loads(categories)) if categories else dtype
+                                    for name, dtype, categories in rows}, competition[0])
+    return _local.columns[dataset]
+
+
+def entity_ids(dataset, column, names):
+    # the ids of a categorical name column, the ids of all its categories are looked up once per connection
+    key = (dataset, column)
+    if key not in _local.ids:
+        dimension = entities.entity_columns[column]
+        _local.ids[key] = np.array([dimension.id(name) for name in names.cat.categories] + [-1], dtype=np.int32)
+    codes = names.cat.codes.to_numpy()
+    return pd.Series(_local.ids[key][codes], index=names.index, dtype='Int32').mask(codes < 0)
+
+
+def restore_types(df, types):
+    # one astype for all columns, a column at a time is most of the time of a wide read
+    for column, dtype in types.items():
+        if isinstance(dtype, str) and dtype.startswith('datetime64'):
+            df[column] = pd.to_datetime(df[column])
+    return df.astype({column: dtype for column, dtype in types.items()
+                      if not (isinstance(dtype, str) and (dtype.startswith('datetime64') or dtype == 'object'))})
+
+
+def parameter(value):
+    # dates are stored as text in the format pandas writes them, numpy scalars as the python numbers they hold
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value.item() if hasattr(value, 'item') else value
+
+
+def select(dataset, where=None, columns=None, partition=None, path=PATH):
+    # rows of dataset where every column of where equals its value, or is one of them for a list or tuple,
+    # partition is (league, season) for the partitioned datasets
+    connection = connect(path)
+    types, competition = table_columns(connection, dataset)
+    competition = partition[0] if partition is not None else competition
+    columns = columns or list(types)
+    unknown = [column for column in list(where or {}) + columns if column not in types]
+    if unknown:
+        raise KeyError(f"{dataset} has no columns {unknown}")
+
+    conditions, params = [], []
+    if partition is not None:
+        conditions += [f'{quote(column)} = ?' for column in PARTITION_COLUMNS]
+        params += list(partition)
+    for column, value in (where or {}).items():
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        if column == COMPETITION_ID:
+            # every row has the same competition
+            if entities.competitions.id(competition) not in values:
+                conditions.append('0')
+            continue
+        if column in ID_COLUMNS:
+            dimension = entities.entity_columns[ID_COLUMNS[column]]
+            column = ID_COLUMNS[column]
+            values = [dimension.name(int(entity_id)) for entity_id in values if 0 <= entity_id < len(dimension.names)]
+        conditions.append(f'{quote(column)} IN ({", ".join("?" * len(values))})')
+        params += [parameter(item) for item in values]
+
+    # an id column is read as its name column
+    stored = list(dict.fromkeys(ID_COLUMNS.get(column, column) for column in columns if column != COMPETITION_ID))
+    sql = f'SELECT {", ".join(map(quote, stored))} FROM {quote(dataset)}'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    # the rows in the order of the file, as the frame has them
+    sql += ' ORDER BY rowid'
+    df = restore_types(pd.read_sql_query(sql, connection, params=params), {column: types[column] for column in stored})
+
+    if all(column in df.columns for column in columns):
+        return df[columns]
+    result = {}
+    for column in columns:
+        if column == COMPETITION_ID:
+            result[column] = pd.Series(np.int16(entities.competitions.id(competition)), index=df.index)
+        elif column in ID_COLUMNS:
+            result[column] = entity_ids(dataset, ID_COLUMNS[column], df[ID_COLUMNS[column]])
+        else:
+            result[column] = df[column]
+    return pd.DataFrame(result, index=df.index)
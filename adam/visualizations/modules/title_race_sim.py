@@ -0,0 +1,176 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import poisson
+
+# Monte Carlo replay of a season from the xG of its matches:
+# every simulated season draws the goals of each match from Poisson distributions with the two teams' xG.
+# The whole season is simulated once per run and the results from matchday N onwards are added to the real table
+# after N games (suffix sums over the matchdays), so one run answers "how likely was each finishing position
+# after matchday N" for every N at the same time.
+
+N_SIMULATIONS = 100_000
+
+# simulations per task, every task gets its own random stream so results do not depend on the number of workers
+CHUNK_SIZE = 10_000
+
+SEED = 2019
+
+WORKERS = int(os.environ.get('DATAPOOL_SIMULATION_WORKERS', os.cpu_count() or 1))
+
+# points for a loss, a draw and a win
+POINTS = np.array([0, 1, 3], dtype=np.int32)
+
+# more goals than this in one match are counted as this many, far beyond anything an xG of a match makes likely
+MAX_GOALS = 12
+
+# a point is worth more than any goal difference a club can have over a season
+SCORE_PER_POINT = 1000
+
+
+def build_fixtures(store, league, season):
+    # one row per match with the home and away club, the matchday of the match for both of them and both xG values
+    df = store.load('club_results', league, season).copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.sort_values(by=['Club ID', 'Date'], kind='stable')
+    # the n-th game a club played, like the chronological matchdays of the top 6 race
+    df['Matchday'] = df.groupby('Club ID').cumcount()
+
+    clubs = sorted(df['Club'].unique())
+    df['Club Index'] = df['Club'].map({club: i for i, club in enumerate(clubs)}).astype(int)
+
+    home = df[df['Venue'] == 'Home']
+    away = df[df['Venue'] == 'Away'][['Date', 'Club ID', 'Opponent ID', 'Club Index', 'Matchday']]
+    fixtures = home.merge(away, left_on=['Date', 'Club ID', 'Opponent ID'], right_on=['Date', 'Opponent ID', 'Club ID'],
+                          suffixes=('', ' Away'), validate='one_to_one')
+    if len(fixtures) != len(home):
+        raise ValueError(f"{len(home) - len(fixtures)} home games of {league} {season} have no matching away game")
+
+    # real points and goal difference after n games, n = 0 .. number of games, as one score like the simulation's
+    n_matchdays = df['Matchday'].max() + 1
+    scores = np.zeros((len(clubs), n_matchdays + 1), dtype=np.int32)
+    scores[df['Club Index'], df['Matchday'] + 1] = (df['Points'].astype(np.int32) * SCORE_PER_POINT
+                                                   + df['GF'].astype(np.int32) - df['GA'].astype(np.int32))
+
+    return {
+        'clubs': clubs,
+        'n_matchdays': int(n_matchdays),
+        'home': fixtures['Club Index'].to_numpy(),
+        'away': fixtures['Club Index Away'].to_numpy(),
+        'home_matchday': fixtures['Matchday'].to_numpy(),
+        'away_matchday': fixtures['Matchday Away'].to_numpy(),
+        'home_cdf': goal_cdf(fixtures['xG']),
+        'away_cdf': goal_cdf(fixtures['xGA']),
+        'scores': np.cumsum(scores, axis=1),
+    }
+
+
+def goal_cdf(xg):
+    # P(goals <= k) for k = 0 .. MAX_GOALS - 1, one row per match
+    return poisson.cdf(np.arange(MAX_GOALS)[None, :], np.asarray(xg, dtype=float)[:, None]).astype(np.float32)
+
+
+def draw_goals(rng, cdf, n_simulations):
+    # inverse transform sampling, goals is the number of thresholds the uniform draw is above
+    # three times faster than Generator.poisson for the small means of football scores
+    uniform = rng.random((len(cdf), n_simulations), dtype=np.float32)
+    goals = np.zeros((len(cdf), n_simulations), dtype=np.int8)
+    for k in range(cdf.shape[1]):
+        goals += uniform > cdf[:, k:k + 1]
+    return goals
+
+
+def simulate_chunk(fixtures, n_simulations, seed):
+    # finishing position counts [start matchday, club, position] of n_simulations seasons
+    rng = np.random.default_rng(seed)
+    n_clubs = len(fixtures['clubs'])
+    n_matchdays = fixtures['n_matchdays']
+
+    # goals of every match in every simulation, matches x simulations
+    home_goals = draw_goals(rng, fixtures['home_cdf'], n_simulations)
+    away_goals = draw_goals(rng, fixtures['away_cdf'], n_simulations)
+    difference = home_goals.astype(np.int32) - away_goals
+    result = np.sign(difference) + 1
+
+    # the table is sorted by points and then goal difference, so both fit in one score that can be summed
+    home_score = np.take(POINTS, result) * SCORE_PER_POINT + difference
+    away_score = np.take(POINTS[::-1], result) * SCORE_PER_POINT - difference
+
+    # simulated score of every club in every one of its games, matchday x simulation x club,
+    # with a zero row at the end so the suffix sums start with "nothing left to play"
+    scores = np.zeros((n_matchdays + 1, n_simulations, n_clubs), dtype=np.int32)
+    scores[fixtures['home_matchday'], :, fixtures['home']] = home_score
+    scores[fixtures['away_matchday'], :, fixtures['away']] = away_score
+
+    # simulated score from game n + 1 to the end of the season, for every n, added to the real one after n games
+    final_scores = np.cumsum(scores[::-1], axis=0)[::-1]
+    final_scores += fixtures['scores'].T[:, None, :]
+
+    # anything still level is decided by lot, drawn once per simulated season
+    lots = rng.permuted(np.broadcast_to(np.arange(n_clubs, dtype=np.int32), (n_simulations, n_clubs)), axis=1)
+    final_scores *= n_clubs
+    final_scores += lots
+    order = np.argsort(-final_scores, axis=2)
+
+    # order[matchday, simulation, position] is the club in that position, counted in one bincount
+    matchday = np.arange(n_matchdays + 1)[:, None, None]
+    position = np.arange(n_clubs)[None, None, :]
+    index = (matchday * n_clubs + order) * n_clubs + position
+    counts = np.bincount(index.ravel(), minlength=(n_matchdays + 1) * n_clubs * n_clubs)
+    return counts.reshape(n_matchdays + 1, n_clubs, n_clubs)
+
+
+def simulate(fixtures, n_simulations=N_SIMULATIONS, seed=SEED, workers=WORKERS, chunk_size=CHUNK_SIZE, progress=None):
+    # probabilities [start matchday, club, position] of finishing positions, replayed from every matchday
+    # progress, when given, is called with the number of seasons done after every chunk
+    sizes = [chunk_size] * (n_simulations // chunk_size)
+    if n_simulations % chunk_size:
+        sizes.append(n_simulations % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    def accumulate(results):
+        counts, done = 0, 0
+        for size, chunk_counts in zip(sizes, results):
+            counts = counts + chunk_counts
+            done += size
+            if progress is not None:
+                progress(done)
+        return counts
+
+    if workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(sizes))) as executor:
+            counts = accumulate(executor.map(simulate_chunk, [fixtures] * len(sizes), sizes, seeds))
+    else:
+        counts = accumulate(simulate_chunk(fixtures, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds))
+    return counts / n_simulations
+
+
+def build_position_odds(store, league, season, progress=None):
+    fixtures = store.derived('fixtures', build_fixtures, league, season)
+    return {
+        'clubs': fixtures['clubs'],
+        'n_matchdays': fixtures['n_matchdays'],
+        'odds': simulate(fixtures, progress=progress),
+    }
+
+
+def title_odds(position_odds):
+    # chance of finishing first after every matchday, one column per club
+    return pd.DataFrame(position_odds['odds'][:, :, 0], columns=position_odds['clubs'])
+
+
+if __name__ == '__main__':
+    # python -m modules.title_race_sim from adam/visualizations times a full run for the default partition
+    import time
+
+    import modules.data_store as data_store
+
+    fixtures = data_store.get_store().derived('fixtures', build_fixtures)
+    start = time.perf_counter()
+    odds = simulate(fixtures)
+    print(f"{N_SIMULATIONS} seasons replayed from all {fixtures['n_matchdays'] + 1} matchdays "
+          f"in {time.perf_counter() - start:.2f}s with {WORKERS} workers")
+    table = pd.DataFrame(odds[0], index=fixtures['clubs'], columns=range(1, len(fixtures['clubs']) + 1))
+    print((table.loc[table[1].sort_values(ascending=False).index, [1, 2, 3, 4]] * 100).round(1).head(8).to_string())
@@ -1,115 +1,68 @@
+import functools
+
 import pandas as pd
 import plotly.graph_objects as go
 from dash import dcc, html
 from dash.dependencies import Input, Output
-import os
-import base64
-
-df = pd.read_csv("../../adrian/data/pl_club_results.csv")
-
-# sort df based on 'Date' column
-df['Date'] = pd.to_datetime(df['Date'])
-df = df.sort_values(by='Date')
-
-# with the current order, catch-up games will mess up the order of the games they have been played in
-# so we have to create another column that sorts the matchdays in their actual chronological order
-df['Chronological Matchday'] = df.groupby('Club').cumcount() + 1
-
-df['Accumulated Points'] = 0
-df['Goal Difference'] = 0
-df['League Position'] = 0
-
-# dictionary to store each club's current position and statistics
-club_info = {}
-
-# calculate accumulated points and goal difference
-for index, row in df.iterrows():
-    club = row['Club']
-    points = row['Points']
-    ga = row['GA']
-    gf = row['GF']
-    matchday = row['Chronological Matchday']
-    
-    if club not in club_info:
-        club_info[club] = {'Accumulated Points': 0, 'Goal Difference': 0}
-    
-    # update accumulated points and goal difference
-    club_info[club]['Accumulated Points'] += points
-    club_info[club]['Goal Difference'] += gf - ga
-    
-    # update df with accumulated points and goal difference
-    df.at[index, 'Accumulated Points'] = club_info[club]['Accumulated Points']
-    df.at[index, 'Goal Difference'] = club_info[club]['Goal Difference']
-
-# determine league position based on accumulated points and goal difference for each matchday
-for matchday in range(1, 39):
-    matchday_df = df[df['Chronological Matchday'] == matchday]
-    sorted_clubs = matchday_df.sort_values(by=['Accumulated Points', 'Goal Difference'], ascending=[False, False])
-    sorted_clubs['League Position'] = range(1, len(sorted_clubs) + 1)
-    
-        # update df with league position for this matchday
-    df.loc[sorted_clubs.index, 'League Position'] = sorted_clubs['League Position']
-
-# select only top 6 league positions each matchday
-top_6_clubs_df = df[df['League Position'] <= 6]
-
-# df to store whether each club is in the top 6 for each matchday
-top_6_status = pd.DataFrame(index=range(1, 39), columns=top_6_clubs_df['Club'].unique())
-
-# fill df with True/False depending on top6 or not
-for matchday in range(1, 39):
-    matchday_data = top_6_clubs_df[top_6_clubs_df['Chronological Matchday'] == matchday]
-    for club in top_6_clubs_df['Club'].unique():
-        top_6_status.loc[matchday, club] = (club in matchday_data['Club'].values)
-
-
-for club in top_6_clubs_df['Club'].unique():
-    club_data = top_6_clubs_df[top_6_clubs_df['Club'] == club]
-    hover_text = club_data.apply(lambda row: f"<b>{club}</b><br>Points: {row['Accumulated Points']}<br>Goal Difference: {row['Goal Difference']}", axis=1)
-    
-    # lists to store x, y, and hover text values
-    x_values = []
-    y_values = []
-    hover_texts = []
-    
-    # iterate over each matchday and determine if the club is in the top 6
-    # before this part existed, there was a mistake in the graphic
-    # Bournemouth dropped out of the Top 6 after MD 5 and got in on MD 8 again
-    # without this code, the datapoints from MD 5 and 8 would be connected, which implies they never dropped out
-    for matchday in range(1, 39):
-        if top_6_status.loc[matchday, club]:
-            # If the club is in the top 6, add the data to the lists
-            row = club_data[club_data['Chronological Matchday'] == matchday].iloc[0]
-            x_values.append(row['Chronological Matchday'])
-            y_values.append(row['League Position'])
-            hover_texts.append(hover_text[row.name])
-        else:
-            # If the club is not in the top 6, add None values to create a break in the line
-            x_values.append(None)
-            y_values.append(None)
-            hover_texts.append(None)
-            
-# directory containing club logos
-logo_dir = '../visualizations/logos' 
-
-# default placeholder image
-placeholder_image = os.path.join(logo_dir, "Tottenham Hotspur.png")
-
-# mapping of club names to their base64 logo strings
-club_logos = {}
-for club in top_6_clubs_df['Club'].unique():
-    logo_path = os.path.join(logo_dir, f"{club}.png")
-    if os.path.isfile(logo_path):
-        with open(logo_path, 'rb') as f:
-            encoded_image = base64.b64encode(f.read()).decode('ascii')
-        club_logos[club] = 'data:image/png;base64,{}'.format(encoded_image)
-    else:
-        print(f"Warning: Logo file for {club} not found. Using placeholder.")
-        with open(placeholder_image, 'rb') as f:
-            encoded_image = base64.b64encode(f.read()).decode('ascii')
-        club_logos[club] = 'data:image/png;base64,{}'.format(encoded_image)
-
-def create_figure():
+
+import modules.data_store as data_store
+import modules.entities as entities
+import modules.background as background
+import modules.title_race_sim as title_race_sim
+import modules.expected_points as expected_points
+
+TAB_ID = 'top-6-race-tab'
+TAB_LABEL = "Top 6 Race (Adrian)"
+TAB_ORDER = 10
+
+# clubs below this title chance after every matchday are left out of the title odds chart
+MIN_TITLE_ODDS = 0.01
+
+
+def build_standings(store, league, season):
+    df = store.load('club_results', league, season).copy()
+
+    # sort df based on 'Date' column
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.sort_values(by='Date')
+
+    # with the current order, catch-up games will mess up the order of the games they have been played in
+    # so we have to create another column that sorts the matchdays in their actual chronological order
+    df['Chronological Matchday'] = df.groupby('Club ID').cumcount() + 1
+
+    # calculate accumulated points and goal difference
+    df['Accumulated Points'] = df.groupby('Club ID')['Points'].cumsum()
+    df['Goal Difference'] = (df['GF'] - df['GA']).groupby(df['Club ID']).cumsum()
+    # expected points of the same games, precomputed with the partition
+    df['Accumulated xPts'] = store.derived('xpts', expected_points.build_xpts, league, season)['Accumulated xPts']
+
+    # determine league position based on accumulated points and goal difference for each matchday
+    df = df.sort_values(by=['Chronological Matchday', 'Accumulated Points', 'Goal Difference'],
+                        ascending=[True, False, False], kind='stable')
+    df['League Position'] = df.groupby('Chronological Matchday').cumcount() + 1
+
+    return df
+
+
+def build_top_6(store, league, season):
+    standings = store.derived('standings', build_standings, league, season)
+    matchdays = range(1, standings['Chronological Matchday'].max() + 1)
+
+    # select only top 6 league positions each matchday
+    top_6_clubs_df = standings[standings['League Position'] <= 6]
+
+    # df to store whether each club is in the top 6 for each matchday
+    top_6_status = (top_6_clubs_df.pivot(index='Chronological Matchday', columns='Club', values='League Position')
+                    .reindex(matchdays)
+                    .notna())
+
+    return top_6_clubs_df, top_6_status
+
+
+def create_figure(store, league, season):
+    top_6_clubs_df, top_6_status = store.derived('top_6', build_top_6, league, season)
+    n_matchdays = len(top_6_status)
+
     fig = go.Figure()
 
     # loop through clubs and add traces
@@ -120,17 +73,17 @@ def create_figure():
         club_data = top_6_clubs_df[top_6_clubs_df['Club'] == club]
         
         # iterate over each matchday and determine if the club is in the top 6 or not
-        for matchday in range(1, 39):
+        for matchday in range(1, n_matchdays + 1):
             if top_6_status.loc[matchday, club]:
                 row = club_data[club_data['Chronological Matchday'] == matchday].iloc[0]
                 x_values.append(row['Chronological Matchday'])
                 y_values.append(row['League Position'])
-                hover_texts.append(f"<b>{club}</b><br>Points: {row['Accumulated Points']}<br>Goal Difference: {row['Goal Difference']}")
+                hover_texts.append(f"<b>{club}</b><br>Points: {row['Accumulated Points']}<br>xPts: {row['Accumulated xPts']:.1f}<br>Goal Difference: {row['Goal Difference']}")
                 
                 # add image for the corresponding data point
                 fig.add_layout_image(
                     dict(
-                        source=club_logos[club],
+                        source=entities.club_logo(row['Club ID']),
                         xref="x",
                         yref="y",
                         x=row['Chronological Matchday'],
@@ -175,7 +128,7 @@ def create_figure():
     )
 
     fig.update_layout(
-        title='The Race for The Top Spots - Top 6 League Positions over the 18/19 season',
+        title=f'The Race for The Top Spots - Top 6 League Positions over the {league} {season} season',
         title_font=dict(size=32, family='Arial, sans-serif', color='black', weight='bold'),
         xaxis_title='Chronological Matchday',
         yaxis_title='League Position',
@@ -187,7 +140,7 @@ def create_figure():
                     linewidth=3,
                     linecolor='gray'),
         height=600,
-        xaxis=dict(tickmode='linear', dtick='M1', range=[0.5, 38.5],
+        xaxis=dict(tickmode='linear', dtick='M1', range=[0.5, n_matchdays + 0.5],
                    title_font=dict(size=20, family='Arial, sans-serif', color='black', weight='bold'),
                     tickfont=dict(size=16, family='Arial, sans-serif', color='gray', weight='bold'),
                     showline=True,
@@ -197,24 +150,104 @@ def create_figure():
             visible=True,
             thickness=0.02, 
             bgcolor='lightgrey',
-            range=[0.5, 38.5],
+            range=[0.5, n_matchdays + 0.5],
         ),
         clickmode='none'
     )
 
     return fig
 
+def create_title_odds_figure(store, league, season, progress=None):
+    position_odds = store.derived('position_odds', functools.partial(title_race_sim.build_position_odds,
+                                                                     progress=progress), league, season)
+    odds = title_race_sim.title_odds(position_odds)
+    contenders = odds.columns[odds.max() >= MIN_TITLE_ODDS]
+
+    fig = go.Figure()
+    for club in odds[contenders].iloc[0].sort_values(ascending=False).index:
+        fig.add_trace(go.Scatter(
+            x=odds.index,
+            y=odds[club] * 100,
+            mode='lines+markers',
+            name=club,
+            line=dict(shape='spline', width=4, color=entities.club_color(entities.clubs.id(club))),
+            marker=dict(size=7),
+            hovertemplate=f"<b>{club}</b><br>After matchday %{{x}}: %{{y:.1f}}%<extra></extra>",
+        ))
+
+    fig.update_layout(
+        title=f'Title Odds over Time - {title_race_sim.N_SIMULATIONS:,} seasons replayed from the xG of every match',
+        title_font=dict(size=32, family='Arial, sans-serif', color='black', weight='bold'),
+        xaxis_title='Chronological Matchday',
+        yaxis_title='Chance to win the league (%)',
+        legend_title='Club',
+        yaxis=dict(range=[0, 101],
+                   title_font=dict(size=20, family='Arial, sans-serif', color='black', weight='bold'),
+                   tickfont=dict(size=16, family='Arial, sans-serif', color='gray', weight='bold'),
+                   showline=True,
+                   linewidth=3,
+                   linecolor='gray'),
+        height=600,
+        xaxis=dict(tickmode='linear', range=[-0.5, position_odds['n_matchdays'] + 0.5],
+                   title_font=dict(size=20, family='Arial, sans-serif', color='black', weight='bold'),
+                   tickfont=dict(size=16, family='Arial, sans-serif', color='gray', weight='bold'),
+                   showline=True,
+                   linewidth=3,
+                   linecolor='gray'),
+        clickmode='none'
+    )
+
+    return fig
+
 def layout():
     return html.Div([
+        data_store.partition_selector('top-6-race'),
         dcc.Graph(id='league-position-graph'),
+        dcc.Graph(id='title-odds-graph'),
+        # only shown while the simulation runs in the background
+        html.Div([
+            html.Progress(id='title-odds-progress', max=str(title_race_sim.N_SIMULATIONS), value='0',
+                          style={'width': '300px', 'margin-right': '10px'}),
+            html.Button('Stop Simulation', id='title-odds-cancel', n_clicks=0),
+        ], id='title-odds-running', style={'display': 'none'}),
         html.P("Data source: FBref", style={'text-align': 'center', 'font-size': '12px', 'color': 'gray'})
 
     ])
 
-def register_callbacks(app):
+def load(store):
+    # the title odds are left out, the simulation is only run when the chart is first asked for
+    store.derived('top_6_figure', create_figure)
+
+def register(app):
+    data_store.register_partition_callbacks(app, 'top-6-race')
+
     @app.callback(
         Output('league-position-graph', 'figure'),
-        [Input('league-position-graph', 'hoverData')]
+        [Input('top-6-race-league', 'value'),
+         Input('top-6-race-season', 'value')]
+    )
+    def update_graph(league, season):
+        # the figure only depends on the partition, so it is built once and kept with the partition's tables
+        return data_store.get_store().derived('top_6_figure', create_figure, league, season)
+
+    @background.callback(
+        app,
+        Output('title-odds-graph', 'figure'),
+        [Input('top-6-race-league', 'value'),
+         Input('top-6-race-season', 'value')],
+        progress=[Output('title-odds-progress', 'value')],
+        progress_default=['0'],
+        running=[(Output('title-odds-running', 'style'),
+                  {'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center'}, {'display': 'none'})],
+        cancel=[Input('title-odds-cancel', 'n_clicks')]
     )
-    def update_graph(hover_data):
-        return create_figure()
+    def update_title_odds(set_progress, league, season):
+        def report(done):
+            set_progress([str(done)])
+        store = data_store.get_store()
+        build = functools.partial(create_title_odds_figure, progress=report)
+        if background.available():
+            # this runs in a subprocess whose store is thrown away, the background results keep the figure instead
+            return build(store, league, season)
+        # inline the simulation runs once per partition, later visits only read the figure from the store
+        return store.derived('title_odds_figure', build, league, season)
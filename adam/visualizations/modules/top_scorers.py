@@ -2,54 +2,52 @@ import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output, State
 import plotly.graph_objects as go
-import dash_bootstrap_components as dbc
 import pandas as pd
 
-# Load the data
-df = pd.read_csv('../data/goals_only_pl.csv')
-
-# Create a cumulative sum of goals for each player by match day
-df['Cumulative Goals'] = df.groupby('Player').cumcount() + 1
-
-# Aggregate goals by player and match day
-agg_df = df.groupby(['MatchDay', 'Player', 'Squad']).size().reset_index(name='Goals')
-agg_df['Cumulative Goals'] = agg_df.groupby(['Player', 'Squad'])['Goals'].cumsum()
-
-# Get the top 10 players by total goals scored
-total_goals = df.groupby(['Player', 'Squad'])['Cumulative Goals'].max().reset_index()
-top_10_players = total_goals.nlargest(10, 'Cumulative Goals')['Player'].tolist()
-
-# Filter data to include only the top 10 players
-agg_df = agg_df[agg_df['Player'].isin(top_10_players)]
-
-# Create a mapping from squads to colors
-squad_colors = {
-    'Liverpool': '#c8102e',
-    'Leicester City': '#003090',
-    'Manchester Utd': '#da291c',
-    'Bournemouth': '#d71920',
-    'Wolves': '#d1d1d1',
-    'Tottenham Hotspur': '#d1d1d1',
-    'Everton': '#003399',
-    'Crystal Palace': '#1b458f',
-    'Watford': '#fbec5d',
-    'Manchester City': '#6cabdd',
-    'Newcastle Utd': '#241f20',
-    'Chelsea': '#034694',
-    'Arsenal': '#ef0107'
-}
+import modules.data_store as data_store
+import modules.entities as entities
+
+TAB_ID = 'top-scorers-tab'
+TAB_LABEL = "Top Scorers (Adam)"
+TAB_ORDER = 20
+
+def build_top_scorers(store, league, season):
+    df = store.load('goals', league, season).copy()
+
+    # Create a cumulative sum of goals for each player by match day
+    df['Cumulative Goals'] = df.groupby('Player', observed=True).cumcount() + 1
+
+    # Aggregate goals by player and match day, squads are grouped by id and named afterwards
+    agg_df = df.groupby(['MatchDay', 'Player', 'Squad ID'], observed=True).size().reset_index(name='Goals')
+    agg_df['Cumulative Goals'] = agg_df.groupby(['Player', 'Squad ID'], observed=True)['Goals'].cumsum()
+    agg_df['Squad'] = agg_df['Squad ID'].map(entities.clubs.name)
+
+    # Get the top 10 players by total goals scored
+    total_goals = df.groupby(['Player', 'Squad ID'], observed=True)['Cumulative Goals'].max().reset_index()
+    top_10_players = total_goals.nlargest(10, 'Cumulative Goals')['Player'].tolist()
+
+    # Filter data to include only the top 10 players
+    agg_df = agg_df[agg_df['Player'].isin(top_10_players)]
+    return agg_df, top_10_players
+
+def slider_settings(agg_df):
+    return agg_df['MatchDay'].min(), agg_df['MatchDay'].max(), {str(day): str(day) for day in agg_df['MatchDay'].unique()}
 
 def layout():
+    agg_df, _ = data_store.get_store().derived('top_scorers', build_top_scorers)
+    slider_min, slider_max, slider_marks = slider_settings(agg_df)
+
     return html.Div([
-        html.H1("Premier League 18/19 Top Scorers by Match Day", style={'textAlign': 'center', 'fontWeight': 'bold'}),
+        html.H1("Top Scorers by Match Day", style={'textAlign': 'center', 'fontWeight': 'bold'}),
         html.P("Data source: FBref", style={'textAlign': 'center', 'fontSize': '12px', 'color': 'gray', 'margin-top': '-10px'}),
+        data_store.partition_selector('top-scorers'),
         dcc.Graph(id='top-scorers-graph', style={'position': 'relative', 'height': '610px'}),  # Adjusted height
         dcc.Slider(
             id='matchday-slider',
-            min=agg_df['MatchDay'].min(),
-            max=agg_df['MatchDay'].max(),
-            value=agg_df['MatchDay'].min(),
-            marks={str(day): str(day) for day in agg_df['MatchDay'].unique()},
+            min=slider_min,
+            max=slider_max,
+            value=slider_min,
+            marks=slider_marks,
             step=None
         ),
         html.Div([
@@ -65,16 +63,17 @@ def layout():
         ),
     ], style={'backgroundColor': 'white', 'color': 'black'})
 
-def update_figure(selected_day):
+def update_figure(store, selected_day, league=data_store.DEFAULT_LEAGUE, season=data_store.DEFAULT_SEASON):
+    agg_df, top_10_players = store.derived('top_scorers', build_top_scorers, league, season)
     filtered_df = agg_df[agg_df['MatchDay'] <= selected_day]
     
-    cumulative_goals = filtered_df.groupby(['Player', 'Squad'])['Cumulative Goals'].max().reset_index()
+    cumulative_goals = filtered_df.groupby(['Player', 'Squad', 'Squad ID'], observed=True)['Cumulative Goals'].max().reset_index()
     cumulative_goals = cumulative_goals.set_index('Player').reindex(top_10_players).reset_index()
-    cumulative_goals['Cumulative Goals'].fillna(0, inplace=True)
+    cumulative_goals['Cumulative Goals'] = cumulative_goals['Cumulative Goals'].fillna(0)
 
     cumulative_goals['Player'] = pd.Categorical(cumulative_goals['Player'], categories=top_10_players, ordered=True)
     cumulative_goals = cumulative_goals.sort_values('Player')
-    cumulative_goals['Color'] = cumulative_goals['Squad'].map(squad_colors)
+    cumulative_goals['Color'] = cumulative_goals['Squad ID'].map(entities.club_color)
 
     fig = go.Figure(go.Bar(
         x=cumulative_goals['Cumulative Goals'],
@@ -87,7 +86,7 @@ def update_figure(selected_day):
     ))
     
     fig.update_layout(
-        title=f'Premier League top scorers on matchday {selected_day}',
+        title=f'{league} {season} top scorers on matchday {selected_day}',
         title_x=0.5,
         title_font=dict(size=24, family='Arial, sans-serif', color='black', weight='bold'),
         yaxis=dict(categoryorder='total ascending', tickwidth=2, showticklabels=False, zeroline=True, showline=True, linecolor='black', linewidth=2),
@@ -120,7 +119,23 @@ def update_figure(selected_day):
 
     return fig
 
-def register_callbacks(app):
+def load(store):
+    store.derived('top_scorers', build_top_scorers)
+
+def register(app):
+    data_store.register_partition_callbacks(app, 'top-scorers')
+
+    @app.callback(
+        [Output('matchday-slider', 'min'),
+         Output('matchday-slider', 'max'),
+         Output('matchday-slider', 'marks')],
+        [Input('top-scorers-league', 'value'),
+         Input('top-scorers-season', 'value')]
+    )
+    def update_slider(league, season):
+        agg_df, _ = data_store.get_store().derived('top_scorers', build_top_scorers, league, season)
+        return slider_settings(agg_df)
+
     @app.callback(
         [Output('top-scorers-graph', 'figure'),
          Output('interval-component', 'disabled'),
@@ -130,12 +145,16 @@ def register_callbacks(app):
          Input('pause-button', 'n_clicks'),
          Input('restart-button', 'n_clicks'),
          Input('interval-component', 'n_intervals'),
-         Input('matchday-slider', 'value')],
+         Input('matchday-slider', 'value'),
+         Input('top-scorers-league', 'value'),
+         Input('top-scorers-season', 'value')],
         [State('interval-component', 'disabled'),
          State('interval-component', 'n_intervals')]
     )
-    def update_output(start_n_clicks, pause_n_clicks, restart_n_clicks, n_intervals, slider_value, interval_disabled, current_intervals):
+    def update_output(start_n_clicks, pause_n_clicks, restart_n_clicks, n_intervals, slider_value, league, season, interval_disabled, current_intervals):
         ctx = dash.callback_context
+        store = data_store.get_store()
+        agg_df, _ = store.derived('top_scorers', build_top_scorers, league, season)
 
         if not ctx.triggered:
             return dash.no_update, interval_disabled, dash.no_update, slider_value
@@ -151,22 +170,19 @@ def register_callbacks(app):
         if trigger_id == 'restart-button':
             return dash.no_update, False, 0, agg_df['MatchDay'].min()
 
+        if trigger_id in ('top-scorers-league', 'top-scorers-season'):
+            # a new partition starts again at its first matchday
+            selected_day = agg_df['MatchDay'].min()
+            return update_figure(store, selected_day, league, season), True, 0, selected_day
+
         if trigger_id == 'matchday-slider':
             selected_day = slider_value
-            fig = update_figure(selected_day)
+            fig = update_figure(store, selected_day, league, season)
             return fig, True, n_intervals, selected_day
 
         selected_day = agg_df['MatchDay'].min() + n_intervals
         if selected_day > agg_df['MatchDay'].max():
             return dash.no_update, True, n_intervals, slider_value
 
-        fig = update_figure(selected_day)
+        fig = update_figure(store, selected_day, league, season)
         return fig, True if trigger_id == 'matchday-slider' else interval_disabled, n_intervals, selected_day
-
-# Initialize Dash app and register callbacks
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-app.layout = layout()
-register_callbacks(app)
-
-if __name__ == '__main__':
-    app.run_server(debug=True, port=8051)
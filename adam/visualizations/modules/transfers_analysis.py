@@ -1,14 +1,16 @@
 import pandas as pd
-import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
-import dash_bootstrap_components as dbc
+from scipy import stats
 
-# Load the data
-transfers_df = pd.read_csv('../data/filtered_arrivals_with_additional_data.csv')
+import modules.data_store as data_store
+
+TAB_ID = 'transfers-analysis-tab'
+TAB_LABEL = "Big 6 Transfers Analysis (Adam)"
+TAB_ORDER = 90
 
 # Define colors for positions
 colors = {'DF': 'green', 'MF': 'blue', 'FW': 'red'}
@@ -22,31 +24,102 @@ def categorize_age(age):
     else:
         return 'Over 30'
 
-transfers_df['Age Group'] = transfers_df['Age'].apply(categorize_age)
+def load_transfers(store):
+    transfers_df = store.load_dataset('transfer_arrivals').copy()
+    transfers_df['Age Group'] = transfers_df['Age'].apply(categorize_age)
+    return transfers_df
+
+# Transparent versions of the position colors for the confidence bands
+band_colors = {'DF': 'rgba(0, 128, 0, 0.15)', 'MF': 'rgba(0, 0, 255, 0.15)', 'FW': 'rgba(255, 0, 0, 0.15)'}
+
+# Number of points the trendlines and confidence bands are evaluated on
+grid_size = 50
+
+# Least squares fits of y on x for every group in one pass over the data.
+# Works for any set of clubs, the fit for "All" is just another group.
+def fit_lines(df, x, y, by, confidence=0.95):
+    # rows without a group (e.g. players without a position) are left out, like groupby does
+    df = df.dropna(subset=by if isinstance(by, list) else [by])
+    sums = df.assign(_x=df[x], _y=df[y], _xx=df[x] ** 2, _xy=df[x] * df[y]).groupby(by, observed=True).agg(
+        n=('_x', 'size'), sx=('_x', 'sum'), sy=('_y', 'sum'), sxx=('_xx', 'sum'), sxy=('_xy', 'sum'),
+        x_min=('_x', 'min'), x_max=('_x', 'max'))
+    n = sums['n'].to_numpy(dtype=float)
+    x_mean = sums['sx'].to_numpy() / n
+    y_mean = sums['sy'].to_numpy() / n
+    s_xx = sums['sxx'].to_numpy() - n * x_mean ** 2
+    s_xy = sums['sxy'].to_numpy() - n * x_mean * y_mean
+
+    # groups with a single point or identical fees have no line
+    valid = (n > 1) & (s_xx > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(valid, s_xy / s_xx, np.nan)
+    intercept = y_mean - slope * x_mean
+
+    # residual standard error from the squared residuals of every row against its group's line
+    position = df.groupby(by, observed=True).ngroup().to_numpy()
+    predicted = intercept[position] + slope[position] * df[x].to_numpy()
+    squared_residuals = np.bincount(position, weights=(df[y].to_numpy() - predicted) ** 2, minlength=len(sums))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.sqrt(np.where(n > 2, squared_residuals / (n - 2), np.nan))
+    t = stats.t.ppf(0.5 + confidence / 2, np.maximum(n - 2, 1))
+
+    # evaluate every line and its confidence band of the mean on a grid, all groups at once
+    grid = np.linspace(sums['x_min'].to_numpy(), sums['x_max'].to_numpy(), grid_size, axis=1)
+    line = intercept[:, None] + slope[:, None] * grid
+    with np.errstate(divide='ignore', invalid='ignore'):
+        half_width = (t * s)[:, None] * np.sqrt(1 / n[:, None] + (grid - x_mean[:, None]) ** 2 / s_xx[:, None])
+
+    return {
+        key: {'slope': slope[i], 'intercept': intercept[i], 'n': int(n[i]),
+              'x': grid[i], 'y': line[i], 'lower': line[i] - half_width[i], 'upper': line[i] + half_width[i]}
+        for i, key in enumerate(sums.index) if valid[i]
+    }
+
+# Fits for every club (and all clubs together) and position, plus the fee/age lines
+def build_fits(df, clubs=None):
+    if clubs is not None:
+        df = df[df['Club'].isin(clubs)]
+    df = pd.concat([df, df.assign(Club='All')], ignore_index=True)
+    return {
+        'position': fit_lines(df, 'Fee', 'Total Score', ['Club', 'Position']),
+        'age': fit_lines(df, 'Fee', 'Age', 'Club'),
+    }
+
+def load_fits(store):
+    return build_fits(store.shared('transfers', load_transfers))
 
 # Add trendlines for each position to the plot
-def add_trendline(fig, df, position, color):
-    df_position = df[df['Position'] == position]
-    if len(df_position) > 1:
-        z = np.polyfit(df_position['Fee'], df_position['Total Score'], 1)
-        p = np.poly1d(z)
+def add_trendline(fig, fits, club, position, color):
+    fit = fits['position'].get((club, position))
+    if fit is None:
+        return
+    if not np.isnan(fit['lower']).all():
         fig.add_trace(go.Scatter(
-            x=df_position['Fee'],
-            y=p(df_position['Fee']),
-            mode='lines',
-            name=f'Trendline {position}',
-            line=dict(color=color, width=3),
-            showlegend=True
+            x=np.concatenate([fit['x'], fit['x'][::-1]]),
+            y=np.concatenate([fit['upper'], fit['lower'][::-1]]),
+            fill='toself',
+            fillcolor=band_colors[position],
+            line=dict(width=0),
+            hoverinfo='skip',
+            showlegend=False
         ))
+    fig.add_trace(go.Scatter(
+        x=fit['x'],
+        y=fit['y'],
+        mode='lines',
+        name=f'Trendline {position}',
+        line=dict(color=color, width=3),
+        showlegend=True
+    ))
 
 # Add a trendline for the average age to the plot
-def add_age_line(fig, df):
-    df_sorted = df.sort_values('Fee')
-    z = np.polyfit(df_sorted['Fee'], df_sorted['Age'], 1)
-    p = np.poly1d(z)
+def add_age_line(fig, fits, club):
+    fit = fits['age'].get(club)
+    if fit is None:
+        return
     fig.add_trace(go.Scatter(
-        x=df_sorted['Fee'],
-        y=p(df_sorted['Fee']),
+        x=fit['x'],
+        y=fit['y'],
         mode='lines',
         name='Average Age',
         line=dict(color='#FFCC00', width=3),  # Darker yellow for average age line
@@ -54,8 +127,96 @@ def add_age_line(fig, df):
         showlegend=True
     ))
 
+def create_scatter_figure(store, selected_club):
+    filtered_df = store.shared('transfers', load_transfers)
+    fits = store.shared('transfer_fits', load_fits)
+
+    if selected_club != 'All':
+        filtered_df = filtered_df[filtered_df['Club'] == selected_club]
+
+    scatter_fig = px.scatter(
+        filtered_df,
+        x='Fee',
+        y='Total Score',
+        color='Position',
+        color_discrete_map=colors,
+        hover_data={'Player': True, 'Age': True, 'Fee': True, 'Total Score': True, 'Club': True, 'Position': True},
+        labels={'Fee': 'Transfer Fee (€m)', 'Total Score': 'Total Score'},
+        template='plotly'
+    )
+
+    scatter_fig.update_traces(marker=dict(size=10, opacity=0.8, line=dict(width=2, color='DarkSlateGrey')))
+    scatter_fig.update_layout(
+        height=670,
+        width=1730,  # Adjusted height to fit viewport
+        xaxis=dict(
+            title='Transfer Fee (€m)',
+            title_font=dict(size=35, family='Arial, sans-serif', weight='bold'),
+            tickfont=dict(size=26, family='Arial, sans-serif', weight='bold'),
+            showline=True,
+            linewidth=3,
+            linecolor='gray'
+        ),
+        yaxis=dict(
+            title='Total Score',
+            title_font=dict(size=35, family='Arial, sans-serif', weight='bold'),
+            tickfont=dict(size=26, family='Arial, sans-serif', weight='bold'),
+            showline=True,
+            linewidth=3,
+            linecolor='gray'
+        ),
+        legend_title_text='Position',
+        font=dict(color='black', family='Arial, sans-serif'),
+        legend=dict(font=dict(size=16, family='Arial, sans-serif'), itemclick=False, itemdoubleclick=False),
+        yaxis2=dict(
+            title='Average Age',
+            overlaying='y',
+            side='right',
+            showgrid=False,
+            range=[18, 35],
+            titlefont=dict(size=18, family='Arial, sans-serif', weight='bold')
+        ),
+        margin=dict(l=40, r=40, t=40, b=40)
+    )
+
+    for position, color in colors.items():
+        add_trendline(scatter_fig, fits, selected_club, position, color)
+
+    add_age_line(scatter_fig, fits, selected_club)
+
+    scatter_fig.add_annotation(
+        text=(
+            "This scatter plot shows the relationship between the transfer fees and total scores."
+            " The total score is calculated by cumulating each percentile score of a player when compared to other players in the same position in their respective statistics."
+        ),
+        xref="paper", yref="paper",
+        x=0.01, y=0.02,
+        showarrow=False,
+        bordercolor="black",
+        borderwidth=2,
+        borderpad=10,
+        bgcolor="white",
+        font=dict(size=13, color="black", family="Arial, sans-serif"),
+        align="left"
+    )
+
+    return scatter_fig
+
+# Figures only depend on the selected club, so each of them is built once per store
+# only the clubs of the dropdown are kept, any other value from a client gets an empty figure
+def get_scatter_figure(store, selected_club):
+    clubs = store.shared('transfers', load_transfers)['Club']
+    if selected_club != 'All' and not (isinstance(selected_club, str) and (clubs == selected_club).any()):
+        return go.Figure()
+    figures = store.shared('transfer_figures', lambda store: {})
+    if selected_club not in figures:
+        figures[selected_club] = create_scatter_figure(store, selected_club)
+    return figures[selected_club]
+
 # Define the layout of the app
 def layout():
+    transfers_df = data_store.get_store().shared('transfers', load_transfers)
+
     return html.Div([
         html.H1("Analysis of Player Transfer Fees and Total Scores", style={'font-size': '32px', 'text-align': 'center', 'margin-bottom': '10px'}),
         html.P("Data sources: FBref and transfermarkt", style={'text-align': 'center', 'font-size': '12px', 'color': 'gray', 'margin-top': '0'}),
@@ -70,90 +231,15 @@ def layout():
         dcc.Graph(id='scatter-plot')
     ])
 
+def load(store):
+    # the fits for every club come with the default figure
+    get_scatter_figure(store, 'All')
+
 # Register the callbacks for interactivity
-def register_callbacks(app):
+def register(app):
     @app.callback(
         Output('scatter-plot', 'figure'),
         [Input('club-dropdown', 'value')]
     )
     def update_scatter_plot(selected_club):
-        filtered_df = transfers_df
-
-        if selected_club != 'All':
-            filtered_df = filtered_df[filtered_df['Club'] == selected_club]
-
-        scatter_fig = px.scatter(
-            filtered_df,
-            x='Fee',
-            y='Total Score',
-            color='Position',
-            color_discrete_map=colors,
-            hover_data={'Player': True, 'Age': True, 'Fee': True, 'Total Score': True, 'Club': True, 'Position': True},
-            labels={'Fee': 'Transfer Fee (€m)', 'Total Score': 'Total Score'},
-            template='plotly'
-        )
-
-        scatter_fig.update_traces(marker=dict(size=10, opacity=0.8, line=dict(width=2, color='DarkSlateGrey')))
-        scatter_fig.update_layout(
-            height=670,
-            width=1730,  # Adjusted height to fit viewport
-            xaxis=dict(
-                title='Transfer Fee (€m)',
-                title_font=dict(size=35, family='Arial, sans-serif', weight='bold'),
-                tickfont=dict(size=26, family='Arial, sans-serif', weight='bold'),
-                showline=True,
-                linewidth=3,
-                linecolor='gray'
-            ),
-            yaxis=dict(
-                title='Total Score',
-                title_font=dict(size=35, family='Arial, sans-serif', weight='bold'),
-                tickfont=dict(size=26, family='Arial, sans-serif', weight='bold'),
-                showline=True,
-                linewidth=3,
-                linecolor='gray'
-            ),
-            legend_title_text='Position',
-            font=dict(color='black', family='Arial, sans-serif'),
-            legend=dict(font=dict(size=16, family='Arial, sans-serif'), itemclick=False, itemdoubleclick=False),
-            yaxis2=dict(
-                title='Average Age',
-                overlaying='y',
-                side='right',
-                showgrid=False,
-                range=[18, 35],
-                titlefont=dict(size=18, family='Arial, sans-serif', weight='bold')
-            ),
-            margin=dict(l=40, r=40, t=40, b=40)
-        )
-
-        for position, color in colors.items():
-            add_trendline(scatter_fig, filtered_df, position, color)
-
-        add_age_line(scatter_fig, filtered_df)
-
-        scatter_fig.add_annotation(
-            text=(
-                "This scatter plot shows the relationship between the transfer fees and total scores."
-                " The total score is calculated by cumulating each percentile score of a player when compared to other players in the same position in their respective statistics."
-            ),
-            xref="paper", yref="paper",
-            x=0.01, y=0.02,
-            showarrow=False,
-            bordercolor="black",
-            borderwidth=2,
-            borderpad=10,
-            bgcolor="white",
-            font=dict(size=13, color="black", family="Arial, sans-serif"),
-            align="left"
-        )
-
-        return scatter_fig
-
-# Initialize Dash app and register callbacks
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-app.layout = layout()
-register_callbacks(app)
-
-if __name__ == '__main__':
-    app.run_server(debug=True)
+        return get_scatter_figure(data_store.get_store(), selected_club)
@@ -1,63 +1,172 @@
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from dash import dcc, html
+from dash.dependencies import Input, Output
+
+import modules.data_store as data_store
+import modules.goal_distribution as goal_distribution
+import modules.expected_points as expected_points
+import modules.game_state as game_state
+
+TAB_ID = 'xg-difference-tab'
+TAB_LABEL = "xG Difference (Adrian)"
+TAB_ORDER = 40
+
+# values that are accumulated for every club, in the order of the last axis of the cube
+metrics = ['GF', 'xG', 'GA', 'xGA', 'Points', 'xPts']
+
+# None means the whole season up to the selected matchday, numbers are rolling windows over the last n games
+windows = {
+    'season': None,
+    'last_5': 5,
+    'last_10': 10,
+}
+
+window_labels = {
+    'season': 'Season to date',
+    'last_5': 'Last 5 games',
+    'last_10': 'Last 10 games',
+}
+
+game_state_views = {
+    'xg': 'xG by game state',
+    'late_goals': 'Late goals',
+}
+
+game_state_colors = {
+    'Trailing': 'indianred',
+    'Level': 'lightgray',
+    'Leading': 'seagreen',
+    'Equaliser': 'goldenrod',
+    'Go-ahead goal': 'seagreen',
+    'Other': 'lightgray',
+}
+
+
+def build_xg_cube(store, league, season):
+    df = store.load('club_results', league, season).copy()
+    df['xPts'] = store.derived('xpts', expected_points.build_xpts, league, season)['xPts']
+
+    # the running totals follow the dates the games were played on, so catch-up games count when they happened
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.sort_values(by=['Club', 'Date'], kind='stable')
+    df['Chronological Matchday'] = df.groupby('Club', observed=True).cumcount() + 1
+
+    clubs = sorted(df['Club'].unique())
+    n_matchdays = df['Chronological Matchday'].max()
+    club_index = df['Club'].map({club: i for i, club in enumerate(clubs)}).to_numpy()
+    matchday_index = df['Chronological Matchday'].to_numpy() - 1
+
+    # cube[window, matchday, club, metric], a missing game leaves NaN
+    cube = np.full((len(windows), n_matchdays, len(clubs), len(metrics)), np.nan)
+
+    grouped = df.groupby('Club', observed=True)[metrics]
+    for w, window in enumerate(windows.values()):
+        if window is None:
+            values = grouped.cumsum()
+        else:
+            values = grouped.rolling(window, min_periods=1).sum().reset_index(level=0, drop=True)
+        cube[w, matchday_index, club_index] = values.loc[df.index, metrics].to_numpy()
+
+    return {'clubs': clubs, 'n_matchdays': n_matchdays, 'cube': cube}
+
+
+def build_club_shots(store, league, season):
+    # every shot with the chronological matchday of its club, so the shots follow the same windows as the cube
+    results = store.load('club_results', league, season)[['Date', 'Club ID']].copy()
+    results['Date'] = pd.to_datetime(results['Date'])
+    results = results.sort_values(by=['Club ID', 'Date'], kind='stable')
+    results['Chronological Matchday'] = results.groupby('Club ID').cumcount() + 1
+
+    shots = store.load('shots', league, season)[['Date', 'Squad', 'Squad ID', 'xG', 'Outcome']]
+    return shots.merge(results, left_on=['Date', 'Squad ID'], right_on=['Date', 'Club ID'], validate='many_to_one')
+
+
+def luck_table(club_shots, window, matchday):
+    # the goal distributions of the shots in the selected games, computed on demand in a few milliseconds
+    size = windows[window]
+    selected = club_shots['Chronological Matchday'] <= matchday
+    if size is not None:
+        selected &= club_shots['Chronological Matchday'] > matchday - size
+    table = goal_distribution.goal_table(club_shots[selected], 'Squad')
+    table.index = table.index.astype(str)
+    return table
+
+
+def matchday_table(xg_cube, window, matchday):
+    # one slice of the precomputed cube, nothing is recomputed when the slider moves
+    values = xg_cube['cube'][list(windows).index(window), matchday - 1]
+    table = pd.DataFrame(values, columns=metrics)
+    table.insert(0, 'Club', xg_cube['clubs'])
+    table['xG_difference'] = table['GF'] - table['xG']
+    table['xGA_difference'] = table['GA'] - table['xGA']
+    return table.dropna(subset=['GF']).sort_values(by='xG_difference', ascending=True)
+
+
+def create_figure(xg_cube, league, season, window='season', matchday=None, luck=None):
+    if matchday is None:
+        matchday = xg_cube['n_matchdays']
+    table = matchday_table(xg_cube, window, matchday)
+    if luck is not None:
+        luck = luck.reindex(table['Club'])
+
+    hover_text = [f"<b>{club}</b><br>"
+                  f"Goals: {int(goals)}<br>"
+                  f"xG: {xg:.1f}<br>"
+                  f"xG Difference: {xg_diff:.1f}<br>"
+                  f"Goals against: {int(ga)}<br>"
+                  f"xGA: {xga:.1f}<br>"
+                  f"Points: {int(points)}<br>"
+                  f"xPts: {xpts:.1f}"
+                  for club, goals, xg, xg_diff, ga, xga, points, xpts in zip(table['Club'],
+                                                                             table['GF'],
+                                                                             table['xG'],
+                                                                             table['xG_difference'],
+                                                                             table['GA'],
+                                                                             table['xGA'],
+                                                                             table['Points'],
+                                                                             table['xPts'])]
+    if luck is not None:
+        hover_text = [f"{text}<br>p-value: {p_value:.3f}" for text, p_value in zip(hover_text, luck['P Value'])]
 
-# Load data
-df = pd.read_csv("../../adrian/data/pl_club_results.csv")
-
-# Process data
-df['Accumulated GF'] = 0
-df['Accumulated xG'] = 0
-club_info = {}
-
-for index, row in df.iterrows():
-    club = row['Club']
-    gf = row['GF']
-    xg = row['xG']
-    
-    if club not in club_info:
-        club_info[club] = {'Accumulated GF': 0, 'Accumulated xG': 0}
-    
-    club_info[club]['Accumulated GF'] += gf
-    club_info[club]['Accumulated xG'] += xg
-    
-    df.at[index, 'Accumulated GF'] = club_info[club]['Accumulated GF']
-    df.at[index, 'Accumulated xG'] = club_info[club]['Accumulated xG']
-
-end_of_season_df = df[df['Round'] == "Matchweek 38"]
-end_of_season_df['xG_difference'] = end_of_season_df['Accumulated GF'] - end_of_season_df['Accumulated xG']
-end_of_season_df = end_of_season_df.sort_values(by='xG_difference', ascending=True)
-
-hover_text = [f"<b>{club}</b><br>"
-              f"Goals: {int(goals)}<br>"
-              f"xG: {xg:.1f}<br>"
-              f"xG Difference: {xg_diff:.1f}"
-              for club, goals, xg, xg_diff in zip(end_of_season_df['Club'],
-                                                   end_of_season_df['Accumulated GF'],
-                                                   end_of_season_df['Accumulated xG'],
-                                                   end_of_season_df['xG_difference'])]
-
-def create_figure():
     fig = go.Figure()
 
     fig.add_trace(go.Bar(
-        y=end_of_season_df['Club'],
-        x=end_of_season_df['xG_difference'],
+        y=table['Club'],
+        x=table['xG_difference'],
         marker_color='indianred',
-        orientation='h', 
+        orientation='h',
         hoverinfo='text',
-        hovertext=hover_text  
+        hovertext=hover_text
     ))
 
+    if luck is not None:
+        # how far goals minus xG of the shots can go by luck alone, a bar beyond its whisker is unlikely to be luck
+        fig.add_trace(go.Scatter(
+            y=table['Club'],
+            x=np.zeros(len(table)),
+            mode='markers',
+            marker=dict(color='black', size=6, symbol='line-ns-open'),
+            error_x=dict(type='data', symmetric=False, color='black', thickness=2, width=6,
+                         array=luck['High'] - luck['xG'], arrayminus=luck['xG'] - luck['Low']),
+            name=f'{goal_distribution.LEVEL:.0%} range of luck',
+            hovertemplate=[f"<b>{club}</b><br>{low} to {high} goals from {xg:.1f} xG<br>"
+                           f"p-value: {p_value:.3f}<extra></extra>"
+                           for club, low, high, xg, p_value in zip(table['Club'], luck['Low'], luck['High'],
+                                                                   luck['xG'], luck['P Value'])],
+        ))
+        fig.update_layout(legend=dict(x=0.7, y=0.05, xanchor='center'))
+
     # explanation text for xG metric
     fig.add_annotation(
         x=0.7,
         y=0.2,
         xref='paper',
         yref='paper',
-        text="""Basically, Expected Goals (xG) is a metric to indicate how likely <br> 
-                a shot is to result in a goal. It is being calculated from several features, <br> 
-                such as the location of the shot, the body part that has been used for the shot, etc. <br> 
+        text="""Basically, Expected Goals (xG) is a metric to indicate how likely <br>
+                a shot is to result in a goal. It is being calculated from several features, <br>
+                such as the location of the shot, the body part that has been used for the shot, etc. <br>
                 Therefore, a comparison of xG and scored goals in one season can create insights on how <br>
                 well a team took its chances, or also how "lucky" they were in shooting scenarios. <br>""",
         showarrow=False,
@@ -65,18 +174,23 @@ def create_figure():
         xanchor="center",
         yanchor="middle",
         bordercolor="black",
-        bgcolor="white", 
+        bgcolor="white",
     )
-    
+
+    if matchday == xg_cube['n_matchdays'] and window == 'season':
+        title = f'xG-Over-/Underperformance at the End of the {league} {season} Season'
+    else:
+        title = f'xG-Over-/Underperformance after Matchday {matchday} ({window_labels[window]}) - {league} {season}'
+
     fig.update_layout(
-        title='xG-Over-/Underperformance at the End of the Season',
+        title=title,
         title_font=dict(size=32, family='Arial, sans-serif', color='black', weight='bold'),
         xaxis_title='xG Difference',
         yaxis_title='Club',
         height = 800,
-        yaxis=dict(tickmode='linear', 
+        yaxis=dict(tickmode='linear',
                     title_font=dict(size=28, family='Arial, sans-serif', color='black', weight='bold'),
-                    tickfont=dict(size=16, family='Arial, sans-serif', color='gray', weight='bold'), 
+                    tickfont=dict(size=16, family='Arial, sans-serif', color='gray', weight='bold'),
                    fixedrange=True,
                     showline=True,
                     linewidth=3,
@@ -91,12 +205,170 @@ def create_figure():
 
     return fig
 
+def create_time_series_figure(xg_cube, window='season', matchday=None):
+    cube = xg_cube['cube'][list(windows).index(window)]
+    matchdays = np.arange(1, xg_cube['n_matchdays'] + 1)
+    # goals minus xG for every club and matchday at once
+    differences = cube[:, :, metrics.index('GF')] - cube[:, :, metrics.index('xG')]
+
+    fig = go.Figure()
+    for i, club in enumerate(xg_cube['clubs']):
+        fig.add_trace(go.Scatter(
+            x=matchdays,
+            y=differences[:, i],
+            mode='lines',
+            name=club,
+            hovertemplate=f'<b>{club}</b><br>Matchday %{{x}}<br>xG Difference: %{{y:.1f}}<extra></extra>'
+        ))
+
+    if matchday is not None:
+        fig.add_vline(x=matchday, line_width=2, line_dash='dash', line_color='gray')
+
+    fig.update_layout(
+        title=f'xG Difference over the Season ({window_labels[window]})',
+        title_font=dict(size=24, family='Arial, sans-serif', color='black', weight='bold'),
+        xaxis_title='Chronological Matchday',
+        yaxis_title='xG Difference',
+        height=600,
+        xaxis=dict(tickmode='linear', range=[0.5, xg_cube['n_matchdays'] + 0.5],
+                   title_font=dict(size=20, family='Arial, sans-serif', color='black', weight='bold'),
+                   tickfont=dict(size=16, family='Arial, sans-serif', color='gray', weight='bold'),
+                   showline=True,
+                   linewidth=3,
+                   linecolor='gray'),
+        yaxis=dict(title_font=dict(size=20, family='Arial, sans-serif', color='black', weight='bold'),
+                   tickfont=dict(size=16, family='Arial, sans-serif', color='gray', weight='bold'),
+                   showline=True,
+                   linewidth=3,
+                   linecolor='gray'),
+    )
+
+    return fig
+
+def create_game_state_figure(tagged, league, season, view='xg'):
+    # stacked bars per club, the xG it created in each game state or its late goals by what they did to the score
+    if view == 'xg':
+        values = (game_state.xg_by_game_state(tagged)
+                  .pivot(index='Squad', columns='Game State', values='xG')
+                  .reindex(columns=game_state.game_states, fill_value=0))
+        title = f'xG by Game State - {league} {season}'
+        xaxis_title = 'xG'
+    else:
+        values = game_state.late_goals(tagged).reindex(columns=['Equaliser', 'Go-ahead goal', 'Other'], fill_value=0)
+        title = f"Late Goals (from the {game_state.LATE_MINUTE}th Minute) - {league} {season}"
+        xaxis_title = 'Goals'
+    values = values.fillna(0)
+    values.index = values.index.astype(str)
+    values = values.loc[values.sum(axis=1).sort_values().index]
+
+    fig = go.Figure()
+    for column in values.columns:
+        fig.add_trace(go.Bar(
+            y=values.index,
+            x=values[column],
+            name=column,
+            orientation='h',
+            marker_color=game_state_colors[column],
+            hovertemplate=f'<b>%{{y}}</b><br>{column}: %{{x:.1f}}<extra></extra>' if view == 'xg'
+            else f'<b>%{{y}}</b><br>{column}: %{{x}}<extra></extra>',
+        ))
+
+    fig.update_layout(
+        barmode='stack',
+        title=title,
+        title_font=dict(size=24, family='Arial, sans-serif', color='black', weight='bold'),
+        xaxis_title=xaxis_title,
+        height=700,
+        yaxis=dict(tickmode='linear',
+                   tickfont=dict(size=16, family='Arial, sans-serif', color='gray', weight='bold'),
+                   fixedrange=True,
+                   showline=True,
+                   linewidth=3,
+                   linecolor='gray'),
+        xaxis=dict(fixedrange=True,
+                   title_font=dict(size=20, family='Arial, sans-serif', color='black', weight='bold'),
+                   tickfont=dict(size=16, family='Arial, sans-serif', color='gray', weight='bold'),
+                   showline=True,
+                   linewidth=3,
+                   linecolor='gray'),
+    )
+
+    return fig
+
 def layout():
     return html.Div([
-        dcc.Graph(figure=create_figure()),
+        data_store.partition_selector('xg-difference'),
+        html.Div([
+            html.Label("Goals and xG over:", style={'fontWeight': 'bold', 'margin-right': '10px'}),
+            dcc.RadioItems(
+                id='xg-difference-window',
+                options=[{'label': label, 'value': window} for window, label in window_labels.items()],
+                value='season',
+                inline=True,
+                labelStyle={'margin-right': '15px'}
+            ),
+        ], style={'display': 'flex', 'justifyContent': 'center', 'margin': '10px 0'}),
+        dcc.Slider(id='xg-difference-matchday', min=1, max=38, value=38, step=1),
+        dcc.Graph(id='xg-difference-graph'),
+        dcc.Graph(id='xg-difference-time-series'),
+        html.Div([
+            dcc.RadioItems(
+                id='xg-game-state-view',
+                options=[{'label': label, 'value': view} for view, label in game_state_views.items()],
+                value='xg',
+                inline=True,
+                labelStyle={'margin-right': '15px'}
+            ),
+        ], style={'display': 'flex', 'justifyContent': 'center', 'margin': '10px 0'}),
+        dcc.Graph(id='xg-game-state-graph'),
         html.P("Data source: FBref", style={'text-align': 'center', 'font-size': '12px', 'color': 'gray'})
 
     ])
 
-def register_callbacks(app):
-    pass  # No callbacks needed for this visualization
+def load(store):
+    store.derived('xpts', expected_points.build_xpts)
+    store.derived('xg_cube', build_xg_cube)
+    store.derived('club_shots', build_club_shots)
+    store.derived('game_states', game_state.build_game_states)
+
+def register(app):
+    data_store.register_partition_callbacks(app, 'xg-difference')
+
+    @app.callback(
+        [Output('xg-difference-matchday', 'max'),
+         Output('xg-difference-matchday', 'marks'),
+         Output('xg-difference-matchday', 'value')],
+        [Input('xg-difference-league', 'value'),
+         Input('xg-difference-season', 'value')]
+    )
+    def update_slider(league, season):
+        xg_cube = data_store.get_store().derived('xg_cube', build_xg_cube, league, season)
+        n_matchdays = int(xg_cube['n_matchdays'])
+        return n_matchdays, {day: str(day) for day in range(1, n_matchdays + 1)}, n_matchdays
+
+    @app.callback(
+        [Output('xg-difference-graph', 'figure'),
+         Output('xg-difference-time-series', 'figure')],
+        [Input('xg-difference-league', 'value'),
+         Input('xg-difference-season', 'value'),
+         Input('xg-difference-window', 'value'),
+         Input('xg-difference-matchday', 'value')]
+    )
+    def update_graph(league, season, window, matchday):
+        store = data_store.get_store()
+        xg_cube = store.derived('xg_cube', build_xg_cube, league, season)
+        matchday = min(matchday, xg_cube['n_matchdays'])
+        luck = luck_table(store.derived('club_shots', build_club_shots, league, season), window, matchday)
+        return (create_figure(xg_cube, league, season, window, matchday, luck),
+                create_time_series_figure(xg_cube, window, matchday))
+
+    @app.callback(
+        Output('xg-game-state-graph', 'figure'),
+        [Input('xg-difference-league', 'value'),
+         Input('xg-difference-season', 'value'),
+         Input('xg-game-state-view', 'value')]
+    )
+    def update_game_state_graph(league, season, view):
+        # every shot of the partition is tagged once, both views are group-bys of the cached table
+        tagged = data_store.get_store().derived('game_states', game_state.build_game_states, league, season)
+        return create_game_state_figure(tagged, league, season, view)
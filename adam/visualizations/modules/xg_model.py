@@ -0,0 +1,121 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import statsmodels
+import statsmodels.api as sm
+from scipy.special import expit
+
+import modules.data_store as data_store
+
+# in-house expected goals: a logistic regression of goal / no goal on where and how a shot was taken,
+# fitted on the shots of the 18/19 Premier League and stored as plain coefficients next to the data
+MODEL_PATH = os.path.join(data_store.BASE_DIR, 'adam', 'data', 'xg_model.json')
+
+# columns of the design matrix, in the order of the coefficients
+features = [
+    'Intercept',
+    'Distance',
+    'Log Distance',
+    'Head',
+    'Other Body Part',
+    'Head x Distance',
+    'Volley',
+    'Free kick',
+    'Deflected',
+]
+
+# edges of the predicted xG bins in the calibration report
+calibration_bins = [0, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 1]
+
+
+def encode(shots):
+    # one row per shot, built column by column over the whole table
+    distance = shots['Distance'].to_numpy(dtype=float)
+    body_part = shots['Body Part'].astype('string')
+    notes = shots['Notes'].astype('string').fillna('')
+    head = (body_part == 'Head').to_numpy(dtype=float)
+
+    # notes can hold several tags, e.g. "Free kick, Deflected"
+    return np.column_stack([
+        np.ones(len(shots)),
+        distance,
+        np.log1p(distance),
+        head,
+        (body_part == 'Other').to_numpy(dtype=float),
+        head * distance,
+        notes.str.contains('Volley').to_numpy(dtype=float),
+        notes.str.contains('Free kick').to_numpy(dtype=float),
+        notes.str.contains('Deflected').to_numpy(dtype=float),
+    ])
+
+
+def fit(shots):
+    goals = (shots['Outcome'] == 'Goal').to_numpy(dtype=float)
+    result = sm.Logit(goals, encode(shots)).fit(disp=False)
+    return {
+        'features': features,
+        'coefficients': result.params.tolist(),
+        'standard_errors': result.bse.tolist(),
+        'shots': int(len(goals)),
+        'goals': int(goals.sum()),
+        'log_likelihood': float(result.llf),
+        'statsmodels': statsmodels.__version__,
+    }
+
+
+def save_model(model, path=MODEL_PATH):
+    with open(path, 'w') as f:
+        json.dump(model, f, indent=2)
+
+
+def load_model(path=MODEL_PATH):
+    with open(path) as f:
+        model = json.load(f)
+    if model['features'] != features:
+        raise ValueError(f"The xG model in {path} was fitted on other features, refit it with python -m modules.xg_model")
+    return model
+
+
+def score(shots, model):
+    # every shot of the table in one matrix product
+    return expit(encode(shots) @ np.asarray(model['coefficients']))
+
+
+def calibration_report(shots, model):
+    # predicted against scored goals per bin of the model's xG, next to FBref's xG for the same shots
+    goals = (shots['Outcome'] == 'Goal').to_numpy(dtype=float)
+    table = pd.DataFrame({
+        'Model xG': score(shots, model),
+        'FBref xG': shots['xG'].to_numpy(dtype=float),
+        'Goals': goals,
+    })
+    table['Bin'] = pd.cut(table['Model xG'], calibration_bins, include_lowest=True)
+    bins = table.groupby('Bin', observed=True).agg(
+        Shots=('Goals', 'size'), Goals=('Goals', 'sum'), **{'Model xG': ('Model xG', 'sum'), 'FBref xG': ('FBref xG', 'sum')})
+
+    summary = {}
+    for column in ['Model xG', 'FBref xG']:
+        predicted = table[column].clip(1e-6, 1 - 1e-6)
+        summary[column] = {
+            'Total': predicted.sum(),
+            'Brier score': ((predicted - goals) ** 2).mean(),
+            'Log loss': -(goals * np.log(predicted) + (1 - goals) * np.log(1 - predicted)).mean(),
+        }
+    summary = pd.DataFrame(summary)
+    summary.loc['Correlation with FBref xG'] = [table['Model xG'].corr(table['FBref xG']), 1.0]
+    return bins, summary
+
+
+if __name__ == '__main__':
+    # python -m modules.xg_model from adam/visualizations refits the model, stores it and prints the calibration
+    shots = data_store.get_store().load('shots')
+    model = fit(shots)
+    save_model(model)
+    print(f"Fitted on {model['shots']} shots ({model['goals']} goals), saved to {MODEL_PATH}")
+    print(pd.DataFrame({'Coefficient': model['coefficients'], 'Std. error': model['standard_errors']},
+                       index=features).round(3).to_string())
+    bins, summary = calibration_report(shots, model)
+    print(bins.round(1).to_string())
+    print(summary.round(4).to_string())
@@ -0,0 +1,251 @@
+import argparse
+import ast
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import modules.profiling as profiling
+
+# profiles the start of the dashboard: app.py is run statement by statement, every module import is timed,
+# and a sampling profiler records where the time went
+# run from adam/visualizations: python profile_startup.py [--output profiles/startup] [--budget 20]
+# writes report.txt, report.json, startup.collapsed (for flamegraph.pl or speedscope) and startup.html
+# --budget exits with status 1 when the start takes longer, for a check before a deploy
+# imports that read data files, create a Dash app or start threads are flagged, module code should only define
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_OUTPUT = os.path.join(HERE, 'profiles', 'startup')
+
+# modules taking less than this are left out of the report table
+MIN_REPORTED_SECONDS = 0.005
+
+# files of the repository other than code that an import opens are flagged
+REPOSITORY = os.path.dirname(os.path.dirname(HERE))
+CODE_EXTENSIONS = ('.py', '.pyc')
+
+
+class ImportRecord:
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        self.seconds = 0.0
+        self.child_seconds = 0.0
+        self.allocated = 0
+        self.side_effects = []
+
+    @property
+    def self_seconds(self):
+        return self.seconds - self.child_seconds
+
+
+class Recorder:
+    # the import stack and everything recorded while a module runs its top-level code
+    def __init__(self, allocations):
+        self.allocations = allocations
+        self.records = []
+        self.stack = []
+        self.thread_id = threading.get_ident()
+        # functions called with a module right after it ran, by module name
+        self.after_import = {}
+
+    def current(self):
+        return self.stack[-1] if self.stack and threading.get_ident() == self.thread_id else None
+
+    def flag(self, side_effect):
+        record = self.current()
+        if record is not None and side_effect not in record.side_effects:
+            record.side_effects.append(side_effect)
+
+    def traced(self):
+        return tracemalloc.get_traced_memory()[0] if self.allocations else 0
+
+    def execute(self, name, run):
+        record = ImportRecord(name, self.current())
+        self.records.append(record)
+        self.stack.append(record)
+        memory, start = self.traced(), time.perf_counter()
+        try:
+            return run()
+        finally:
+            record.seconds = time.perf_counter() - start
+            record.allocated = self.traced() - memory
+            self.stack.pop()
+            if record.parent is not None:
+                record.parent.child_seconds += record.seconds
+
+
+class RecordingLoader:
+    # runs the module through the real loader and times it, everything else is the real loader's
+    def __init__(self, loader, recorder):
+        self._loader = loader
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._recorder.execute(module.__name__, lambda: self._loader.exec_module(module))
+        if module.__name__ in self._recorder.after_import:
+            self._recorder.after_import[module.__name__](module)
+
+
+class RecordingFinder:
+    # asks the other finders and wraps the loader of what they find
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                spec.loader = RecordingLoader(spec.loader, self.recorder)
+            return spec
+        return None
+
+
+def watch_side_effects(recorder):
+    # data files opened, Dash apps created and threads started while a module is imported
+    def audit(event, args):
+        if event == 'open' and isinstance(args[0], str):
+            path = os.path.abspath(args[0])
+            if path.startswith(REPOSITORY) and not path.endswith(CODE_EXTENSIONS):
+                recorder.flag(f"reads {os.path.relpath(path, REPOSITORY)}")
+        elif event == 'socket.connect':
+            recorder.flag("opens a network connection")
+    sys.addaudithook(audit)
+
+    # dash is patched once it is imported, importing it here would take its time out of the report
+    def patch_dash(module):
+        dash_init = module.Dash.__init__
+
+        def init(self, *args, **kwargs):
+            recorder.flag("creates a dash.Dash app")
+            dash_init(self, *args, **kwargs)
+        module.Dash.__init__ = init
+    recorder.after_import['dash.dash'] = patch_dash
+
+    thread_start = threading.Thread.start
+
+    def start(self):
+        if self.name != 'sampler':
+            recorder.flag(f"starts thread {self.name}")
+        thread_start(self)
+    threading.Thread.start = start
+
+
+def statements(path):
+    # the top-level statements of a script with the line they start on, the __main__ block is left out
+    with open(path) as f:
+        source = f.read()
+    tree = ast.parse(source, path)
+    lines = source.splitlines()
+    for node in tree.body:
+        if isinstance(node, ast.If) and '__main__' in ast.unparse(node.test):
+            continue
+        label = lines[node.lineno - 1].strip()
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)) and node.decorator_list:
+            label = f"{lines[node.decorator_list[0].lineno - 1].strip()} {node.name}"
+        yield node.lineno, label, compile(ast.Module(body=[node], type_ignores=[]), path, 'exec')
+
+
+def run_app(recorder, path):
+    # every statement of app.py is one phase, the imports it triggers are recorded under it
+    namespace = {'__name__': 'app', '__file__': path}
+    for lineno, label, code in statements(path):
+        recorder.execute(f"app.py:{lineno} {label}", lambda: exec(code, namespace))
+    return [record for record in recorder.records if record.parent is None]
+
+
+def report(phases, records, sampler, total, allocations):
+    def megabytes(n):
+        return f"{n / 2**20:8.1f}" if allocations else f"{'-':>8}"
+
+    lines = [f"startup {total:.2f}s, {len(records) - len(phases)} modules imported, "
+             f"{sampler.samples} samples every {sampler.interval * 1000:.0f} ms"
+             + (", times include the allocation tracing" if allocations else ''), '',
+             f"{'phase of app.py':70} {'seconds':>8} {'MiB':>8}"]
+    for phase in phases:
+        lines.append(f"{phase.name[:70]:70} {phase.seconds:8.3f} {megabytes(phase.allocated)}")
+
+    modules = sorted((record for record in records if record not in phases), key=lambda r: -r.self_seconds)
+    lines += ['', f"{'module':50} {'self s':>8} {'total s':>8} {'MiB':>8}  imported by"]
+    for record in modules:
+        if record.self_seconds < MIN_REPORTED_SECONDS:
+            break
+        parent = record.parent.name.split(' ', 1)[0] if record.parent else ''
+        lines.append(f"{record.name[:50]:50} {record.self_seconds:8.3f} {record.seconds:8.3f} "
+                     f"{megabytes(record.allocated)}  {parent}")
+
+    flagged = [record for record in records if record.side_effects and record not in phases]
+    lines += ['', "imports with side effects"]
+    for record in flagged:
+        lines.append(f"  {record.name} ({record.self_seconds:.3f}s self)")
+        lines += [f"    {side_effect}" for side_effect in record.side_effects]
+    if not flagged:
+        lines.append("  none")
+
+    lines += ['', "where the samples were"]
+    lines += [f"  {share:6.1%}  {name}" for name, share in sampler.top()]
+    return '\n'.join(lines) + '\n'
+
+
+def as_json(phases, records, total):
+    def entry(record):
+        return {'name': record.name, 'seconds': record.seconds, 'self_seconds': record.self_seconds,
+                'allocated_bytes': record.allocated, 'side_effects': record.side_effects,
+                'parent': record.parent.name if record.parent else None}
+    return {'seconds': total, 'phases': [entry(phase) for phase in phases],
+            'modules': [entry(record) for record in records if record not in phases]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile the start of the dashboard')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--app', default=os.path.join(HERE, 'app.py'))
+    parser.add_argument('--interval', type=float, default=profiling.SAMPLE_INTERVAL,
+                        help='seconds between two samples')
+    parser.add_argument('--no-allocations', action='store_true',
+                        help='do not trace allocations, tracing them makes the start several times slower')
+    parser.add_argument('--budget', type=float, help='exit with status 1 when the start takes longer (seconds)')
+    args = parser.parse_args()
+
+    allocations = not args.no_allocations
+    recorder = Recorder(allocations)
+    watch_side_effects(recorder)
+    sys.meta_path.insert(0, RecordingFinder(recorder))
+    if allocations:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    with profiling.Sampler(interval=args.interval) as sampler:
+        phases = run_app(recorder, args.app)
+    total = time.perf_counter() - start
+
+    text = report(phases, recorder.records, sampler, total, allocations)
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, 'report.txt'), 'w') as f:
+        f.write(text)
+    with open(os.path.join(args.output, 'report.json'), 'w') as f:
+        json.dump(as_json(phases, recorder.records, total), f, indent=2)
+    profiling.write(sampler, args.output, 'startup', f"Start of the dashboard, {total:.2f}s")
+    print(text, end='')
+    print(f"-> {args.output}")
+
+    if args.budget is not None and total > args.budget:
+        print(f"startup took {total:.2f}s, over the budget of {args.budget:.2f}s")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
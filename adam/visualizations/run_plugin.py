@@ -0,0 +1,37 @@
+import argparse
+
+import dash
+import dash_bootstrap_components as dbc
+
+import modules.plugins as plugins
+
+# serves one dashboard plugin on its own, without the other tabs
+# run from adam/visualizations: python run_plugin.py top_6_race [--port 8051], --list shows the plugins
+
+
+def create_app(plugin):
+    app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], title=plugin.TAB_LABEL)
+    app.layout = plugin.layout
+    plugin.register(app)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve one dashboard plugin standalone')
+    parser.add_argument('plugin', nargs='?', help='plugin name, see --list')
+    parser.add_argument('--list', action='store_true', help='list the available plugins')
+    parser.add_argument('--port', type=int, default=8051)
+    parser.add_argument('--no-debug', action='store_true')
+    args = parser.parse_args()
+
+    if args.list or args.plugin is None:
+        for name, path in plugins.available().items():
+            print(f"{name:25} {path}")
+        return
+
+    app = create_app(plugins.load_plugin(args.plugin))
+    app.run_server(debug=not args.no_debug, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# run from adam/visualizations: python -m pytest tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import modules.entities as entities  # noqa: E402
+import modules.sqlite_store as sqlite_store  # noqa: E402
+
+FIRST = ('Premier League', '2018/2019')
+SECOND = ('Premier League', '2019/2020')
+
+
+def shots(players, squads, xg, league):
+    df = pd.DataFrame({'Player': players, 'Squad': squads, 'xG': xg, 'Outcome': ['Goal', 'Saved'][:len(xg)]})
+    df['Outcome'] = df['Outcome'].astype('category')
+    return entities.rekey(df, competition=league)
+
+
+@pytest.fixture
+def tables():
+    # the second partition has players and clubs that the first one does not
+    return [
+        ('shots', FIRST, shots(['Mohamed Salah', 'Harry Kane'], ['Liverpool', 'Tottenham Hotspur'], [0.3, 0.1],
+                               FIRST[0])),
+        ('shots', SECOND, shots(['Jamie Vardy', 'Mohamed Salah'], ['Leicester City', 'Liverpool'], [0.5, 0.2],
+                                SECOND[0])),
+    ]
+
+
+@pytest.fixture
+def path(tmp_path, tables):
+    path = str(tmp_path / 'datapool.sqlite3')
+    sqlite_store.build(tables, {}, path)
+    return path
+
+
+@pytest.mark.parametrize('index', [0, 1])
+def test_select_partition(path, tables, index):
+    _, partition, df = tables[index]
+    result = sqlite_store.select('shots', partition=partition, path=path)
+    assert list(result.columns) == list(df.columns)
+    for column in df.columns:
+        assert result[column].astype(object).tolist() == df[column].astype(object).tolist(), column
+
+
+def test_categories_of_every_partition(path):
+    result = sqlite_store.select('shots', columns=['Player', 'Squad'], partition=SECOND, path=path)
+    assert {'Harry Kane', 'Jamie Vardy', 'Mohamed Salah'} <= set(result['Player'].cat.categories)
+    assert result['Player'].notna().all() and result['Squad'].notna().all()
+
+
+def test_select_by_id(path):
+    salah = entities.players.id('Mohamed Salah')
+    result = sqlite_store.select('shots', {'Player ID': salah}, ['Player', 'Player ID', 'xG'], SECOND, path)
+    assert result['Player'].tolist() == ['Mohamed Salah']
+    assert result['Player ID'].tolist() == [salah]
+    assert result['xG'].tolist() == [0.2]